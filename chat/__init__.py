@@ -1 +1,4 @@
 from .chat import ChatXBlock
+
+# The configuration of the Django app, for Django < 3.2, which does not find it by itself.
+default_app_config = "chat.apps.ChatConfig"
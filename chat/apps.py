@@ -0,0 +1,15 @@
+"""
+Django app of the Chat XBlock, providing its management commands, and the compilation of chat
+scripts when courses are published when installed in Studio.
+"""
+
+from django.apps import AppConfig
+
+
+class ChatConfig(AppConfig):
+    name = "chat"
+    verbose_name = "Chat XBlock"
+
+    def ready(self):
+        from . import warmup
+        warmup.connect_signals()
@@ -0,0 +1,95 @@
+"""
+Offline bundles of chat blocks, for mobile apps.
+
+A bundle is a zip file with everything an app needs to run a chat offline, downloaded in a
+single request to the offline_bundle handler of the block:
+
+- chat.json: the script and settings of the block (see README.md for its format)
+- translations/<language>.js: the JavaScript translations of the language of the request
+- images/<hash>.<extension>: the avatars of the bots and the images of the steps, by the
+  SHA-256 of their content; chat.json maps their URLs to these paths
+- audio/bot.wav, audio/response.wav: the sounds of the messages of the bots and the learner
+
+The bundle of a block is the same for all its learners: the steps contain NAME_PLACEHOLDER in
+place of the learner's name. It is identified by an ETag, the SHA-256 of its content, so that
+apps only download it again when it changes. Bundles are built once per process and kept for
+OFFLINE_BUNDLE_TTL seconds, after which images are read again, in case they were replaced.
+"""
+
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import time
+import zipfile
+
+from . import images, proxy
+from .default_data import OFFLINE_BUNDLE_CACHE_SIZE, OFFLINE_BUNDLE_TTL
+from .utils import LRUCache
+
+# Version of the format of bundles, in chat.json. It is increased on incompatible changes.
+FORMAT_VERSION = 1
+MANIFEST_NAME = "chat.json"
+# Bundles are deterministic, so that their ETag only depends on their content.
+_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# (time built, ETag, content) of bundles, by key.
+_cache = LRUCache(OFFLINE_BUNDLE_CACHE_SIZE)
+
+
+def read_image(course_key, url):
+    """
+    Returns the content and file extension of the image with the given URL, from the course
+    assets (see images.py) or from the cache of the image proxy (see proxy.py), or None if it
+    is not available from either, in which case apps load it from its URL.
+    """
+    if url.startswith(images.STATIC_PREFIX):
+        backend = images.get_backend()
+        data = backend.get(course_key, url) if backend is not None else None
+        return data and (data, os.path.splitext(url)[1].lower())
+    if proxy.is_proxied(url):
+        try:
+            content_type, data = proxy.get_cache().fetch(url)
+        except proxy.ProxyError:
+            return None
+        return data, mimetypes.guess_extension(content_type) or ""
+    return None
+
+
+def image_path(data, extension):
+    """Returns the path in bundles of an image with the given content."""
+    return "images/{}{}".format(hashlib.sha256(data).hexdigest(), extension)
+
+
+def build(manifest, files):
+    """Returns the content of a bundle with the given chat.json data and files, by path."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as bundle:
+        entries = [(MANIFEST_NAME, json.dumps(manifest, sort_keys=True).encode("utf-8"))]
+        entries.extend(sorted(files.items()))
+        for path, data in entries:
+            info = zipfile.ZipInfo(path, _DATE_TIME)
+            # Images and sounds are compressed already.
+            info.compress_type = zipfile.ZIP_DEFLATED if path.endswith((".json", ".js")) else zipfile.ZIP_STORED
+            bundle.writestr(info, data)
+    return output.getvalue()
+
+
+def get_or_build(key, build_bundle):
+    """
+    Returns the ETag and content of the bundle with the given key, calling build_bundle() to
+    build its content unless it was built less than OFFLINE_BUNDLE_TTL seconds ago.
+    """
+    cached = _cache.get(key)
+    if cached is not None and time.time() - cached[0] < OFFLINE_BUNDLE_TTL:
+        return cached[1:]
+    content = build_bundle()
+    etag = hashlib.sha256(content).hexdigest()
+    _cache.set(key, (time.time(), etag, content))
+    return etag, content
+
+
+def clear_cache():
+    """Forgets the bundles built."""
+    _cache.clear()
@@ -5,52 +5,117 @@ a script and the learner can choose among possible responses.
 Authors define the script as a set of "steps", where each step has an
 ID, a message (or several), and a set of up to three responses, where
 each response includes the ID of the next step to respond with.
+
+This module is imported by every process enumerating the installed XBlocks,
+so the dependencies only needed for parsing scripts, validating them,
+serving audio and getting profile images are imported when first used.
 """
 
+import functools
+import hashlib
 import json
+import math
 import os
 from builtins import str
+from collections.abc import Mapping
 
-import pkg_resources
 import webob
-import yaml
 from django import utils
-from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
-from django.core.validators import URLValidator
-from django.http import Http404
-from past.builtins import basestring
 from web_fragments.fragment import Fragment
 from xblock.core import XBlock
-from xblock.fields import Boolean, List, Scope, String
+from xblock.fields import Boolean, Float, List, Scope, String
 from xblock.validation import ValidationMessage
-from xblockutils.resources import ResourceLoader
 from xblockutils.studio_editable import StudioEditableXBlockMixin
 
+from . import bundle, compiled, images, library, metrics, profiling, proxy, resources, telemetry
 from .default_data import (
     BOT_MESSAGE_ANIMATION_DELAY,
     BUTTONS_ENTERING_TRANSITION_DURATION,
     BUTTONS_LEAVING_TRANSITION_DURATION,
     DEFAULT_BOT_ID,
     DEFAULT_DATA,
+    LOCAL_STORAGE_BUDGET,
+    MAX_RESOURCE_HINTS,
     MAX_USER_RESPONSES,
     NAME_PLACEHOLDER,
     SCROLL_DELAY,
+    SHARED_INIT_DATA_CACHE_SIZE,
+    STUDENT_VIEW_DATA_VERSION,
+    TELEMETRY_BATCH_SIZE,
+    TELEMETRY_COUNTS,
+    TELEMETRY_FLUSH_INTERVAL,
+    TELEMETRY_MAX_VALUES,
+    TELEMETRY_MEASURES,
+    TELEMETRY_SAMPLE_RATE,
+    TIMING_PROFILE_EXPRESS,
+    TIMING_PROFILE_STANDARD,
+    TIMING_PROFILES,
     TYPING_DELAY_PER_CHARACTER,
     USER_ID,
     USER_MESSAGE_ANIMATION_DELAY,
 )
-from .utils import _
+from .engine import ChatEngine, FirstCandidate
+from .utils import LRUCache, _
+
+# Initialization data that differs between the learners of a block, passed to initialize_js.
+LEARNER_INIT_DATA_KEYS = (
+    "user_state", "user_image_url", "anonymous_student_id", "bot_sound_url", "response_sound_url",
+)
+# JSON of the initialization data shared by all learners, by version of the shared data.
+_shared_init_data_cache = LRUCache(SHARED_INIT_DATA_CACHE_SIZE)
+# Steps shared by all learners of a block (see ChatXBlock._shared_steps), by version of the steps.
+_shared_steps_cache = LRUCache(SHARED_INIT_DATA_CACHE_SIZE)
+# Stands for the learner's name in the cached JSON; it cannot be mistaken for text of the script.
+_NAME_MARKER = u"\x00NAME\x00"
+_ENCODED_NAME_MARKER = json.dumps(_NAME_MARKER)[1:-1]
+
+# Characters escaped in JSON embedded in a script element, like Django's json_script filter does.
+_JSON_HTML_ESCAPES = {ord('>'): u'\\u003E', ord('<'): u'\\u003C', ord('&'): u'\\u0026'}
+
+
+def _escape_json_for_html(encoded):
+    """Escapes JSON, so that it can be embedded in a script element."""
+    return encoded.translate(_JSON_HTML_ESCAPES)
 
-try:
-    from openedx.core.djangoapps.user_api.accounts.image_helpers import get_profile_image_urls_for_user
-except ImportError:
-    # This helper is not necessary when running tests because the
-    # ChatXBlock._user_image_url method is patched
-    pass
 
+def _with_learner_name(value, name):
+    """Returns a copy of a step, or of a value of a step, with the learner's name in place of _NAME_MARKER."""
+    if isinstance(value, dict):
+        return dict((key, _with_learner_name(item, name)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_with_learner_name(item, name) for item in value]
+    if isinstance(value, str):
+        return value.replace(_NAME_MARKER, name)
+    return value
+
+
+class _LearnerSteps(Mapping):
+    """
+    The steps of a script by ID, with the learner's name, from the steps shared by all learners.
+
+    The name is only substituted in the steps that are read, so that rendering the student view
+    of a long script only costs the steps of the learner's transcript and of their current step.
+    """
+
+    def __init__(self, steps, name):
+        self._steps = steps
+        self._name = name
+        self._learner_steps = {}
 
-loader = ResourceLoader(__name__)
+    def __getitem__(self, step_id):
+        step = self._learner_steps.get(step_id)
+        if step is None:
+            step = self._learner_steps[step_id] = _with_learner_name(self._steps[step_id], self._name)
+        return step
+
+    def __contains__(self, step_id):
+        return step_id in self._steps
+
+    def __iter__(self):
+        return iter(self._steps)
+
+    def __len__(self):
+        return len(self._steps)
 
 
 @XBlock.needs("i18n")
@@ -91,6 +156,26 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         scope=Scope.content,
     )
 
+    script_name = String(
+        display_name=_("Shared script"),
+        help=_(
+            "Name of a script of the course's script library, used instead of the Steps field. "
+            "In Studio, you can upload the script as a YAML file named <name>.yaml, in the format "
+            "of the Steps field, from the Content - Files & Uploads page."
+        ),
+        default="",
+        scope=Scope.content,
+    )
+
+    compiled_script = String(
+        help=_(
+            "Steps compiled offline by the precompile_chat_olx command, in JSON, with the hash of "
+            "the steps they were compiled from. Ignored once the steps are changed."
+        ),
+        default="",
+        scope=Scope.content,
+    )
+
     bot_image_url = String(
         display_name=_("Bot profile image URL"),
         help=_(
@@ -119,6 +204,32 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         scope=Scope.content,
     )
 
+    timing_profile = String(
+        display_name=_("Timing profile"),
+        help=_(
+            "Pace of the bot typing delays and animations. Learners can always switch to the express "
+            "profile, which is also used for learners who prefer reduced motion."
+        ),
+        values=[
+            {"display_name": _("Relaxed"), "value": "relaxed"},
+            {"display_name": _("Standard"), "value": TIMING_PROFILE_STANDARD},
+            {"display_name": _("Brisk"), "value": "brisk"},
+            {"display_name": _("Express"), "value": TIMING_PROFILE_EXPRESS},
+        ],
+        default=TIMING_PROFILE_STANDARD,
+        scope=Scope.content,
+    )
+
+    telemetry_sample_rate = Float(
+        display_name=_("Telemetry sample rate"),
+        help=_(
+            "Fraction of the learners' page views (between 0 and 1) that report how long the chat "
+            "takes to load and respond. Only used when metrics are enabled on the server."
+        ),
+        default=TELEMETRY_SAMPLE_RATE,
+        scope=Scope.settings,
+    )
+
     messages = List(
         help=_(
             "List of dictionaries representing the messages exchanged "
@@ -141,38 +252,60 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         "display_name",
         "subject",
         "steps",
+        "script_name",
         "bot_image_url",
         "avatar_border_color",
         "enable_restart_button",
+        "timing_profile",
+        "telemetry_sample_rate",
     )
 
     @staticmethod
     def resource_string(path):
         """Handy helper for getting resources from our kit."""
-        data = pkg_resources.resource_string(__name__, path)
-        return data.decode("utf8")
+        return resources.read(path).decode("utf8")
 
     def get_translation_content(self):
+        """Returns the JavaScript translations of the current language, read once per process."""
+        language = utils.translation.get_language().split('-')
+        if len(language) == 2:
+            new_lang = language[0] + "_" + language[1]
+        else:
+            new_lang = utils.translation.get_language()
+        return resources.cached(("translation", new_lang), lambda: self._read_translation_content(new_lang))
+
+    @classmethod
+    def _read_translation_content(cls, lang):
+        """Reads the JavaScript translations of a language, or the English ones if there are none."""
         try:
-            language = utils.translation.get_language().split('-')
-            if len(language) == 2:
-                new_lang = language[0] + "_" + language[1]
-            else:
-                new_lang = utils.translation.get_language()
-            return self.resource_string('public/js/translations/{lang}/textjs.js'.format(
-                lang=new_lang,
+            return cls.resource_string('public/js/translations/{lang}/textjs.js'.format(
+                lang=lang,
             ))
         except IOError:
-            return self.resource_string('public/js/translations/en/textjs.js')
+            return cls.resource_string('public/js/translations/en/textjs.js')
 
     @XBlock.supports("multi_device")  # Mark as mobile-friendly
+    @metrics.timed("student_view")
+    @profiling.profiled("student_view")
     def student_view(self, context=None):
         """View shown to students"""
         context = context.copy() if context else {}
-        context["steps"] = self.steps
+        context["steps"] = self._steps_source
+        init_data = self._js_init_data()
+        learner_init_data = dict(
+            (key, value) for key, value in init_data.items() if key in LEARNER_INIT_DATA_KEYS
+        )
+        context.update(self._transcript_context(init_data))
+        context["resource_hints"] = self._resource_hints(init_data)
+        context["shared_init_data"] = self._shared_init_data_json(init_data)
+        if metrics.enabled():
+            # The size of the data sent to chat.js, without substituting the name in all the steps.
+            metrics.gauge("init_data_bytes", (
+                len(context["shared_init_data"].encode("utf-8")) + len(json.dumps(learner_init_data).encode("utf-8"))
+            ))
         fragment = Fragment()
         fragment.add_content(
-            loader.render_django_template("templates/chat.html", context)
+            resources.render("templates/chat.html", context)
         )
 
         fragment.add_css_url(
@@ -186,35 +319,230 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         fragment.add_javascript_url(
             self.runtime.local_resource_url(self, "public/js/src/chat.js")
         )
-        fragment.initialize_js("ChatXBlock", self._js_init_data())
+        fragment.initialize_js("ChatXBlock", learner_init_data)
         return fragment
 
+    def student_view_data(self, context=None):
+        """
+        Returns the data of the chat for native mobile clients, in the format documented in
+        README.md (version STUDENT_VIEW_DATA_VERSION). It is the same for all learners: the steps
+        contain NAME_PLACEHOLDER in place of the learner's name, and the learner's state is
+        returned by the student_view_user_state handler.
+        """
+        script, _ = self._compiled_script_version()
+        bot_image_urls = self._bot_image_urls()
+        engine = ChatEngine(
+            self._proxy_step_images(script.as_list(NAME_PLACEHOLDER)), bot_ids=bot_image_urls, rng=FirstCandidate()
+        )
+        # Steps are listed in the order of the script, without their keys that are null.
+        steps = [
+            dict((key, value) for key, value in step.items() if value is not None)
+            for step in engine.steps.values()
+        ]
+        steps_json = json.dumps(steps, sort_keys=True, separators=(",", ":"))
+        return {
+            "version": STUDENT_VIEW_DATA_VERSION,
+            "block_id": self._get_block_id(),
+            "script_hash": hashlib.sha256(steps_json.encode("utf-8")).hexdigest(),
+            "steps": steps,
+            "first_step_id": engine.first_step,
+            "name_placeholder": NAME_PLACEHOLDER,
+            "user_id": USER_ID,
+            "bot_image_urls": bot_image_urls,
+            "timing_profile": self.timing_profile,
+            "timings": self._timings(self.timing_profile),
+            "express_timings": self._timings(TIMING_PROFILE_EXPRESS),
+            "subject": self.subject,
+            "avatar_border_color": self.avatar_border_color or None,
+            "enable_restart_button": self.enable_restart_button,
+            "bot_sound_url": self.runtime.handler_url(self, 'serve_audio', 'bot.wav'),
+            "response_sound_url": self.runtime.handler_url(self, 'serve_audio', 'response.wav'),
+            "user_state_url": self.runtime.handler_url(self, 'student_view_user_state'),
+            "offline_bundle_url": self.runtime.handler_url(self, 'offline_bundle'),
+        }
+
+    @XBlock.handler
+    @metrics.timed("student_view_user_state")
+    def student_view_user_state(self, request, suffix=''):
+        """
+        Returns the state of the learner for native mobile clients, with their first name and
+        avatar, as JSON (see student_view_data).
+        """
+        steps, first_step_id, _ = self._shared_steps()
+        engine = self._learner_engine(steps, first_step_id, self._bot_image_urls())
+        data = {
+            "version": STUDENT_VIEW_DATA_VERSION,
+            "user_state": self._get_settled_user_state(engine),
+            "user_name": self._first_name,
+            "user_image_url": self._user_image_url(),
+            "anonymous_student_id": self._get_student_id(),
+        }
+        return webob.Response(
+            body=json.dumps(data, separators=(",", ":")).encode("utf-8"),
+            content_type='application/json',
+            charset='utf-8',
+            cache_control='no-store',
+        )
+
+    def _shared_init_data_json(self, init_data):
+        """
+        Returns the JSON of the initialization data shared by all learners, for embedding in HTML.
+
+        It is encoded once per version of the shared data and cached with a marker in place of
+        the learner's name in the steps; only the name is spliced in on each request. The
+        learner-specific data (LEARNER_INIT_DATA_KEYS) is passed to initialize_js instead.
+        """
+        shared = dict(
+            (key, value) for key, value in init_data.items()
+            if key not in LEARNER_INIT_DATA_KEYS and key != "steps"
+        )
+        source = self._steps_source
+        version = (source, json.dumps(shared, sort_keys=True), proxy.get_cache() is not None)
+        encoded = _shared_init_data_cache.get(version)
+        if encoded is None:
+            shared["steps"], _, current = self._shared_steps()
+            encoded = _escape_json_for_html(json.dumps(shared, sort_keys=True))
+            # The previous version of the steps is not cached as this version.
+            if current:
+                _shared_init_data_cache.set(version, encoded)
+        name = _escape_json_for_html(json.dumps(self._first_name)[1:-1])
+        return encoded.replace(_ENCODED_NAME_MARKER, name)
+
+    def _transcript_context(self, init_data):
+        """
+        Returns the template context needed for rendering the chat transcript on the server.
+
+        The markup mirrors the templates in chat.js, so that the front end can adopt it
+        instead of building the transcript from scratch, and so that completed chats can
+        be read without JavaScript.
+        """
+        steps = init_data["steps"]
+        bot_image_urls = init_data["bot_image_urls"]
+        transcript = []
+        for message in init_data["user_state"]["messages"]:
+            sender = message.get("from")
+            if sender == USER_ID:
+                transcript.append({
+                    "is_user": True,
+                    "message": message["message"],
+                    "avatar_url": init_data["user_image_url"],
+                })
+            elif sender in bot_image_urls:
+                step = steps.get(message.get("step")) or {}
+                transcript.append({
+                    "is_user": False,
+                    "message": message["message"],
+                    "avatar_url": bot_image_urls[sender],
+                    "image_url": step.get("image_url"),
+                    "image_alt": step.get("image_alt") or "",
+                    "image": init_data["images"].get(step.get("image_url")),
+                    "notice_type": step.get("notice_type"),
+                    "notice_text": step.get("notice_text"),
+                })
+        return {
+            "transcript": transcript,
+            "subject": init_data["subject"],
+            "avatar_border_color": init_data["avatar_border_color"],
+        }
+
+    @staticmethod
+    def _resource_hints(init_data):
+        """
+        Returns the resource hints of the student view, so that the browser fetches the resources
+        of the first screen while it loads chat.js, rather than when chat.js requests them.
+
+        The avatars of the bots and the image of the step shown first are preloaded; the sounds,
+        the avatar of the learner and the images of the following steps are prefetched. Images
+        with resized derivatives are preloaded from their srcset, and prefetched at their default
+        size.
+        """
+        steps = init_data["steps"]
+        state = init_data["user_state"]
+        # Mirrors initialStep.
+        if not state["messages"] and init_data["first_step_id"]:
+            step = steps[init_data["first_step_id"]]
+        else:
+            step = steps.get(state["current_step"]) or {}
+        bot_image_urls = init_data["bot_image_urls"]
+        preload = [
+            bot_image_urls.get(message["bot_id"]) for messages in step.get("messages", []) for message in messages
+        ]
+        preload.append(step.get("image_url"))
+        prefetch = [init_data["bot_sound_url"], init_data["response_sound_url"], init_data["user_image_url"]]
+        prefetch.extend((steps.get(response["step"]) or {}).get("image_url") for response in step.get("responses", []))
+        step_images = init_data["images"]
+        hints = []
+        urls = set()
+        for rel, rel_urls in (("preload", preload), ("prefetch", prefetch)):
+            for url in rel_urls:
+                if url and url not in urls and len(hints) < MAX_RESOURCE_HINTS:
+                    urls.add(url)
+                    hint = {
+                        "rel": rel, "href": url, "as": "image" if rel == "preload" else None,
+                        "imagesrcset": None, "imagesizes": None,
+                    }
+                    image = step_images.get(url)
+                    if image:
+                        hint["href"] = image["src"]
+                        if rel == "preload" and image["srcset"]:
+                            hint["imagesrcset"] = image["srcset"]
+                            hint["imagesizes"] = image["sizes"]
+                    hints.append(hint)
+        return hints
+
     def validate_field_data(self, validation, data):
         super(ChatXBlock, self).validate_field_data(validation, data)
 
         def add_error(msg):
             """ Helper function for adding validation messages. """
             validation.add(ValidationMessage(ValidationMessage.ERROR, msg))
-        self._validate_steps(data.steps, add_error)
+        if data.script_name:
+            self._validate_script_name(data.script_name, add_error)
+        else:
+            self._validate_steps(data.steps, add_error)
+
+    def _validate_script_name(self, script_name, add_error):
+        """Checks that the course's script library has a valid script with the given name."""
+        source = library.get_script(self._course_key(), script_name, refresh=True)
+        self._validate_library_script(script_name, source, add_error)
 
-    def _validate_steps(self, steps, add_error):
+    @classmethod
+    def _validate_library_script(cls, script_name, source, add_error):
+        """
+        Checks the name of a script of the library and its text, source, which is None if
+        the library has no such script.
+        """
+        if not library.is_valid_name(script_name):
+            add_error(
+                u"The Shared script name can only contain letters, digits, '_', '-' and '.', "
+                u"and has to start with a letter or a digit"
+            )
+        elif source is None:
+            add_error(u"The script library of the course has no script named {}".format(script_name))
+        else:
+            cls._validate_steps(source, add_error)
+
+    @classmethod
+    def _validate_steps(cls, steps, add_error):
         """
         Checks that the steps string can be decoded as a list.
 
         Then checks that each step dictionary in the list is valid.
         """
-        steps = self._decode_steps_string(steps.strip())
+        steps = cls._decode_steps_string(steps.strip())
         if steps is None:
             add_error(
                 u"The Steps field has to be a YAML sequence of step mappings"
             )
         else:
             for step in steps:
-                self._validate_step(step, add_error)
+                cls._validate_step(step, add_error)
 
     @staticmethod
     def _decode_steps_string(steps):
         """Loads the string containing the list of steps."""
+        import yaml
+        metrics.increment("yaml_parse")
         try:
             steps = yaml.safe_load(steps)
         except yaml.parser.ParserError:
@@ -231,16 +559,107 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         ]
 
     @property
+    @metrics.timed("steps_as_list")
     def _steps_as_list(self):
         """
         It replaces the NAME_PLACEHOLDER with the user's first name and
         returns steps as a list of dictionaries.
         """
+        return self._compiled_steps.as_list(self._first_name)
+
+    @property
+    def _first_name(self):
+        """Returns the first name of the learner, which replaces NAME_PLACEHOLDER in the steps."""
         user_service = self.runtime.service(self, 'user')
-        first_name = user_service.get_current_user().full_name.split(' ')[0]
-        steps = self.steps.replace(NAME_PLACEHOLDER, first_name)
-        steps = self._decode_steps_string(steps) or []
-        return [self._normalize_step(step) for step in steps]
+        return user_service.get_current_user().full_name.split(' ')[0]
+
+    @property
+    def _steps_source(self):
+        """
+        Returns the text of the steps: the script of the course's library named by the
+        script_name field if it is set (an empty script if the library has no such script),
+        or the steps field.
+        """
+        if self.script_name:
+            return library.get_script(self._course_key(), self.script_name) or ""
+        return self.steps
+
+    def _course_key(self):
+        """Returns the key of the course of the block, or None outside of courses (in the workbench)."""
+        return getattr(self.scope_ids.usage_id, "course_key", None)
+
+    @property
+    def _compiled_steps(self):
+        """Returns the compiled script of the steps, compiling it only if it is not cached."""
+        return self._compiled_script_version()[0]
+
+    def _compiled_script_version(self):
+        """
+        Returns the compiled script of the steps, and whether it is the current version of the
+        steps. When the steps were changed since they were last compiled, the previous version
+        is returned while the new one is compiled in the background (see compiled.revalidate).
+        """
+        source = self._steps_source
+        key = str(self.scope_ids.usage_id)
+        script, current = compiled.lookup(source, key)
+        if current:
+            return script, True
+        compile_script = functools.partial(self._compile_source, compiled_script=self.compiled_script)
+        if script is not None and compiled.revalidate(source, compile_script, key):
+            return script, False
+        return compiled.get_or_compile(source, compile_script, key), True
+
+    def _compile_steps(self, steps):
+        """
+        Returns the steps as a CompiledScript, from the compiled_script field if it was compiled
+        from them, or by parsing and normalizing them.
+        """
+        return self._compile_source(steps, self.compiled_script)
+
+    @classmethod
+    def _compile_source(cls, steps, compiled_script):
+        """Returns the steps as a CompiledScript, from compiled_script if it was compiled from them."""
+        if compiled_script:
+            script = compiled.deserialize(steps, compiled_script)
+            if script is not None:
+                return script
+        steps = cls._decode_steps_string(steps) or []
+        return compiled.CompiledScript([cls._normalize_step(step) for step in steps])
+
+    def warm_compiled_script(self):
+        """
+        Compiles the script of the block and stores it in the caches of compiled scripts, unless
+        it is already there, so that learners don't wait for it. Returns true if it was compiled.
+        """
+        return compiled.warm(self._steps_source, self._compile_steps)
+
+    def warm_images(self):
+        """
+        Generates the resized derivatives of the images of the steps of the block that don't have
+        them yet (see images.py). Returns the number of images with derivatives. Blocks are
+        warmed without a current learner, so the name of the learner is not substituted.
+        """
+        steps = self._compiled_steps.as_list(NAME_PLACEHOLDER)
+        image_urls = set(step["image_url"] for step in steps if step["image_url"])
+        return sum(1 for url in image_urls if images.prepare(self._course_key(), url))
+
+    def _step_images(self, steps):
+        """
+        Returns the attributes of the img elements of the images of steps, by image URL, for the
+        images whose derivatives are generated; the others are generated in the background. The
+        derivatives are served by a third-party handler, so that their URLs are the same for all
+        learners, and can be cached by shared caches.
+        """
+        course_key = self._course_key()
+        step_images = {}
+        for step in steps.values():
+            url = step["image_url"]
+            if url and url not in step_images:
+                info = images.lookup(course_key, url)
+                step_images[url] = info and images.attributes(
+                    url, info, lambda name: self.runtime.handler_url(self, "serve_image", name, thirdparty=True)
+                )
+        return dict((url, attributes) for url, attributes in step_images.items() if attributes)
 
     @property
     def _steps_as_dict(self):
@@ -250,13 +669,40 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             for step in self._steps_as_list
         ])
 
+    def _shared_steps(self):
+        """
+        Returns the steps of the block by ID, with _NAME_MARKER in place of the learner's name and
+        the image URLs of the proxy, the ID of the first step, and whether they are the current
+        version of the steps. They are the same for all learners, so they are built once per
+        version of the steps, and only the steps read for a learner get their name.
+        """
+        version = (str(self.scope_ids.usage_id), self._steps_source, proxy.get_cache() is not None)
+        shared = _shared_steps_cache.get(version)
+        if shared is not None:
+            return shared + (True,)
+        script, current = self._compiled_script_version()
+        steps = self._proxy_step_images(script.as_list(_NAME_MARKER))
+        shared = (dict((step["id"], step) for step in steps), steps[0]["id"] if steps else None)
+        # The previous version of the steps is not cached as this version.
+        if current:
+            _shared_steps_cache.set(version, shared)
+        return shared + (current,)
+
+    def _learner_engine(self, steps, first_step_id, bot_image_urls):
+        """Returns the engine of shared steps (see _shared_steps), with the learner's name in the steps read."""
+        return ChatEngine.from_steps_by_id(
+            _LearnerSteps(steps, self._first_name), first_step_id, bot_ids=bot_image_urls, rng=FirstCandidate()
+        )
+
+    @metrics.timed("js_init_data")
     def _js_init_data(self):
         """Returns initialization JavaScript data for student view fragment"""
-        steps = self._steps_as_dict
-        first_step = steps[self._steps_as_list[0]["id"]] if steps else None
+        bot_image_urls = self._bot_image_urls()
+        steps, first_step_id, _ = self._shared_steps()
+        engine = self._learner_engine(steps, first_step_id, bot_image_urls)
         return {
             "block_id": self._get_block_id(),
-            "bot_image_urls": self._bot_image_urls(),
+            "bot_image_urls": bot_image_urls,
             "user_image_url": self._user_image_url(),
             "bot_sound_url": self.runtime.handler_url(
                 self, 'serve_audio', 'bot.wav'),
@@ -264,18 +710,52 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
                 self, 'serve_audio', 'response.wav'),
             "user_id": USER_ID,
             "anonymous_student_id": self._get_student_id(),
-            "steps": steps,
-            "first_step": first_step,
-            "user_state": self._get_user_state(),
-            "bot_message_animation_delay": BOT_MESSAGE_ANIMATION_DELAY,
-            "user_message_animation_delay": USER_MESSAGE_ANIMATION_DELAY,
-            "buttons_entering_transition_duration": BUTTONS_ENTERING_TRANSITION_DURATION,
-            "buttons_leaving_transition_duration": BUTTONS_LEAVING_TRANSITION_DURATION,
-            "scroll_delay": SCROLL_DELAY,
+            "steps": engine.steps,
+            "images": self._step_images(steps),
+            "first_step_id": engine.first_step,
+            "user_state": self._get_settled_user_state(engine),
+            "timing_profile": self.timing_profile,
+            "timings": self._timings(self.timing_profile),
+            "express_timings": self._timings(TIMING_PROFILE_EXPRESS),
             "subject": self.subject,
             "avatar_border_color": self.avatar_border_color or None,
             "enable_restart_button": self.enable_restart_button,
-            "typing_delay_per_character": TYPING_DELAY_PER_CHARACTER,
+            "local_storage_budget": LOCAL_STORAGE_BUDGET,
+            "telemetry": {
+                "sample_rate": self.telemetry_sample_rate if metrics.enabled() else 0,
+                "batch_size": TELEMETRY_BATCH_SIZE,
+                "flush_interval": TELEMETRY_FLUSH_INTERVAL,
+            },
+        }
+
+    def _proxy_step_images(self, steps):
+        """
+        Replaces the image URLs of the steps on other sites by URLs of the proxy_image handler,
+        if the image proxy is enabled (see proxy.py), and returns the steps.
+
+        This is not done by _normalize_step, since compiled scripts are shared by all blocks with
+        the same steps, and the URLs of the handler are specific to each block.
+        """
+        if proxy.get_cache() is None:
+            return steps
+        for step in steps:
+            if proxy.is_proxied(step["image_url"]):
+                step["image_url"] = self.runtime.handler_url(
+                    self, "proxy_image", proxy.url_digest(step["image_url"]), thirdparty=True
+                )
+        return steps
+
+    @staticmethod
+    def _timings(profile):
+        """Returns the animation delays and transition durations (in ms) of a timing profile."""
+        factor = TIMING_PROFILES.get(profile, TIMING_PROFILES[TIMING_PROFILE_STANDARD])
+        return {
+            "bot_message_animation_delay": int(BOT_MESSAGE_ANIMATION_DELAY * factor),
+            "user_message_animation_delay": int(USER_MESSAGE_ANIMATION_DELAY * factor),
+            "buttons_entering_transition_duration": int(BUTTONS_ENTERING_TRANSITION_DURATION * factor),
+            "buttons_leaving_transition_duration": int(BUTTONS_LEAVING_TRANSITION_DURATION * factor),
+            "scroll_delay": int(SCROLL_DELAY * factor),
+            "typing_delay_per_character": TYPING_DELAY_PER_CHARACTER * factor,
         }
 
     @staticmethod
@@ -287,14 +767,16 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         """Converts the value of bot_image_url field into a dict of bot_id: image_url key value pairs.
         If the value ia a dict, it adds an entry for the default bot image.
         If the value is a string, it assumes it represents the image url of the default bot."""
+        import yaml
         mapping = {DEFAULT_BOT_ID: self._default_bot_image_url()}
 
+        metrics.increment("yaml_parse")
         image_urls = yaml.safe_load(self.bot_image_url)
         if isinstance(image_urls, dict):
             for bot_id in image_urls:
                 key = self._custom_bot_id(bot_id)
                 mapping[key] = self._expand_static_url(image_urls[bot_id])
-        elif isinstance(image_urls, basestring):
+        elif isinstance(image_urls, str):
             mapping[DEFAULT_BOT_ID] = self._expand_static_url(image_urls)
 
         return mapping
@@ -305,6 +787,11 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
 
     def _user_image_url(self):
         """Returns an image url for representing the learner in the chat"""
+        # Imported here, as the auth models cannot be imported before the Django apps are loaded,
+        # which happens when the chat app is loaded by manage.py. The helper is only available
+        # in the LMS; this method is patched in the tests.
+        from django.contrib.auth.models import User
+        from openedx.core.djangoapps.user_api.accounts.image_helpers import get_profile_image_urls_for_user
         user_service = self.runtime.service(self, 'user')
         user = user_service.get_current_user()
         username = user.opt_attrs.get('edx-platform.username')
@@ -337,7 +824,7 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         """Returns JSON representing message exchanges and step to take"""
         data = self._get_user_state()
         return webob.Response(
-            body=json.dumps(data), content_type='application/json'
+            body=json.dumps(data).encode('utf-8'), content_type='application/json', charset='utf-8'
         )
 
     def _get_user_state(self):
@@ -347,21 +834,33 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             "current_step": self.current_step,
         }
 
+    def _get_settled_user_state(self, engine):
+        """
+        Returns the user fields state as displayed once all bot messages have been shown.
+
+        The front end only stores the transcript up to the learner's last response, and
+        replays the bot messages of the current step on every visit. For completed chats
+        the bot messages of the final step are appended here, so that the transcript can
+        be rendered on the server and is not animated again. The engine picks the message
+        variants, deterministically when it is created with FirstCandidate.
+        """
+        state = self._get_user_state()
+        current_step = state["current_step"]
+        if state["messages"] and current_step in engine.steps and engine.is_final_step(current_step):
+            state["messages"] = state["messages"] + engine.bot_messages(state)
+        return state
+
     def _is_final_step(self, step):
         """Returns true if current step doesn't exist or has no responses (is final step)."""
-        steps_dict = self._steps_as_dict
-        # Step with this ID does not exist, which means the chat is complete.
-        if step not in steps_dict:
-            return True
-        # Step exists, but has no user responses available, which means this is the final step.
-        if not steps_dict[step]['responses']:
-            return True
-        # Step exists and has responses for the user to choose from, so this is not the final step.
-        return False
+        steps, first_step_id, _ = self._shared_steps()
+        return ChatEngine.from_steps_by_id(steps, first_step_id).is_final_step(step)
 
     @XBlock.json_handler
+    @metrics.timed("submit_response")
+    @profiling.profiled("submit_response")
     def submit_response(self, data, suffix=''):
         """Saves the user state sent from the front end"""
+        metrics.gauge_json_size("submitted_state_bytes", data)
         if len(data["messages"]) > len(self.messages):
             self.messages = data["messages"]
         self.current_step = data["current_step"]
@@ -371,6 +870,35 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             self.runtime.publish(self, 'xblock.chat.complete', data)
             self.runtime.publish(self, 'progress', {})
 
+    @XBlock.json_handler
+    def record_telemetry(self, data, suffix=''):
+        """
+        Reports the timings and counters sent by the front end in batches.
+
+        Unknown names, invalid values and values beyond TELEMETRY_MAX_VALUES are ignored.
+        """
+        if not metrics.enabled() or not isinstance(data, dict):
+            return {}
+        measures = {}
+        remaining = TELEMETRY_MAX_VALUES
+        for name, values in (data.get("measures") or {}).items():
+            if name in TELEMETRY_MEASURES and isinstance(values, list):
+                values = [
+                    value for value in values
+                    if isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and math.isfinite(value) and value >= 0
+                ][:remaining]
+                if values:
+                    measures[name] = values
+                    remaining -= len(values)
+        counts = dict(
+            (name, count) for name, count in (data.get("counts") or {}).items()
+            if name in TELEMETRY_COUNTS and isinstance(count, int) and not isinstance(count, bool)
+            and 0 < count <= TELEMETRY_MAX_VALUES
+        )
+        telemetry.record(measures, counts)
+        return {}
+
     @XBlock.json_handler
     def reset(self, data, suffix=''):
         """Resets chat state"""
@@ -378,30 +906,32 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         self.current_step = None
 
     @XBlock.handler
+    @metrics.timed("serve_audio")
     def serve_audio(self, request, wav_name):
         """
         Serves wav audio file, respecting the Range header.
         Safari on OS X and iOS will not play audio files if the server does not respect Range requests.
         """
         if wav_name not in ['bot.wav', 'response.wav']:
+            from django.http import Http404
             raise Http404('File does not exist')
 
-        filepath = pkg_resources.resource_filename(__name__, 'public/{}'.format(wav_name))
-        stat = os.stat(filepath)
+        with resources.as_file('public/{}'.format(wav_name)) as filepath:
+            stat = os.stat(filepath)
 
-        if request.range:
-            content_range = request.range.content_range(length=stat.st_size)
-            content_length = content_range.stop - content_range.start
-            status = 206
-        else:
-            content_range = None
-            content_length = stat.st_size
-            status = 200
+            if request.range:
+                content_range = request.range.content_range(length=stat.st_size)
+                content_length = content_range.stop - content_range.start
+                status = 206
+            else:
+                content_range = None
+                content_length = stat.st_size
+                status = 200
 
-        with open(filepath, 'rb') as f:
-            if (content_range):
-                f.seek(content_range.start)
-            body = f.read(content_length)
+            with open(filepath, 'rb') as f:
+                if (content_range):
+                    f.seek(content_range.start)
+                body = f.read(content_length)
 
         response = webob.Response(
             body=body,
@@ -415,9 +945,129 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
 
         return response
 
+    @XBlock.handler
+    @metrics.timed("serve_image")
+    def serve_image(self, request, suffix):
+        """
+        Serves a resized derivative of the image of a step (see images.py). Their names contain the
+        hash of the original image, so they can be cached forever.
+        """
+        from django.http import Http404
+        path = images.derivative_path(suffix)
+        if path is None:
+            raise Http404('File does not exist')
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except IOError:
+            raise Http404('File does not exist')
+
+        return webob.Response(
+            body=body,
+            content_type=images.CONTENT_TYPES[suffix.rsplit('.', 1)[1]],
+            cache_control='public, max-age=31536000, immutable',
+        )
+
+    @XBlock.handler
+    @metrics.timed("offline_bundle")
+    def offline_bundle(self, request, suffix=''):
+        """
+        Returns a zip file with the script, translations, images and sounds of the block, for
+        running the chat offline in mobile apps (see bundle.py), identified by an ETag.
+        """
+        language = utils.translation.get_language()
+        manifest = self._offline_bundle_manifest()
+        key = (language, json.dumps(manifest, sort_keys=True))
+        etag, content = bundle.get_or_build(key, lambda: self._build_offline_bundle(manifest, language))
+        if etag in request.if_none_match:
+            return webob.Response(status=304, etag=etag)
+
+        return webob.Response(
+            body=content,
+            content_type='application/zip',
+            etag=etag,
+            cache_control='no-cache',
+            content_disposition='attachment; filename="chat.zip"',
+        )
+
+    def _offline_bundle_manifest(self):
+        """Returns the data of the chat.json file of the offline bundle, without its files."""
+        script, _ = self._compiled_script_version()
+        bot_image_urls = self._bot_image_urls()
+        engine = ChatEngine(script.as_list(NAME_PLACEHOLDER), bot_ids=bot_image_urls, rng=FirstCandidate())
+        return {
+            "format": bundle.FORMAT_VERSION,
+            "block_id": self._get_block_id(),
+            "bot_image_urls": bot_image_urls,
+            "user_id": USER_ID,
+            "name_placeholder": NAME_PLACEHOLDER,
+            "steps": engine.steps,
+            "first_step_id": engine.first_step,
+            "timing_profile": self.timing_profile,
+            "timings": self._timings(self.timing_profile),
+            "express_timings": self._timings(TIMING_PROFILE_EXPRESS),
+            "subject": self.subject,
+            "avatar_border_color": self.avatar_border_color or None,
+            "enable_restart_button": self.enable_restart_button,
+        }
+
+    def _build_offline_bundle(self, manifest, language):
+        """Reads the files of the offline bundle, and returns its content."""
+        translations_path = "translations/{}.js".format(language)
+        files = {
+            translations_path: self.get_translation_content().encode("utf-8"),
+            "audio/bot.wav": resources.read("public/bot.wav"),
+            "audio/response.wav": resources.read("public/response.wav"),
+        }
+        image_urls = set(manifest["bot_image_urls"].values())
+        image_urls.update(step["image_url"] for step in manifest["steps"].values() if step["image_url"])
+        paths = {}
+        for url in sorted(image_urls):
+            if url == self._default_bot_image_url():
+                image = resources.read("public/bot.jpg"), ".jpg"
+            else:
+                image = bundle.read_image(self._course_key(), url)
+            if image:
+                paths[url] = bundle.image_path(*image)
+                files[paths[url]] = image[0]
+        manifest = dict(
+            manifest,
+            images=paths,
+            translations=translations_path,
+            bot_sound="audio/bot.wav",
+            response_sound="audio/response.wav",
+        )
+        return bundle.build(manifest, files)
+
+    @XBlock.handler
+    @metrics.timed("proxy_image")
+    def proxy_image(self, request, suffix):
+        """
+        Serves an image of a step hosted on another site, from the cache of the image proxy or
+        from its origin (see proxy.py). The suffix is the SHA-256 of the URL of the image, which
+        must be the image of a step of the block.
+        """
+        from django.http import Http404
+        cache = proxy.get_cache()
+        urls = [step["image_url"] for step in self._steps_as_list if proxy.is_proxied(step["image_url"])]
+        url = next((url for url in urls if proxy.url_digest(url) == suffix), None)
+        if cache is None or url is None:
+            raise Http404('File does not exist')
+        try:
+            content_type, body = cache.fetch(url)
+        except proxy.ProxyError:
+            return webob.Response(status=502)
+
+        return webob.Response(
+            body=body,
+            content_type=content_type,
+            cache_control='public, max-age=31536000',
+        )
+
     @staticmethod
     def _as_yaml(step):
         """Encodes a step as a YAML object"""
+        import yaml
         return yaml.dump(step).strip()
 
     @staticmethod
@@ -428,7 +1078,8 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             len(list(step.keys())) == 1
         )
 
-    def _validate_step(self, step, add_error):
+    @classmethod
+    def _validate_step(cls, step, add_error):
         """
         Checks if the step is a dictionary with a single key.
 
@@ -443,7 +1094,7 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
                 - 2: step2
                 - 3: step3
         """
-        if not self._is_valid_dict(step):
+        if not cls._is_valid_dict(step):
             msg = (
                 u"Step {step} must be a valid YAML mapping with "
                 u"a string key and a nested mapping of 'messages' and "
@@ -451,13 +1102,13 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             )
             add_error(
                 msg.format(
-                    step=self._as_yaml(step)
+                    step=cls._as_yaml(step)
                 )
             )
             return
         content = list(step.values())[0]
         required_attributes = ["messages"]
-        missing_attributes = self._missing_attributes(content, required_attributes)
+        missing_attributes = cls._missing_attributes(content, required_attributes)
         if missing_attributes:
             msg = (
                 u"Step {step} is missing the following attributes: "
@@ -465,33 +1116,35 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             )
             add_error(
                 msg.format(
-                    step=self._as_yaml(step),
+                    step=cls._as_yaml(step),
                     attributes=u", ".join(missing_attributes),
                 )
             )
         else:
-            self._validate_messages(step, content["messages"], add_error)
-            self._validate_responses(step, content.get("responses", []), add_error)
-            self._validate_image_url(step, content.get("image-url"), add_error)
-            self._validate_image_alt(step, content.get("image-alt"), add_error)
+            cls._validate_messages(step, content["messages"], add_error)
+            cls._validate_responses(step, content.get("responses", []), add_error)
+            cls._validate_image_url(step, content.get("image-url"), add_error)
+            cls._validate_image_alt(step, content.get("image-alt"), add_error)
 
-    def _validate_messages(self, step, messages, add_error):
+    @classmethod
+    def _validate_messages(cls, step, messages, add_error):
         """Checks that messages is a string or a list of strings."""
-        if not self._has_valid_messages(messages):
+        if not cls._has_valid_messages(messages):
             msg = (
                 u"The attribute 'messages' has to be a string or a list "
                 u"of strings in {step}."
             )
-            add_error(msg.format(step=self._as_yaml(step)))
+            add_error(msg.format(step=cls._as_yaml(step)))
 
     @staticmethod
     def _has_valid_messages(messages):
         """Checks that messages is a string or a list of strings."""
         return (
-            isinstance(messages, basestring) or isinstance(messages, list)
+            isinstance(messages, str) or isinstance(messages, list)
         )
 
-    def _validate_responses(self, step, responses, add_error):
+    @classmethod
+    def _validate_responses(cls, step, responses, add_error):
         """
         Checks if 'responses' is a list of dictionaries containing a
         single key, used as response message and a single value which
@@ -505,17 +1158,18 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
 
         Note that the 'responses' list may also be empty.
         """
-        if not self._has_valid_responses(responses):
+        if not cls._has_valid_responses(responses):
             msg = (
                 u"The 'responses' attribute of {step} has to be a list "
                 u"of response mappings of maximum length {max_length}."
             )
             add_error(
-                msg.format(step=self._as_yaml(step), max_length=MAX_USER_RESPONSES)
+                msg.format(step=cls._as_yaml(step), max_length=MAX_USER_RESPONSES)
             )
             return
 
-    def _has_valid_responses(self, responses):
+    @classmethod
+    def _has_valid_responses(cls, responses):
         """
         Checks if 'responses' is a list of up to MAX_USER_RESPONSES response
         dictionaries.
@@ -526,7 +1180,7 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         if not (isinstance(responses, list) and len(responses) <= MAX_USER_RESPONSES):
             return False
         return all(
-            self._is_valid_yaml_response(response) for response in responses
+            cls._is_valid_yaml_response(response) for response in responses
         )
 
     @staticmethod
@@ -537,7 +1191,8 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             len(list(response.keys())) == 1
         )
 
-    def _normalize_step(self, step):
+    @classmethod
+    def _normalize_step(cls, step):
         """
         Converts a step into a dictionary in the format expected by the frontend code.
 
@@ -560,7 +1215,7 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         }
         """
         content = list(step.values())[0]
-        messages = self._normalize_step_messages(content["messages"])
+        messages = cls._normalize_step_messages(content["messages"])
         return {
             "id": str(list(step.keys())[0]),
             "messages": messages,
@@ -568,7 +1223,7 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             "image_alt": content.get("image-alt"),
             "notice_type": content.get("notice-type"),
             "notice_text": content.get("notice-text"),
-            "responses": self._normalize_responses(content.get("responses", []))
+            "responses": cls._normalize_responses(content.get("responses", []))
         }
 
     @staticmethod
@@ -582,7 +1237,8 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
             for response in responses
         ]
 
-    def _normalize_step_message(self, step_message):
+    @classmethod
+    def _normalize_step_message(cls, step_message):
         """Converts a 'step_message' into a list of message objects with 'message' and 'bot_id' entries.
 
         The step_message may be a string, a dict with bot_id: message key value pairs, or a list
@@ -591,18 +1247,19 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         If the messages attribute is a string, it assumes the message belongs to the default bot."""
 
         result = []
-        if isinstance(step_message, basestring):
+        if isinstance(step_message, str):
             result.append({'message': step_message, 'bot_id': DEFAULT_BOT_ID})
         elif isinstance(step_message, dict):
             for key in step_message:
-                bot_id = self._custom_bot_id(key)
+                bot_id = cls._custom_bot_id(key)
                 result.append({'message': step_message[key], 'bot_id': bot_id})
         elif isinstance(step_message, list):
             for message in step_message:
-                result += self._normalize_step_message(message)
+                result += cls._normalize_step_message(message)
         return result
 
-    def _normalize_step_messages(self, step_messages):
+    @classmethod
+    def _normalize_step_messages(cls, step_messages):
         """Converts the messages attribute into a list of lists. This is necessary for presenting
         multiple BOT messages in a row.
 
@@ -612,14 +1269,17 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
         result = []
         if isinstance(step_messages, list):
             for message in step_messages:
-                result.append(self._normalize_step_message(message))
+                result.append(cls._normalize_step_message(message))
         else:
-            result.append(self._normalize_step_message(step_messages))
+            result.append(cls._normalize_step_message(step_messages))
         return result
 
-    def _validate_image_url(self, step, image_url, add_error):
+    @classmethod
+    def _validate_image_url(cls, step, image_url, add_error):
         """Checks that the image URL is a valid URL string"""
         if image_url is not None:
+            from django.core.exceptions import ValidationError
+            from django.core.validators import URLValidator
             validator = URLValidator()
             try:
                 validator(image_url)
@@ -628,18 +1288,19 @@ class ChatXBlock(StudioEditableXBlockMixin, XBlock):
                     u"The 'image-url' attribute of {step} has to be a valid URL string."
                 )
                 add_error(
-                    msg.format(step=self._as_yaml(step))
+                    msg.format(step=cls._as_yaml(step))
                 )
 
-    def _validate_image_alt(self, step, image_alt, add_error):
+    @classmethod
+    def _validate_image_alt(cls, step, image_alt, add_error):
         """Checks that the alternative text of the image is a string"""
         if image_alt is not None:
-            if not isinstance(image_alt, basestring):
+            if not isinstance(image_alt, str):
                 msg = (
                     u"The 'image-alt' attribute of {step} has to be a string."
                 )
                 add_error(
-                    msg.format(step=self._as_yaml(step))
+                    msg.format(step=cls._as_yaml(step))
                 )
 
     def _expand_static_url(self, url):
@@ -0,0 +1,419 @@
+"""
+Compiled representation of chat scripts.
+
+Parsing the YAML of the steps field and normalizing the steps is by far the most expensive
+part of rendering a chat, so scripts are compiled once and kept in a bounded cache shared
+by all blocks of the process, keyed by the value of the steps field. Compiled scripts use
+__slots__ classes and tuples, which take a fraction of the memory of the equivalent dicts
+and lists. The dictionaries sent to the front end (see ChatXBlock._normalize_step for their
+format) are created from the compiled script on each request, with the learner's name.
+
+Scripts can also be compiled offline, by the precompile_chat_olx management command, which
+stores the normalized steps in the compiled_script field of the blocks with the hash of the
+steps they were compiled from. Compiling them again only takes decoding that JSON, as long as
+the steps have not been changed since.
+
+Compiled scripts are also shared by all processes through a Django cache, so that each script
+is only compiled once after a deploy rather than once by every worker of every server. They
+are stored in the serialized format, compressed, with the hash of their source as key; see
+warmup.py for compiling the scripts of a course in advance. The cache is configured with the
+CHAT_XBLOCK_COMPILED_SCRIPTS_CACHE Django setting:
+
+    CHAT_XBLOCK_COMPILED_SCRIPTS_CACHE = {
+        "CACHE": "default",  # alias of the Django cache, or None to disable the shared cache
+        "TIMEOUT": 604800,
+    }
+
+or by calling set_shared_cache.
+
+Finally, the scripts of the busiest courses can be preloaded in the master process of a server
+before its workers are forked (see warmup.preload_courses): they are written to a file in the
+binary format of mapped.py and read from a memory mapping shared by all workers, rather than
+from a copy held by each worker.
+
+When the steps of a block are changed, the requests of its learners don't wait for the new
+version to be compiled: the latest compiled script of each block is remembered, and served
+while the new version is compiled by a small pool of background threads (see lookup and
+revalidate), as long as the caches still hold it. A version is only compiled once at a time
+by each process, however many requests need it.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+import zlib
+from builtins import object
+
+from . import metrics
+from .default_data import (
+    BACKGROUND_COMPILE_MAX_PENDING,
+    BACKGROUND_COMPILE_RETRY_DELAY,
+    BACKGROUND_COMPILE_THREADS,
+    COMPILED_SCRIPTS_CACHE_SIZE,
+    COMPILED_SCRIPTS_SHARED_CACHE_TIMEOUT,
+    LATEST_SCRIPTS_CACHE_SIZE,
+    NAME_PLACEHOLDER,
+)
+from .utils import LRUCache
+
+log = logging.getLogger(__name__)
+
+SHARED_CACHE_SETTING_NAME = "CHAT_XBLOCK_COMPILED_SCRIPTS_CACHE"
+SHARED_CACHE_KEY_PREFIX = "chat_xblock.compiled_script."
+
+
+def _with_name(text, name):
+    """Replaces the name placeholder of a text."""
+    return text.replace(NAME_PLACEHOLDER, name) if text else text
+
+
+class CompiledMessage(object):
+    """A bot message: one of the variants of an item of the messages of a step."""
+
+    __slots__ = ("message", "bot_id")
+
+    def __init__(self, message, bot_id):
+        self.message = message
+        self.bot_id = bot_id
+
+    def as_dict(self, name):
+        return {"message": _with_name(self.message, name), "bot_id": self.bot_id}
+
+
+class CompiledResponse(object):
+    """A response the learner can pick, leading to the step with the given id."""
+
+    __slots__ = ("message", "step")
+
+    def __init__(self, message, step):
+        self.message = message
+        self.step = step
+
+    def as_dict(self, name):
+        return {"message": _with_name(self.message, name), "step": self.step}
+
+
+class CompiledStep(object):
+    """A step of the script, with its messages as a tuple of tuples of variants."""
+
+    __slots__ = ("id", "messages", "image_url", "image_alt", "notice_type", "notice_text", "responses")
+
+    def __init__(self, step):
+        """step is a step in the format returned by ChatXBlock._normalize_step."""
+        self.id = step["id"]
+        self.messages = tuple(
+            tuple(CompiledMessage(message["message"], message["bot_id"]) for message in messages)
+            for messages in step["messages"]
+        )
+        self.image_url = step["image_url"]
+        self.image_alt = step["image_alt"]
+        self.notice_type = step["notice_type"]
+        self.notice_text = step["notice_text"]
+        self.responses = tuple(
+            CompiledResponse(response["message"], response["step"]) for response in step["responses"]
+        )
+
+    def as_dict(self, name):
+        """Returns the step in the format returned by ChatXBlock._normalize_step."""
+        return {
+            "id": self.id,
+            "messages": [[message.as_dict(name) for message in messages] for messages in self.messages],
+            "image_url": self.image_url,
+            "image_alt": _with_name(self.image_alt, name),
+            "notice_type": self.notice_type,
+            "notice_text": _with_name(self.notice_text, name),
+            "responses": [response.as_dict(name) for response in self.responses],
+        }
+
+
+class CompiledScript(object):
+    """The steps of a script, in order."""
+
+    __slots__ = ("steps", "__weakref__")
+
+    def __init__(self, steps):
+        self.steps = tuple(CompiledStep(step) for step in steps)
+
+    def as_list(self, name):
+        """Returns the steps in the format returned by ChatXBlock._normalize_step."""
+        return [step.as_dict(name) for step in self.steps]
+
+
+# Version of the format of serialized scripts. It is part of their hash, so that scripts
+# serialized in a previous format are compiled again from their source.
+FORMAT_VERSION = 1
+
+_cache = LRUCache(COMPILED_SCRIPTS_CACHE_SIZE)
+_UNCONFIGURED = object()
+_shared_cache_alias = _UNCONFIGURED
+_shared_cache_timeout = COMPILED_SCRIPTS_SHARED_CACHE_TIMEOUT
+# MappedScripts by source, set by preload.
+_preloaded = {}
+# Weak references to the latest compiled script served by each block, by block key. The scripts
+# are only kept alive by the other caches, so that the memory used stays bounded by their size.
+_latest = LRUCache(LATEST_SCRIPTS_CACHE_SIZE)
+# Futures of the compilations in progress, and sources waiting for a background thread.
+_in_flight = {}
+_scheduled = set()
+_in_flight_lock = threading.Lock()
+# Time of the last failed background compilation of each block, and hash of the version that failed, by block key.
+_failures = LRUCache(LATEST_SCRIPTS_CACHE_SIZE)
+_executor = None
+
+
+def content_hash(source):
+    """Returns the hash of a version of the steps field, for the current serialization format."""
+    return hashlib.sha256(u"{}:{}".format(FORMAT_VERSION, source).encode("utf-8")).hexdigest()
+
+
+def serialize(source, steps):
+    """
+    Returns the JSON stored in the compiled_script field for the given normalized steps
+    (see ChatXBlock._normalize_step), compiled from source.
+    """
+    return json.dumps({"hash": content_hash(source), "steps": steps}, sort_keys=True, separators=(",", ":"))
+
+
+def deserialize(source, serialized):
+    """
+    Returns the CompiledScript stored as JSON by serialize, or None if it is invalid or was
+    not compiled from source.
+    """
+    try:
+        data = json.loads(serialized)
+        if data["hash"] == content_hash(source):
+            return CompiledScript(data["steps"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _shared_cache_alias_from_settings():
+    """Returns the alias of the cache configured by the CHAT_XBLOCK_COMPILED_SCRIPTS_CACHE setting."""
+    global _shared_cache_timeout  # pylint: disable=global-statement
+    from django.conf import settings
+    options = getattr(settings, SHARED_CACHE_SETTING_NAME, {})
+    if options is None:
+        return None
+    _shared_cache_timeout = options.get("TIMEOUT", COMPILED_SCRIPTS_SHARED_CACHE_TIMEOUT)
+    return options.get("CACHE", "default")
+
+
+def get_shared_cache():
+    """Returns the Django cache shared by all processes, or None if it is disabled."""
+    global _shared_cache_alias  # pylint: disable=global-statement
+    if _shared_cache_alias is _UNCONFIGURED:
+        _shared_cache_alias = _shared_cache_alias_from_settings()
+    if _shared_cache_alias is None:
+        return None
+    # Django cache objects are per thread, so they are looked up on each use.
+    from django.core.cache import caches
+    return caches[_shared_cache_alias]
+
+
+def set_shared_cache(alias, timeout=COMPILED_SCRIPTS_SHARED_CACHE_TIMEOUT):
+    """Sets the alias of the Django cache shared by all processes, overriding the setting; None disables it."""
+    global _shared_cache_alias, _shared_cache_timeout  # pylint: disable=global-statement
+    _shared_cache_alias = alias
+    _shared_cache_timeout = timeout
+
+
+def _shared_cache_key(source):
+    return SHARED_CACHE_KEY_PREFIX + content_hash(source)
+
+
+def _get_shared(source):
+    """Returns the compiled script of source from the shared cache, or None."""
+    cache = get_shared_cache()
+    if cache is None:
+        return None
+    try:
+        data = cache.get(_shared_cache_key(source))
+    except Exception:  # pylint: disable=broad-except
+        log.warning("Could not read a compiled chat script from the shared cache", exc_info=True)
+        return None
+    if data is None:
+        metrics.increment("compiled_scripts.shared_cache_miss")
+        return None
+    try:
+        script = deserialize(source, zlib.decompress(data).decode("utf-8"))
+    except (zlib.error, TypeError, UnicodeDecodeError):
+        script = None
+    metrics.increment("compiled_scripts.shared_cache_hit" if script else "compiled_scripts.shared_cache_miss")
+    return script
+
+
+def _set_shared(source, script):
+    """Stores the compiled script of source in the shared cache."""
+    cache = get_shared_cache()
+    if cache is None:
+        return
+    # Replacing the placeholder with itself leaves the texts of the script as they were compiled.
+    data = zlib.compress(serialize(source, script.as_list(NAME_PLACEHOLDER)).encode("utf-8"))
+    try:
+        cache.set(_shared_cache_key(source), data, _shared_cache_timeout)
+    except Exception:  # pylint: disable=broad-except
+        log.warning("Could not store a compiled chat script in the shared cache", exc_info=True)
+
+
+def _compile_once(source, compile_script):
+    """
+    Returns the compiled script of source from the shared cache, or compiles it, and stores it
+    in the cache of the process. Concurrent calls for the same source wait for the first one.
+    """
+    from concurrent.futures import Future
+    with _in_flight_lock:
+        future = _in_flight.get(source)
+        owner = future is None
+        if owner:
+            future = _in_flight[source] = Future()
+    if not owner:
+        return future.result()
+    try:
+        script = _get_shared(source)
+        if script is None:
+            script = compile_script(source)
+            _set_shared(source, script)
+        _cache.set(source, script)
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    else:
+        future.set_result(script)
+    finally:
+        with _in_flight_lock:
+            del _in_flight[source]
+    return script
+
+
+def get_or_compile(source, compile_script, key=None):
+    """
+    Returns the compiled script of the given source (the value of the steps field), from the
+    preloaded scripts, the cache of the process, then from the shared cache, calling
+    compile_script(source) if it is in none of them. The least recently used scripts are
+    evicted from the cache of the process once it holds COMPILED_SCRIPTS_CACHE_SIZE scripts.
+    The script is remembered as the latest one of the block with the given key, if any.
+    """
+    script = _preloaded.get(source)
+    if script is None:
+        script = _cache.get(source)
+        if script is None:
+            script = _compile_once(source, compile_script)
+    if key is not None:
+        _latest.set(key, weakref.ref(script))
+    return script
+
+
+def lookup(source, key):
+    """
+    Returns the compiled script of the given source and true if it is compiled already, or the
+    latest compiled script of the block with the given key and false, or None and false if the
+    block has none, or if it was evicted from the caches.
+    """
+    script = _preloaded.get(source)
+    if script is None:
+        script = _cache.get(source)
+    if script is not None:
+        _latest.set(key, weakref.ref(script))
+        return script, True
+    latest = _latest.get(key)
+    return latest() if latest is not None else None, False
+
+
+def _compile_in_background(source, compile_script, key):
+    try:
+        get_or_compile(source, compile_script, key)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Could not compile a chat script in the background")
+        _failures.set(key, (time.time(), content_hash(source)))
+    finally:
+        with _in_flight_lock:
+            _scheduled.discard(source)
+
+
+def revalidate(source, compile_script, key):
+    """
+    Compiles the script of source with compile_script(source) in a background thread, unless it
+    is being compiled already, and makes it the latest script of the block with the given key.
+    compile_script must not use the block, as it may run after the request. Versions of a block
+    that failed to compile are only compiled again after BACKGROUND_COMPILE_RETRY_DELAY seconds. Returns false
+    if too many scripts are waiting to be compiled, in which case the caller has to compile it.
+    """
+    global _executor  # pylint: disable=global-statement
+    failure = _failures.get(key)
+    if (
+        failure is not None and time.time() - failure[0] < BACKGROUND_COMPILE_RETRY_DELAY
+        and failure[1] == content_hash(source)
+    ):
+        return True
+    with _in_flight_lock:
+        if source in _scheduled or source in _in_flight:
+            return True
+        if len(_scheduled) >= BACKGROUND_COMPILE_MAX_PENDING:
+            return False
+        _scheduled.add(source)
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(BACKGROUND_COMPILE_THREADS, thread_name_prefix="chat-compile")
+    metrics.increment("compiled_scripts.background_compile")
+    _executor.submit(_compile_in_background, source, compile_script, key)
+    return True
+
+
+def wait_for_background_compilations():
+    """Waits until the scripts compiled in the background are compiled, for tests and benchmarks."""
+    global _executor  # pylint: disable=global-statement
+    with _in_flight_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def warm(source, compile_script):
+    """
+    Compiles the script of the given source with compile_script(source) and stores it in the
+    caches, unless it is already cached. Returns true if it was compiled.
+    """
+    if source in _preloaded or _cache.get(source) is not None:
+        return False
+    cache = get_shared_cache()
+    if cache is not None:
+        try:
+            if cache.get(_shared_cache_key(source)) is not None:
+                return False
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Could not read a compiled chat script from the shared cache", exc_info=True)
+    script = compile_script(source)
+    _set_shared(source, script)
+    _cache.set(source, script)
+    return True
+
+
+def preload(path, scripts):
+    """
+    Writes the given compiled scripts, a dict by source, to a file at path in the binary format
+    of mapped.py, and replaces the preloaded scripts with the scripts of the file, mapped in
+    memory. Returns the number of scripts.
+    """
+    global _preloaded  # pylint: disable=global-statement
+    from . import mapped
+    mapped.write(path, scripts.items())
+    scripts_file = mapped.MappedScripts(path)
+    _preloaded = dict((source, scripts_file.get(source)) for source in scripts)
+    return len(scripts_file)
+
+
+def clear_preloaded():
+    """Forgets the preloaded scripts."""
+    global _preloaded  # pylint: disable=global-statement
+    _preloaded = {}
+
+
+def clear_cache():
+    """Forgets all compiled scripts of the process; the shared cache is left as it is."""
+    _cache.clear()
+    _latest.clear()
+    _failures.clear()
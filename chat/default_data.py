@@ -47,4 +47,70 @@ BUTTONS_LEAVING_TRANSITION_DURATION = 800
 SCROLL_DELAY = 800
 NAME_PLACEHOLDER = '[NAME]'
 TYPING_DELAY_PER_CHARACTER = 25
+# Timing profiles scale the animation delays and transition durations above.
+TIMING_PROFILE_STANDARD = 'standard'
+TIMING_PROFILE_EXPRESS = 'express'
+TIMING_PROFILES = {
+    'relaxed': 1.5,
+    TIMING_PROFILE_STANDARD: 1,
+    'brisk': 0.5,
+    TIMING_PROFILE_EXPRESS: 0.05,
+}
 MAX_USER_RESPONSES = 7
+# Bytes of localStorage that the front end may use for the states of all chat blocks of a learner.
+LOCAL_STORAGE_BUDGET = 1024 * 1024
+# Number of resources that the student view asks the browser to preload or prefetch.
+MAX_RESOURCE_HINTS = 8
+# Number of compiled scripts kept in memory by each process.
+COMPILED_SCRIPTS_CACHE_SIZE = 128
+# Number of blocks whose latest compiled script is remembered, for serving it while a new version is compiled.
+LATEST_SCRIPTS_CACHE_SIZE = 1024
+# Threads compiling new versions of scripts in the background, and number of versions waiting for them.
+BACKGROUND_COMPILE_THREADS = 2
+BACKGROUND_COMPILE_MAX_PENDING = 16
+# Seconds after which a version that failed to compile in the background is compiled again.
+BACKGROUND_COMPILE_RETRY_DELAY = 60
+# Seconds for which compiled scripts are kept in the cache shared by all processes.
+COMPILED_SCRIPTS_SHARED_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+# Number of versions of the initialization data shared by all learners of a block kept encoded as JSON.
+SHARED_INIT_DATA_CACHE_SIZE = 256
+# Seconds for which scripts of the course-level script library are kept in memory, and number kept.
+SCRIPT_LIBRARY_TTL = 60
+SCRIPT_LIBRARY_CACHE_SIZE = 256
+# Number of XML files of an OLX export sent at once to each process validating or precompiling them.
+OLX_CHUNK_SIZE = 16
+# Number of allocation sites listed in allocation profiling reports, and of frames kept for each.
+ALLOCATION_PROFILE_TOP_SITES = 10
+ALLOCATION_PROFILE_FRAMES = 5
+# Fraction of the learners' page views that report client-side timings, when metrics are enabled.
+TELEMETRY_SAMPLE_RATE = 0.01
+# The front end sends its timings once it has this many, or after this many ms.
+TELEMETRY_BATCH_SIZE = 50
+TELEMETRY_FLUSH_INTERVAL = 10000
+# Names of the client-side timings and counters accepted by the record_telemetry handler.
+TELEMETRY_MEASURES = ("init", "first_render", "interactive", "image_preload", "apply_state", "sync")
+TELEMETRY_COUNTS = ("sync_failure",)
+# Number of values accepted per request.
+TELEMETRY_MAX_VALUES = 200
+# Widths in pixels of the derivatives of the images of steps, their JPEG quality, and the sizes attribute of their
+# img elements: at most the width of the chat column, narrower than the viewport on small screens.
+IMAGE_WIDTHS = (240, 480, 960)
+IMAGE_QUALITY = 80
+IMAGE_SIZES = "(max-width: 640px) 90vw, 480px"
+# Width of the derivative used as the src of images, for browsers without srcset, and prefetched.
+IMAGE_DEFAULT_WIDTH = 480
+# Number of images whose derivatives each process remembers, and seconds after which it looks them up again.
+IMAGE_INDEX_CACHE_SIZE = 1024
+IMAGE_INDEX_TTL = 300
+# Number of images waiting for their derivatives to be generated in the background.
+IMAGE_MAX_PENDING = 16
+# Total size in bytes of the images of other sites kept by the image proxy, the maximum size of each, and the
+# seconds after which fetching one from its origin fails.
+IMAGE_PROXY_MAX_CACHE_SIZE = 256 * 1024 * 1024
+IMAGE_PROXY_MAX_IMAGE_SIZE = 10 * 1024 * 1024
+IMAGE_PROXY_TIMEOUT = 10
+# Number of offline bundles kept in memory by each process, and seconds after which they are built again.
+OFFLINE_BUNDLE_CACHE_SIZE = 32
+OFFLINE_BUNDLE_TTL = 300
+# Version of the format of the data returned by student_view_data, increased on incompatible changes.
+STUDENT_VIEW_DATA_VERSION = 1
@@ -0,0 +1,195 @@
+"""
+Conversation engine of the Chat XBlock, for simulating chats without a browser.
+
+The engine implements the same state machine as chat.js, on the steps in the format
+returned by ChatXBlock._steps_as_list. The rules deciding which bot messages are shown
+(stepMessages), where a conversation starts (initialStep) and when it is complete
+(isFinalStep) are kept in sync with chat.js, and checked against it by the unit tests.
+
+The message variants are picked with the given random number generator, so that seeded
+simulations are reproducible:
+
+    engine = ChatEngine(block._steps_as_list, rng=random.Random(42))
+    for state in engine.simulate():
+        ...  # each state is sent to the submit_response handler
+"""
+
+import random
+
+from .default_data import USER_ID
+
+
+class FirstCandidate(object):
+    """Random number generator that always picks the first candidate, for deterministic rendering."""
+
+    @staticmethod
+    def random():
+        return 0.0
+
+
+class ChatEngine(object):
+    """
+    Conversation state machine of a chat script.
+
+    States are dictionaries with 'messages' and 'current_step', like the user state
+    stored by the XBlock. The engine never modifies the states it is given.
+    """
+
+    def __init__(self, steps, bot_ids=None, rng=None):
+        """
+        steps is the list of normalized steps of the script. bot_ids is the collection of
+        bot ids with an image (the keys of the bot_image_urls passed to chat.js); when not
+        given, every message that was not sent by the learner is considered a bot message.
+        rng is any object with a random() method, like random.Random.
+        """
+        self.steps = dict((step["id"], step) for step in steps)
+        self.first_step = steps[0]["id"] if steps else None
+        self.bot_ids = frozenset(bot_ids) if bot_ids is not None else None
+        self.rng = rng if rng is not None else random.Random()
+
+    @classmethod
+    def from_steps_by_id(cls, steps, first_step, bot_ids=None, rng=None):
+        """
+        Returns the engine of steps given as a mapping of step IDs to steps, like the steps of the
+        initialization data of chat.js, and the ID of the first step. The mapping is used as is, so
+        that the steps can be built when they are read.
+        """
+        engine = cls([], bot_ids=bot_ids, rng=rng)
+        engine.steps = steps
+        engine.first_step = first_step
+        return engine
+
+    def _choice(self, candidates):
+        """Picks one of the candidates like chat.js does, with Math.floor(Math.random() * length)."""
+        return candidates[int(self.rng.random() * len(candidates))]
+
+    def _is_bot(self, sender):
+        """Returns true if the sender of a message is a bot."""
+        if self.bot_ids is None:
+            return sender != USER_ID
+        return sender in self.bot_ids
+
+    def is_final_step(self, step_id):
+        """Returns true if the step doesn't exist or has no responses. Mirrors isFinalStep."""
+        # Step with this ID does not exist, which means the chat is complete.
+        if step_id not in self.steps:
+            return True
+        # Step exists, but has no user responses available, which means this is the final step.
+        return not self.steps[step_id]["responses"]
+
+    def initial_step(self, state):
+        """
+        Returns the step to display for a state. Mirrors initialStep.
+
+        If no messages have been exchanged yet, it returns the first step. Otherwise it
+        returns the current step, or None if the step is not in the script anymore, in
+        which case only the chat history is displayed.
+        """
+        if not state["messages"] and self.first_step:
+            return self.first_step
+        if state["current_step"] in self.steps:
+            return state["current_step"]
+        return None
+
+    def step_messages(self, step_id, displayed_messages):
+        """
+        Returns a message object ('message' and 'bot_id') for each group of messages of the step.
+        Mirrors stepMessages.
+
+        From each group of message variants, it picks a message not displayed yet in the
+        chat history if there is one, or any message of the group otherwise.
+        """
+        step = self.steps.get(step_id)
+        result = []
+        if step:
+            for messages in step["messages"]:
+                not_displayed = [
+                    message for message in messages
+                    if not any(
+                        displayed.get("message") == message["message"] and displayed.get("from") == message["bot_id"]
+                        for displayed in displayed_messages
+                    )
+                ]
+                candidates = not_displayed or messages
+                if candidates:
+                    result.append(self._choice(candidates))
+        return result
+
+    def bot_messages(self, state):
+        """
+        Returns the bot messages added to the chat history for the current step of the state,
+        in the format of the messages of the user state. Mirrors addBotMessages.
+
+        No messages are added if the bot sent the last message of the history, as this means
+        the bot messages of the current step have already been displayed.
+        """
+        messages = state["messages"]
+        if messages and self._is_bot(messages[-1].get("from")):
+            return []
+        return [
+            {"from": message["bot_id"], "message": message["message"], "step": state["current_step"]}
+            for message in self.step_messages(state["current_step"], messages)
+        ]
+
+    def start(self, state=None):
+        """
+        Returns the state displayed once all bot messages of the current step have been shown.
+        Mirrors initializeAndApplyState; state defaults to the state of a new conversation.
+        """
+        state = state or {"messages": [], "current_step": None}
+        state = {"messages": list(state["messages"]), "current_step": self.initial_step(state)}
+        state["messages"] += self.bot_messages(state)
+        return state
+
+    def responses(self, state):
+        """Returns the responses ('message' and 'step') available to the learner in a state."""
+        step = self.steps.get(state["current_step"])
+        return step["responses"] if step else []
+
+    def respond(self, state, response):
+        """
+        Returns the state saved once the learner picks a response. Mirrors submitResponse.
+
+        The saved state does not include the bot messages of the next step yet;
+        use start to add them.
+        """
+        user_message = {"from": USER_ID, "message": response["message"], "step": state["current_step"]}
+        return {"messages": state["messages"] + [user_message], "current_step": response["step"]}
+
+    def simulate(self, choose=None, max_responses=None):
+        """
+        Simulates a conversation from the beginning, and yields each state sent to the
+        submit_response handler, until a final step or max_responses responses.
+
+        choose is called with the displayed state and the available responses, and returns
+        the response picked by the learner. By default, responses are picked at random.
+        """
+        choose = choose or (lambda state, responses: self._choice(responses))
+        state = self.start()
+        count = 0
+        while not self.is_final_step(state["current_step"]):
+            if max_responses is not None and count >= max_responses:
+                return
+            state = self.respond(state, choose(state, self.responses(state)))
+            count += 1
+            yield state
+            state = self.start(state)
+
+    def paths(self, max_responses):
+        """
+        Yields every sequence of response indexes a learner can pick, up to max_responses
+        responses, with the final state of the conversation after each sequence.
+
+        Paths ending on a final step are complete; longer paths are cut at max_responses.
+        The variants of bot messages are picked with rng, so use FirstCandidate (or a seeded
+        generator) for a reproducible exploration.
+        """
+        pending = [((), self.start())]
+        while pending:
+            path, state = pending.pop()
+            if self.is_final_step(state["current_step"]) or len(path) >= max_responses:
+                yield path, state
+                continue
+            responses = self.responses(state)
+            for index in reversed(range(len(responses))):
+                pending.append((path + (index,), self.start(self.respond(state, responses[index]))))
@@ -0,0 +1,305 @@
+"""
+Responsive derivatives of the images of steps.
+
+Authors usually set the image-url of steps to full-resolution uploads, which the chat shows at
+a small size. The images of course assets (image-url values like /static/diagram.png) are
+resized to IMAGE_WIDTHS and recompressed, and the derivatives are offered to the browser with
+srcset and sizes, so that it downloads the smallest one that fits; the original is only loaded
+when the learner opens the image overlay. The intrinsic dimensions of each image are recorded
+with its derivatives, so that the space of the image is reserved before it loads.
+
+Derivatives are stored in a directory on disk, by SHA-256 of the original image, and only
+generated once for each version of an image: with the scripts of a course when it is published
+(see warmup.py), or in a background thread after the first view that needs them, in which case
+that view shows the original. The image of each URL is looked up again every IMAGE_INDEX_TTL
+seconds, for images replaced by new uploads. Generating derivatives requires Pillow; without it
+the original images are shown.
+
+Images are read from the course assets of Open edX, or from a directory for development and the
+workbench, configured with the CHAT_XBLOCK_IMAGES Django setting:
+
+    CHAT_XBLOCK_IMAGES = {
+        "BACKEND": "directory",  # or "assets", the default, or None to disable derivatives
+        "DIRECTORY": "/path/to/static/files",
+        "CACHE_DIRECTORY": "/var/tmp/chat-xblock-images",
+    }
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from builtins import object
+
+from .default_data import (
+    IMAGE_DEFAULT_WIDTH,
+    IMAGE_INDEX_CACHE_SIZE,
+    IMAGE_INDEX_TTL,
+    IMAGE_MAX_PENDING,
+    IMAGE_QUALITY,
+    IMAGE_SIZES,
+    IMAGE_WIDTHS,
+)
+from .utils import LRUCache
+
+log = logging.getLogger(__name__)
+
+SETTING_NAME = "CHAT_XBLOCK_IMAGES"
+STATIC_PREFIX = "/static/"
+INFO_NAME = "info.json"
+# Names of the files of the derivatives of an image, in the directory named after its hash.
+DERIVATIVE_PATTERN = re.compile(r"^(?P<hash>[0-9a-f]{64})/(?P<width>[0-9]+)\.(?P<extension>jpg|png)$")
+CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png"}
+
+_UNCONFIGURED = object()
+_backend = _UNCONFIGURED
+_cache_directory = None
+# (time looked up, info or None) of the images, by (course key, URL).
+_index = LRUCache(IMAGE_INDEX_CACHE_SIZE)
+_pending = set()
+_pending_lock = threading.Lock()
+_executor = None
+
+
+class AssetsBackend(object):
+    """Reads the images from the course assets of Open edX."""
+
+    def get(self, course_key, url):
+        """Returns the content of the asset with the given /static/ URL, or None."""
+        from xmodule.contentstore.content import StaticContent
+        from xmodule.contentstore.django import contentstore
+        from xmodule.exceptions import NotFoundError
+        if course_key is None or not url.startswith(STATIC_PREFIX):
+            return None
+        location = StaticContent.compute_location(course_key, url[len(STATIC_PREFIX):])
+        try:
+            return contentstore().find(location).data
+        except NotFoundError:
+            return None
+
+
+class DirectoryBackend(object):
+    """Reads the images with /static/ URLs from a directory, for all courses."""
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+
+    def get(self, course_key, url):
+        """Returns the content of the file with the given /static/ URL, or None."""
+        if not url.startswith(STATIC_PREFIX):
+            return None
+        path = os.path.abspath(os.path.join(self.directory, url[len(STATIC_PREFIX):]))
+        if not path.startswith(self.directory + os.sep):
+            return None
+        try:
+            with open(path, "rb") as image:
+                return image.read()
+        except IOError:
+            return None
+
+
+def _assets_backend(options):  # pylint: disable=unused-argument
+    """Returns an AssetsBackend if running in Open edX, or None."""
+    try:
+        import xmodule.contentstore.django  # pylint: disable=unused-import
+    except ImportError:
+        return None
+    return AssetsBackend()
+
+
+BACKENDS = {
+    "assets": _assets_backend,
+    "directory": lambda options: DirectoryBackend(options["DIRECTORY"]),
+}
+
+
+def _default_cache_directory():
+    return os.path.join(tempfile.gettempdir(), "chat-xblock-images")
+
+
+def _backend_from_settings():
+    """Returns the backend configured by the CHAT_XBLOCK_IMAGES setting, or None."""
+    global _cache_directory  # pylint: disable=global-statement
+    from django.conf import settings
+    options = getattr(settings, SETTING_NAME, None) or {}
+    _cache_directory = options.get("CACHE_DIRECTORY") or _default_cache_directory()
+    backend = options.get("BACKEND", "assets")
+    return BACKENDS[backend](options) if backend else None
+
+
+def get_backend():
+    """Returns the current backend, or None if derivatives are disabled."""
+    global _backend  # pylint: disable=global-statement
+    if _backend is _UNCONFIGURED:
+        _backend = _backend_from_settings()
+    return _backend
+
+
+def get_cache_directory():
+    """Returns the directory of the derivatives, configured with the backend."""
+    get_backend()
+    return _cache_directory
+
+
+def set_backend(backend, cache_directory=None):
+    """Sets the backend and the cache directory, overriding the setting; None disables derivatives."""
+    global _backend, _cache_directory  # pylint: disable=global-statement
+    _backend = backend
+    _cache_directory = cache_directory or _default_cache_directory()
+    clear_cache()
+
+
+def available():
+    """Returns true if derivatives can be generated, i.e. Pillow is installed."""
+    try:
+        import PIL  # pylint: disable=unused-import
+    except ImportError:
+        return False
+    return True
+
+
+def _write(path, data):
+    """Writes a file atomically."""
+    temporary_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+    with open(temporary_path, "wb") as output:
+        output.write(data)
+    os.replace(temporary_path, path)
+
+
+def process(data):
+    """
+    Generates the derivatives of an image, unless they are in the cache directory already, and
+    returns its info: its hash, width, height, and the widths of its derivatives and their file
+    extension. Returns None if data is not an image.
+    """
+    from PIL import Image, ImageOps
+    content_hash = hashlib.sha256(data).hexdigest()
+    directory = os.path.join(get_cache_directory(), content_hash)
+    try:
+        with open(os.path.join(directory, INFO_NAME)) as info_file:
+            return json.load(info_file)
+    except (IOError, ValueError):
+        pass
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (IOError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return None
+    animated = getattr(image, "is_animated", False)
+    image = ImageOps.exif_transpose(image)
+    info = {"hash": content_hash, "width": image.width, "height": image.height, "widths": [], "extension": None}
+    os.makedirs(directory, exist_ok=True)
+    if not animated:
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        info["extension"] = "png" if has_alpha else "jpg"
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        for width in IMAGE_WIDTHS:
+            if width >= image.width:
+                break
+            derivative = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            output = io.BytesIO()
+            if has_alpha:
+                derivative.save(output, "PNG", optimize=True)
+            else:
+                derivative.save(output, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+            _write(os.path.join(directory, "{}.{}".format(width, info["extension"])), output.getvalue())
+            info["widths"].append(width)
+    # The info file is written last, once the derivatives are complete.
+    _write(os.path.join(directory, INFO_NAME), json.dumps(info).encode("utf-8"))
+    return info
+
+
+def prepare(course_key, url):
+    """
+    Reads the image with the given URL and generates its derivatives if needed. Returns its info,
+    or None if it is not an image of the backend.
+    """
+    backend = get_backend()
+    info = None
+    if backend is not None and available():
+        data = backend.get(course_key, url)
+        if data is not None:
+            info = process(data)
+    _index.set((str(course_key), url), (time.time(), info))
+    return info
+
+
+def _prepare_in_background(course_key, url):
+    try:
+        prepare(course_key, url)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Could not generate the derivatives of the image %s of %s", url, course_key)
+        _index.set((str(course_key), url), (time.time(), None))
+    finally:
+        with _pending_lock:
+            _pending.discard((str(course_key), url))
+
+
+def lookup(course_key, url):
+    """
+    Returns the info of the image with the given URL (see process), or None if it has no
+    derivatives or they are not generated yet, in which case they are generated in a background
+    thread. Never reads the image in the calling thread.
+    """
+    if not url.startswith(STATIC_PREFIX) or get_backend() is None:
+        return None
+    global _executor  # pylint: disable=global-statement
+    key = (str(course_key), url)
+    cached = _index.get(key)
+    if cached is not None and time.time() - cached[0] < IMAGE_INDEX_TTL:
+        return cached[1]
+    with _pending_lock:
+        if key in _pending or len(_pending) >= IMAGE_MAX_PENDING:
+            return cached and cached[1]
+        _pending.add(key)
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(1, thread_name_prefix="chat-images")
+    _executor.submit(_prepare_in_background, course_key, url)
+    return cached and cached[1]
+
+
+def wait_for_background_work():
+    """Waits until the derivatives generated in the background are generated, for tests."""
+    global _executor  # pylint: disable=global-statement
+    with _pending_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def derivative_path(name):
+    """Returns the path of the derivative with the given name, like <hash>/<width>.jpg, or None."""
+    if not DERIVATIVE_PATTERN.match(name):
+        return None
+    return os.path.join(get_cache_directory(), name)
+
+
+def attributes(url, info, derivative_url):
+    """
+    Returns the attributes of the img element of the image with the given URL and info: src,
+    srcset, sizes, width and height. derivative_url(name) returns the URL of a derivative. Images
+    without derivatives, smaller than all IMAGE_WIDTHS or animated, keep their original src.
+    """
+    urls = [
+        (width, derivative_url("{}/{}.{}".format(info["hash"], width, info["extension"])))
+        for width in info["widths"]
+    ]
+    defaults = [derivative for width, derivative in urls if width <= IMAGE_DEFAULT_WIDTH] or [url]
+    return {
+        "src": defaults[-1],
+        "srcset": ", ".join("{} {}w".format(derivative, width) for width, derivative in urls),
+        "sizes": IMAGE_SIZES,
+        "width": info["width"],
+        "height": info["height"],
+    }
+
+
+def clear_cache():
+    """Forgets the images looked up; the derivatives on disk are kept."""
+    _index.clear()
@@ -0,0 +1,143 @@
+"""
+Course-level library of chat scripts.
+
+Instead of storing its own copy of a script in its steps field, a block can reference a
+script of the course's library by name, with its script_name field. Library scripts are
+YAML files in the format of the steps field. In Open edX, they are the course assets named
+<name>.yaml, uploaded in Studio from the Content - Files & Uploads page. For development and
+the workbench, the library can be a directory of <name>.yaml files shared by all courses,
+configured with the CHAT_XBLOCK_SCRIPT_LIBRARY Django setting:
+
+    CHAT_XBLOCK_SCRIPT_LIBRARY = {
+        "BACKEND": "directory",  # or "assets", the default
+        "DIRECTORY": "/path/to/scripts",
+        "TTL": 60,
+    }
+
+or by calling set_backend with any object implementing the get method of AssetsBackend.
+
+Scripts are kept in memory for TTL seconds (SCRIPT_LIBRARY_TTL by default), so that the
+library is not read on each view, and each version of a script is only compiled once by each
+process, since compiled scripts are cached by their text (see compiled.py).
+"""
+
+import io
+import logging
+import os
+import re
+import time
+from builtins import object
+
+from .default_data import SCRIPT_LIBRARY_CACHE_SIZE, SCRIPT_LIBRARY_TTL
+from .utils import LRUCache
+
+log = logging.getLogger(__name__)
+
+SETTING_NAME = "CHAT_XBLOCK_SCRIPT_LIBRARY"
+
+# Script names are used in file and asset names, so they cannot contain slashes.
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+_UNCONFIGURED = object()
+_backend = _UNCONFIGURED
+_ttl = SCRIPT_LIBRARY_TTL
+# (time fetched, text or None) of the scripts, by (course key, name).
+_cache = LRUCache(SCRIPT_LIBRARY_CACHE_SIZE)
+
+
+class AssetsBackend(object):
+    """Reads the scripts from the course assets of Open edX."""
+
+    def get(self, course_key, name):
+        """Returns the text of the script of the course with the given name, or None."""
+        try:
+            from xmodule.contentstore.content import StaticContent
+            from xmodule.contentstore.django import contentstore
+            from xmodule.exceptions import NotFoundError
+        except ImportError:
+            return None
+        if course_key is None:
+            return None
+        location = StaticContent.compute_location(course_key, "{}.yaml".format(name))
+        try:
+            content = contentstore().find(location)
+        except NotFoundError:
+            return None
+        return content.data.decode("utf-8")
+
+
+class DirectoryBackend(object):
+    """Reads the scripts from a directory, for all courses."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, course_key, name):
+        """Returns the text of the script with the given name, or None."""
+        try:
+            with io.open(os.path.join(self.directory, "{}.yaml".format(name)), encoding="utf-8") as script:
+                return script.read()
+        except IOError:
+            return None
+
+
+BACKENDS = {
+    "assets": lambda options: AssetsBackend(),
+    "directory": lambda options: DirectoryBackend(options["DIRECTORY"]),
+}
+
+
+def _backend_from_settings():
+    """Returns the backend configured by the CHAT_XBLOCK_SCRIPT_LIBRARY setting."""
+    global _ttl  # pylint: disable=global-statement
+    from django.conf import settings
+    options = getattr(settings, SETTING_NAME, None) or {}
+    _ttl = options.get("TTL", SCRIPT_LIBRARY_TTL)
+    return BACKENDS[options.get("BACKEND", "assets")](options)
+
+
+def get_backend():
+    """Returns the current backend, or None if there is no library."""
+    global _backend  # pylint: disable=global-statement
+    if _backend is _UNCONFIGURED:
+        _backend = _backend_from_settings()
+    return _backend
+
+
+def set_backend(backend, ttl=SCRIPT_LIBRARY_TTL):
+    """Sets the backend of the library, overriding the setting; None disables the library."""
+    global _backend, _ttl  # pylint: disable=global-statement
+    _backend = backend
+    _ttl = ttl
+    clear_cache()
+
+
+def is_valid_name(name):
+    """Returns true if name can be the name of a script."""
+    return bool(NAME_PATTERN.match(name))
+
+
+def get_script(course_key, name, refresh=False):
+    """
+    Returns the text of the script of the course with the given name, or None if there is no
+    such script. Scripts fetched less than TTL seconds ago are returned from memory, unless
+    refresh is true.
+    """
+    backend = get_backend()
+    if backend is None or not is_valid_name(name):
+        return None
+    key = (str(course_key), name)
+    cached = _cache.get(key)
+    now = time.time()
+    if cached is not None and not refresh and now - cached[0] < _ttl:
+        return cached[1]
+    source = backend.get(course_key, name)
+    if source is None:
+        log.warning("The chat script library of %s has no script named %s", course_key, name)
+    _cache.set(key, (now, source))
+    return source
+
+
+def clear_cache():
+    """Forgets all scripts fetched from the library."""
+    _cache.clear()
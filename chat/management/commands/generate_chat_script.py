@@ -0,0 +1,74 @@
+"""
+Management command that generates a synthetic chat script, for load and scale testing.
+
+The steps are written to standard output as YAML. Optionally, a learner transcript
+walking through the generated steps is written as JSON.
+"""
+
+import json
+
+import yaml
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.default_data import MAX_USER_RESPONSES
+from chat.scriptgen import generate_steps, generate_transcript
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic script for the Chat XBlock."
+    # The command does not depend on the project's configuration.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--steps", type=int, default=100, help="number of steps")
+        parser.add_argument("--depth", type=int, default=10, help="number of layers of steps")
+        parser.add_argument(
+            "--fan-out", type=int, default=3,
+            help="maximum number of responses per step (up to {})".format(MAX_USER_RESPONSES),
+        )
+        parser.add_argument(
+            "--loop-density", type=float, default=0.1, help="probability of a response looping back",
+        )
+        parser.add_argument("--messages", type=int, default=2, help="number of bot messages per step")
+        parser.add_argument("--variants", type=int, default=1, help="number of variants per bot message")
+        parser.add_argument("--bots", type=int, default=1, help="number of bot personas")
+        parser.add_argument(
+            "--image-frequency", type=float, default=0.0, help="probability of a step having an image",
+        )
+        parser.add_argument(
+            "--name-density", type=float, default=0.1, help="probability of a message having [NAME]",
+        )
+        parser.add_argument("--seed", type=int, default=None, help="seed of the random generator")
+        parser.add_argument(
+            "--transcript", type=int, default=0, metavar="MESSAGES",
+            help="also generate a learner transcript of up to this many messages",
+        )
+        parser.add_argument(
+            "--transcript-output", default=None, help="file to write the transcript to as JSON",
+        )
+
+    def handle(self, *args, **options):
+        if options["transcript"] and not options["transcript_output"]:
+            raise CommandError("--transcript requires --transcript-output")
+        shape = dict(
+            num_steps=options["steps"],
+            depth=options["depth"],
+            fan_out=options["fan_out"],
+            loop_density=options["loop_density"],
+            messages=options["messages"],
+            variants=options["variants"],
+            bots=options["bots"],
+            image_frequency=options["image_frequency"],
+            name_density=options["name_density"],
+            seed=options["seed"],
+        )
+        try:
+            steps = generate_steps(**shape)
+        except ValueError as error:
+            raise CommandError(str(error))
+        # The transcript walks through the steps written, which differ between calls without a seed.
+        self.stdout.write(yaml.safe_dump(steps, default_flow_style=False), ending="")
+        if options["transcript"]:
+            transcript = generate_transcript(steps, options["transcript"], seed=options["seed"])
+            with open(options["transcript_output"], "w") as output:
+                json.dump(transcript, output, indent=2)
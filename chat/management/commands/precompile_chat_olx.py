@@ -0,0 +1,55 @@
+"""
+Management command that precompiles the scripts of the chat blocks of an OLX course export.
+
+The steps of each chat block are migrated to the current format, and their compiled form is
+stored in the compiled_script field, with the hash of the steps it was compiled from, so that
+the blocks of imported courses don't have to parse their scripts again. The files are processed
+by a pool of processes, and only written if they change, so that running the command again
+leaves them as they are. A report is written to standard output as JSON lines while the files
+are processed: one line for each chat block, and a final summary line. The command exits with
+a non-zero status if the steps of any block are invalid.
+"""
+
+import functools
+import json
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import olx
+
+
+class Command(BaseCommand):
+    help = "Migrates and precompiles the scripts of the chat blocks of an OLX course export, in place."
+    # The command does not depend on the project's configuration.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="directory of the OLX course export")
+        parser.add_argument(
+            "--jobs", type=int, default=multiprocessing.cpu_count(),
+            help="number of processes precompiling files (default: number of CPUs)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="report the changes without writing them")
+
+    def handle(self, *args, **options):
+        root = options["directory"]
+        if not os.path.isdir(root):
+            raise CommandError("{} is not a directory".format(root))
+        if options["jobs"] < 1:
+            raise CommandError("--jobs has to be at least 1")
+        paths = list(olx.xml_files(root))
+        precompile = functools.partial(olx.precompile_file, dry_run=options["dry_run"])
+        summary = {"files": len(paths), "blocks": 0, "changed": 0, "migrated": 0, "invalid": 0}
+        for reports in olx.map_files(precompile, root, paths, options["jobs"]):
+            for report in reports:
+                summary["blocks"] += 1
+                summary["changed"] += report["changed"]
+                summary["migrated"] += report["migrated"]
+                summary["invalid"] += bool(report["errors"])
+                self.stdout.write(json.dumps(report, sort_keys=True))
+            self.stdout.flush()
+        self.stdout.write(json.dumps({"summary": summary}, sort_keys=True))
+        if summary["invalid"]:
+            raise CommandError("{invalid} of {blocks} chat blocks are invalid".format(**summary))
@@ -0,0 +1,47 @@
+"""
+Management command that validates the scripts of all chat blocks of an OLX course export.
+
+The XML files of the export are parsed and validated by a pool of processes. A report is
+written to standard output as JSON lines while the files are validated: one line for each
+chat block, with the path of its file, its url_name and its error messages, and a final
+summary line. The command exits with a non-zero status if any block is invalid.
+"""
+
+import json
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import olx
+
+
+class Command(BaseCommand):
+    help = "Validates the scripts of the chat blocks of an OLX course export."
+    # The command does not depend on the project's configuration.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="directory of the OLX course export")
+        parser.add_argument(
+            "--jobs", type=int, default=multiprocessing.cpu_count(),
+            help="number of processes validating files (default: number of CPUs)",
+        )
+
+    def handle(self, *args, **options):
+        root = options["directory"]
+        if not os.path.isdir(root):
+            raise CommandError("{} is not a directory".format(root))
+        if options["jobs"] < 1:
+            raise CommandError("--jobs has to be at least 1")
+        paths = list(olx.xml_files(root))
+        blocks = invalid = 0
+        for reports in olx.map_files(olx.validate_file, root, paths, options["jobs"]):
+            for report in reports:
+                blocks += 1
+                invalid += bool(report["errors"])
+                self.stdout.write(json.dumps(report, sort_keys=True))
+            self.stdout.flush()
+        self.stdout.write(json.dumps({"summary": {"files": len(paths), "blocks": blocks, "invalid": invalid}}))
+        if invalid:
+            raise CommandError("{} of {} chat blocks are invalid".format(invalid, blocks))
@@ -0,0 +1,40 @@
+"""
+Management command that compiles the scripts of the chat blocks of a list of courses, and stores
+them in the cache of compiled scripts shared by all processes, for example after a deploy.
+
+The derivatives of the images of their steps are generated too (see chat/images.py). Scripts
+that are already in the shared cache, and images that already have derivatives, are skipped. A
+report is written to standard output as JSON lines: one line for each course, with its number of
+chat blocks, of scripts compiled, of images with derivatives and of blocks that could not be
+warmed, and a final summary line.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import compiled, warmup
+
+
+class Command(BaseCommand):
+    help = "Compiles the scripts of the chat blocks of courses into the shared cache of compiled scripts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_keys", nargs="+", metavar="course_key", help="key of a course")
+
+    def handle(self, *args, **options):
+        if compiled.get_shared_cache() is None:
+            raise CommandError("The shared cache of compiled scripts is disabled")
+        summary = {"courses": 0, "blocks": 0, "compiled": 0, "images": 0, "failed": 0}
+        for course_key in options["course_keys"]:
+            report = warmup.warm_course(course_key)
+            summary["courses"] += 1
+            for key in ("blocks", "compiled", "images", "failed"):
+                summary[key] += report[key]
+            self.stdout.write(json.dumps(report, sort_keys=True))
+            self.stdout.flush()
+        self.stdout.write(json.dumps({"summary": summary}, sort_keys=True))
+        if summary["failed"]:
+            raise CommandError(
+                "{failed} of {blocks} chat blocks could not be warmed".format(**summary)
+            )
@@ -0,0 +1,183 @@
+"""
+Compiled scripts in a compact binary format, read from a memory-mapped file.
+
+A process serving many learners keeps its compiled scripts in memory as trees of Python
+objects (see compiled.py), and each worker of a server holds its own copy: even when they are
+compiled before the workers are forked, updating the reference counts of the objects copies the
+memory pages holding them. Scripts written to a file in this format are instead read from a
+read-only memory mapping of the file, shared by all the processes mapping it, and their steps
+are decoded from it on each request.
+
+The file starts with a header and an index of the scripts, by the SHA-256 of their source,
+followed by fixed-layout records and a table of the strings of all scripts, each stored once.
+All integers are unsigned 32-bit little-endian numbers:
+
+- header: magic number, format version, number of scripts, offset of the string table
+- index entry: SHA-256 of the source, offset and number of its step records
+- step record: id, image_url, image_alt, notice_type, notice_text (references to strings),
+  then the number and offset of its message records, and of its response records
+- message record: number and offset of the variant records of an item of the messages
+- variant record: message and bot_id (references to strings)
+- response record: message and step (references to strings)
+
+References to strings are offsets in the string table, or NONE for None; each string is stored
+as its length in bytes followed by its UTF-8 encoding.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from builtins import object
+
+from .compiled import _with_name
+
+MAGIC = b"CHATSCR\0"
+VERSION = 1
+NONE = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<8sIII")
+_INDEX_ENTRY = struct.Struct("<32sII")
+_STEP = struct.Struct("<9I")
+# Message, variant and response records are all pairs of integers.
+_PAIR = struct.Struct("<II")
+_LENGTH = struct.Struct("<I")
+
+
+def _digest(source):
+    return hashlib.sha256(source.encode("utf-8")).digest()
+
+
+def write(path, scripts):
+    """Writes the given (source, CompiledScript) pairs to a file, replacing it atomically."""
+    scripts = dict((_digest(source), script) for source, script in scripts)
+    records_start = _HEADER.size + _INDEX_ENTRY.size * len(scripts)
+    records = bytearray()
+    strings = bytearray()
+    string_offsets = {}
+
+    def string(text):
+        if text is None:
+            return NONE
+        offset = string_offsets.get(text)
+        if offset is None:
+            offset = string_offsets[text] = len(strings)
+            data = text.encode("utf-8")
+            strings.extend(_LENGTH.pack(len(data)) + data)
+        return offset
+
+    def append(data):
+        """Appends records, returning their offset in the file."""
+        offset = records_start + len(records)
+        records.extend(data)
+        return offset
+
+    index = []
+    for digest, script in sorted(scripts.items()):
+        steps = []
+        for step in script.steps:
+            items = [
+                (len(variants), append(b"".join(
+                    _PAIR.pack(string(variant.message), string(variant.bot_id)) for variant in variants
+                )))
+                for variants in step.messages
+            ]
+            items_offset = append(b"".join(_PAIR.pack(*item) for item in items))
+            responses_offset = append(b"".join(
+                _PAIR.pack(string(response.message), string(response.step)) for response in step.responses
+            ))
+            steps.append(_STEP.pack(
+                string(step.id), string(step.image_url), string(step.image_alt),
+                string(step.notice_type), string(step.notice_text),
+                len(items), items_offset, len(step.responses), responses_offset,
+            ))
+        index.append(_INDEX_ENTRY.pack(digest, append(b"".join(steps)), len(steps)))
+
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary_path, "wb") as scripts_file:
+        scripts_file.write(_HEADER.pack(MAGIC, VERSION, len(scripts), records_start + len(records)))
+        scripts_file.write(b"".join(index))
+        scripts_file.write(records)
+        scripts_file.write(strings)
+    os.replace(temporary_path, path)
+
+
+class MappedScripts(object):
+    """The scripts of a file written by write, mapped in memory."""
+
+    def __init__(self, path):
+        with open(path, "rb") as scripts_file:
+            self._map = mmap.mmap(scripts_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self._strings = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError("{} is not a file of compiled chat scripts of version {}".format(path, VERSION))
+        self._index = {}
+        for position in range(count):
+            entry_offset = _HEADER.size + position * _INDEX_ENTRY.size
+            digest, offset, num_steps = _INDEX_ENTRY.unpack_from(self._map, entry_offset)
+            self._index[digest] = (offset, num_steps)
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, source):
+        """Returns the MappedScript compiled from source, or None if it is not in the file."""
+        entry = self._index.get(_digest(source))
+        return MappedScript(self, *entry) if entry else None
+
+    def string(self, reference):
+        """Returns the string with the given reference."""
+        if reference == NONE:
+            return None
+        offset = self._strings + reference
+        length, = _LENGTH.unpack_from(self._map, offset)
+        offset += _LENGTH.size
+        return self._map[offset:offset + length].decode("utf-8")
+
+    def pairs(self, offset, count):
+        """Returns the count pairs of integers of the records at offset."""
+        return _PAIR.iter_unpack(self._map[offset:offset + count * _PAIR.size])
+
+    def step(self, offset):
+        """Returns the integers of the step record at offset."""
+        return _STEP.unpack_from(self._map, offset)
+
+
+class MappedScript(object):
+    """A compiled script of a MappedScripts file, with the interface of CompiledScript."""
+
+    __slots__ = ("_scripts", "_offset", "_num_steps", "__weakref__")
+
+    def __init__(self, scripts, offset, num_steps):
+        self._scripts = scripts
+        self._offset = offset
+        self._num_steps = num_steps
+
+    def as_list(self, name):
+        """Returns the steps in the format returned by ChatXBlock._normalize_step."""
+        scripts = self._scripts
+        string = scripts.string
+        steps = []
+        for position in range(self._num_steps):
+            (step_id, image_url, image_alt, notice_type, notice_text,
+             num_items, items, num_responses, responses) = scripts.step(self._offset + position * _STEP.size)
+            steps.append({
+                "id": string(step_id),
+                "messages": [
+                    [
+                        {"message": _with_name(string(message), name), "bot_id": string(bot_id)}
+                        for message, bot_id in scripts.pairs(variants, num_variants)
+                    ]
+                    for num_variants, variants in scripts.pairs(items, num_items)
+                ],
+                "image_url": string(image_url),
+                "image_alt": _with_name(string(image_alt), name),
+                "notice_type": string(notice_type),
+                "notice_text": _with_name(string(notice_text), name),
+                "responses": [
+                    {"message": _with_name(string(message), name), "step": string(step)}
+                    for message, step in scripts.pairs(responses, num_responses)
+                ],
+            })
+        return steps
@@ -0,0 +1,206 @@
+"""
+Instrumentation of the hot paths of the Chat XBlock.
+
+Timings, counters and gauges are sent to a pluggable sink. Instrumentation is disabled
+by default; it can be enabled with the CHAT_XBLOCK_METRICS Django setting:
+
+    CHAT_XBLOCK_METRICS = {
+        "SINK": "statsd",  # or "logging" or "memory"
+        "HOST": "127.0.0.1",
+        "PORT": 8125,
+        "PREFIX": "xblock_chat",
+    }
+
+or by calling set_sink with any object implementing the methods of Sink. When disabled,
+the instrumented code only pays for a function call and a check of the current sink.
+"""
+
+import functools
+import json
+import logging
+import socket
+import threading
+from builtins import object
+from timeit import default_timer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = "xblock_chat"
+DEFAULT_STATSD_HOST = "127.0.0.1"
+DEFAULT_STATSD_PORT = 8125
+
+_UNCONFIGURED = object()
+_sink = _UNCONFIGURED
+
+
+class Sink(object):
+    """Base class of metrics sinks. Timings are in milliseconds."""
+
+    def timing(self, name, milliseconds):
+        raise NotImplementedError
+
+    def increment(self, name, value=1):
+        raise NotImplementedError
+
+    def gauge(self, name, value):
+        raise NotImplementedError
+
+
+class MemorySink(Sink):
+    """Keeps metrics in memory, for tests and benchmarks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def timing(self, name, milliseconds):
+        with self._lock:
+            self.timings.setdefault(name, []).append(milliseconds)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def reset(self):
+        """Forgets all metrics recorded so far."""
+        with self._lock:
+            self.timings = {}
+            self.counters = {}
+            self.gauges = {}
+
+
+class LoggingSink(Sink):
+    """Logs each metric, at the given level of the logger of this module."""
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def timing(self, name, milliseconds):
+        log.log(self.level, "timing %s: %.3f ms", name, milliseconds)
+
+    def increment(self, name, value=1):
+        log.log(self.level, "counter %s: +%s", name, value)
+
+    def gauge(self, name, value):
+        log.log(self.level, "gauge %s: %s", name, value)
+
+
+class StatsdSink(Sink):
+    """
+    Sends metrics to a statsd server over UDP, one packet per metric.
+
+    Sending never blocks and errors are ignored, so that an unreachable server
+    doesn't affect learners.
+    """
+
+    def __init__(self, host=DEFAULT_STATSD_HOST, port=DEFAULT_STATSD_PORT, prefix=DEFAULT_PREFIX):
+        self.address = (host, port)
+        self.prefix = "{}.".format(prefix) if prefix else ""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def _send(self, name, value, metric_type):
+        packet = "{}{}:{}|{}".format(self.prefix, name, value, metric_type)
+        try:
+            self.socket.sendto(packet.encode("utf-8"), self.address)
+        except (IOError, OSError):
+            pass
+
+    def timing(self, name, milliseconds):
+        self._send(name, "{:.3f}".format(milliseconds), "ms")
+
+    def increment(self, name, value=1):
+        self._send(name, value, "c")
+
+    def gauge(self, name, value):
+        self._send(name, value, "g")
+
+
+SINKS = {
+    "memory": lambda options: MemorySink(),
+    "logging": lambda options: LoggingSink(),
+    "statsd": lambda options: StatsdSink(
+        options.get("HOST", DEFAULT_STATSD_HOST),
+        options.get("PORT", DEFAULT_STATSD_PORT),
+        options.get("PREFIX", DEFAULT_PREFIX),
+    ),
+}
+
+
+def _sink_from_settings():
+    """Returns the sink configured by the CHAT_XBLOCK_METRICS setting, or None."""
+    from django.conf import settings
+    options = getattr(settings, "CHAT_XBLOCK_METRICS", None)
+    if not options or not options.get("SINK"):
+        return None
+    return SINKS[options["SINK"]](options)
+
+
+def get_sink():
+    """Returns the current sink, or None if instrumentation is disabled."""
+    global _sink  # pylint: disable=global-statement
+    if _sink is _UNCONFIGURED:
+        _sink = _sink_from_settings()
+    return _sink
+
+
+def set_sink(sink):
+    """Sets the sink receiving the metrics; None disables instrumentation."""
+    global _sink  # pylint: disable=global-statement
+    _sink = sink
+
+
+def enabled():
+    """Returns true if instrumentation is enabled, for skipping work only needed by metrics."""
+    return get_sink() is not None
+
+
+def timing(name, milliseconds):
+    """Records a timing, in milliseconds."""
+    sink = get_sink()
+    if sink is not None:
+        sink.timing(name, milliseconds)
+
+
+def increment(name, value=1):
+    """Increments a counter."""
+    sink = get_sink()
+    if sink is not None:
+        sink.increment(name, value)
+
+
+def gauge(name, value):
+    """Records the current value of a gauge."""
+    sink = get_sink()
+    if sink is not None:
+        sink.gauge(name, value)
+
+
+def gauge_json_size(name, data):
+    """Records the size in bytes of data encoded as JSON. The data is only encoded if enabled."""
+    sink = get_sink()
+    if sink is not None:
+        sink.gauge(name, len(json.dumps(data).encode("utf-8")))
+
+
+def timed(name):
+    """Decorator recording the duration of each call of the decorated function."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sink = _sink if _sink is not _UNCONFIGURED else get_sink()
+            if sink is None:
+                return func(*args, **kwargs)
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sink.timing(name, (default_timer() - start) * 1000)
+        return wrapper
+    return decorator
@@ -0,0 +1,175 @@
+"""
+Chat blocks of OLX course exports.
+
+A course export is a directory of XML files. Chat blocks are either defined in place, like
+<chat url_name="..." steps="..."/>, or by a pointer element, <chat url_name="..."/>, and the
+definition in chat/<url_name>.xml. The scripts of the course's script library (see library.py)
+are the course assets in the static directory.
+
+The files of an export are processed in parallel by map_files, for the validate_chat_olx and
+precompile_chat_olx management commands.
+"""
+
+import functools
+import io
+import multiprocessing
+import os
+from xml.etree import ElementTree
+
+import yaml
+
+from . import compiled, library
+from .chat import ChatXBlock
+from .default_data import DEFAULT_DATA, OLX_CHUNK_SIZE
+
+CHAT_TAG = "chat"
+STATIC_DIRECTORY = "static"
+
+
+def xml_files(root):
+    """Yields the paths of the XML files of the export in root, relative to root, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Course assets are not OLX, even if some of them are XML files.
+        if dirpath == root and STATIC_DIRECTORY in dirnames:
+            dirnames.remove(STATIC_DIRECTORY)
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".xml"):
+                yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+
+def map_files(function, root, paths, jobs):
+    """
+    Yields the results of function(root, path) for each of the paths, in order, as they are
+    computed by a pool of jobs processes.
+    """
+    function = functools.partial(function, root)
+    if jobs == 1:
+        for path in paths:
+            yield function(path)
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in pool.imap(function, paths, chunksize=OLX_CHUNK_SIZE):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _definition_path(url_name):
+    return os.path.join(CHAT_TAG, "{}.xml".format(url_name))
+
+
+def parse(root, path):
+    """
+    Returns the ElementTree of the XML file at root/path, with the comments and processing
+    instructions of its root element, so that it can be written back as it was.
+
+    Raises ElementTree.ParseError if the file is not valid XML.
+    """
+    parser = ElementTree.XMLParser(target=ElementTree.TreeBuilder(insert_comments=True, insert_pis=True))
+    return ElementTree.parse(os.path.join(root, path), parser)
+
+
+def chat_blocks(root, path, tree):
+    """
+    Yields the (url_name, element) of the chat blocks defined in the tree of the XML file at
+    root/path. Pointer elements are skipped, since their blocks are defined in their own files.
+    """
+    for element in tree.getroot().iter(CHAT_TAG):
+        url_name = element.get("url_name")
+        is_pointer = list(element.attrib) == ["url_name"] and len(element) == 0
+        if is_pointer and path != _definition_path(url_name) and \
+                os.path.exists(os.path.join(root, _definition_path(url_name))):
+            continue
+        if url_name is None and element is tree.getroot():
+            url_name = os.path.splitext(os.path.basename(path))[0]
+        yield url_name, element
+
+
+def _invalid_xml_report(path, error):
+    return {"path": path, "url_name": None, "errors": [u"Invalid XML: {}".format(error)]}
+
+
+def validate_file(root, path):
+    """
+    Validates the chat blocks defined in the XML file at root/path with the rules of the Studio
+    editor, and returns a report for each of them: a dictionary with the path of the file, the
+    url_name of the block and the list of error messages.
+    """
+    try:
+        tree = parse(root, path)
+    except ElementTree.ParseError as error:
+        return [_invalid_xml_report(path, error)]
+    scripts = library.DirectoryBackend(os.path.join(root, STATIC_DIRECTORY))
+    reports = []
+    for url_name, element in chat_blocks(root, path, tree):
+        errors = []
+        script_name = element.get("script_name")
+        # pylint: disable=protected-access
+        if script_name:
+            source = scripts.get(None, script_name) if library.is_valid_name(script_name) else None
+            ChatXBlock._validate_library_script(script_name, source, errors.append)
+        else:
+            ChatXBlock._validate_steps(element.get("steps", DEFAULT_DATA), errors.append)
+        reports.append({"path": path, "url_name": url_name, "errors": errors})
+    return reports
+
+
+def migrate_steps(source):
+    """
+    Returns the steps in source in the current format: the messages of each step are a list,
+    even if there is only one. The source is returned unchanged if it is already in this
+    format, so that migrating is idempotent. Steps are assumed to be valid.
+    """
+    steps = yaml.safe_load(source)
+    migrated = False
+    for step in steps:
+        content = list(step.values())[0]
+        if not isinstance(content["messages"], list):
+            content["messages"] = [content["messages"]]
+            migrated = True
+    if not migrated:
+        return source
+    return yaml.safe_dump(steps, default_flow_style=False, allow_unicode=True, sort_keys=False)
+
+
+def precompile_file(root, path, dry_run=False):
+    """
+    Migrates the steps of the chat blocks defined in the XML file at root/path to the current
+    format, and stores their compiled form in the compiled_script field. The file is only
+    written if a block changed, unless dry_run is true.
+
+    Returns a report for each block: a dictionary with the path of the file, the url_name of
+    the block, whether its steps were migrated, whether it changed, and the errors that
+    prevented compiling it. Blocks using the default steps or a shared script are left as they
+    are, since their scripts are compiled once for all blocks.
+    """
+    try:
+        tree = parse(root, path)
+    except ElementTree.ParseError as error:
+        return [dict(_invalid_xml_report(path, error), migrated=False, changed=False)]
+    reports = []
+    for url_name, element in chat_blocks(root, path, tree):
+        report = {"path": path, "url_name": url_name, "migrated": False, "changed": False, "errors": []}
+        reports.append(report)
+        source = element.get("steps")
+        if source is None or element.get("script_name"):
+            continue
+        # pylint: disable=protected-access
+        ChatXBlock._validate_steps(source, report["errors"].append)
+        if report["errors"]:
+            continue
+        migrated = migrate_steps(source)
+        steps = [ChatXBlock._normalize_step(step) for step in yaml.safe_load(migrated)]
+        script = compiled.serialize(migrated, steps)
+        report["migrated"] = migrated != source
+        report["changed"] = report["migrated"] or element.get("compiled_script") != script
+        element.set("steps", migrated)
+        element.set("compiled_script", script)
+    if not dry_run and any(report["changed"] for report in reports):
+        with io.open(os.path.join(root, path), "rb") as xml_file:
+            declaration = xml_file.read(5) == b"<?xml"
+        tree.write(os.path.join(root, path), encoding="utf-8", xml_declaration=declaration)
+    return reports
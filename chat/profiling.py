@@ -0,0 +1,125 @@
+"""
+Allocation profiling of the entry points of the Chat XBlock, with tracemalloc.
+
+From tests and benchmarks, profile any code with allocation_profile:
+
+    with allocation_profile("student_view") as report:
+        block.student_view()
+    print(report.format())
+
+In the workbench (or any other Django project), set the CHAT_XBLOCK_PROFILE_ALLOCATIONS
+setting or environment variable to profile every call of student_view and submit_response.
+Each report is logged, with the peak memory and the sites allocating the most memory, and
+the peak is also sent to the metrics sink (see metrics.py). Profiling slows down requests
+considerably, so it is only meant for debugging.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+from builtins import object
+
+from . import metrics
+from .default_data import ALLOCATION_PROFILE_FRAMES, ALLOCATION_PROFILE_TOP_SITES
+
+log = logging.getLogger(__name__)
+
+SETTING_NAME = "CHAT_XBLOCK_PROFILE_ALLOCATIONS"
+
+_UNCONFIGURED = object()
+_enabled = _UNCONFIGURED
+
+
+class AllocationReport(object):
+    """
+    Memory allocated while running some code: peak and net bytes, and the top allocation
+    sites as (file:line, bytes, number of blocks) tuples, sorted by decreasing size.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.peak_bytes = None
+        self.net_bytes = None
+        self.top_sites = []
+
+    def format(self):
+        lines = ["Allocations of {}: peak {} bytes, net {} bytes".format(self.name, self.peak_bytes, self.net_bytes)]
+        for site, size, count in self.top_sites:
+            lines.append("  {}: {} bytes in {} blocks".format(site, size, count))
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def allocation_profile(name, top_sites=ALLOCATION_PROFILE_TOP_SITES):
+    """
+    Context manager profiling the allocations of its body, and yielding an AllocationReport
+    that is filled in when the body exits.
+
+    The peak is relative to the memory traced when entering. If tracemalloc was not tracing
+    yet, it is started for the duration of the body.
+    """
+    import tracemalloc
+    report = AllocationReport(name)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(ALLOCATION_PROFILE_FRAMES)
+    try:
+        # reset_peak is only available from Python 3.9.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        current_before = tracemalloc.get_traced_memory()[0]
+        yield report
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "lineno")
+    report.peak_bytes = peak - current_before
+    report.net_bytes = current - current_before
+    report.top_sites = [
+        ("{}:{}".format(stat.traceback[0].filename, stat.traceback[0].lineno), stat.size_diff, stat.count_diff)
+        for stat in sorted(stats, key=lambda stat: stat.size_diff, reverse=True)[:top_sites]
+        if stat.size_diff > 0
+    ]
+
+
+def _enabled_from_settings():
+    from django.conf import settings
+    value = getattr(settings, SETTING_NAME, None)
+    if value is None:
+        value = os.environ.get(SETTING_NAME, "").lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def is_enabled():
+    """Returns true if the entry points are profiled."""
+    global _enabled  # pylint: disable=global-statement
+    if _enabled is _UNCONFIGURED:
+        _enabled = _enabled_from_settings()
+    return _enabled
+
+
+def set_enabled(enabled):
+    """Enables or disables profiling of the entry points, overriding the setting."""
+    global _enabled  # pylint: disable=global-statement
+    _enabled = enabled
+
+
+def profiled(name):
+    """Decorator profiling the allocations of each call of an entry point, when enabled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with allocation_profile(name) as report:
+                result = func(*args, **kwargs)
+            log.info(report.format())
+            metrics.gauge("allocations.{}.peak_bytes".format(name), report.peak_bytes)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+"""
+Caching proxy for the images of steps hosted on other sites.
+
+Scripts often reference images on slow third-party hosts (image-url values like
+https://example.com/diagram.png), which delay the chat and break it when they are down. When
+the proxy is enabled, the image URLs of steps that are not on the site are replaced by URLs of
+the proxy_image handler of the block, which fetches each image from its origin once, keeps it
+in a directory on disk, and serves it with long-lived cache headers. Only the images of the
+script of the block can be fetched through its handler, by the SHA-256 of their URL, so that
+the proxy cannot be used to fetch other URLs.
+
+Images are kept until the total size of the directory exceeds its maximum, when the least
+recently served ones are deleted. The proxy is configured with the CHAT_XBLOCK_IMAGE_PROXY
+Django setting:
+
+    CHAT_XBLOCK_IMAGE_PROXY = {
+        "ENABLED": True,
+        "CACHE_DIRECTORY": "/var/tmp/chat-xblock-image-proxy",
+        "MAX_CACHE_SIZE": 256 * 1024 * 1024,
+    }
+
+Since images are cached by URL, an image replaced at its origin is only fetched again once it
+has been evicted; scripts should reference new versions of images by new URLs.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from builtins import object
+
+from .default_data import IMAGE_PROXY_MAX_CACHE_SIZE, IMAGE_PROXY_MAX_IMAGE_SIZE, IMAGE_PROXY_TIMEOUT
+
+log = logging.getLogger(__name__)
+
+SETTING_NAME = "CHAT_XBLOCK_IMAGE_PROXY"
+PROXIED_SCHEMES = ("http://", "https://")
+
+
+class ProxyError(Exception):
+    """Raised when an image cannot be fetched from its origin."""
+
+
+def url_digest(url):
+    """Returns the name of the image with the given URL in the cache, and in proxy URLs."""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _touch(path):
+    """
+    Sets the modification time of a cached image to the current time, for evicting the least
+    recently served images. The time is set explicitly, since file systems may record the time
+    of changes with a coarser resolution.
+    """
+    now = time.time()
+    os.utime(path, (now, now))
+
+
+class ImageCache(object):
+    """
+    A directory of images fetched from their origin, of at most max_size bytes in total. Each
+    file holds the content type of an image on its first line, followed by the image.
+    """
+
+    def __init__(self, directory, max_size=IMAGE_PROXY_MAX_CACHE_SIZE, timeout=IMAGE_PROXY_TIMEOUT):
+        self.directory = directory
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # Locks of the URLs being fetched, so that each image is fetched once at a time.
+        self._fetching = {}
+
+    def _path(self, url):
+        return os.path.join(self.directory, url_digest(url))
+
+    def _read(self, url):
+        """Returns the content type and content of the cached image with the given URL, or None."""
+        path = self._path(url)
+        try:
+            with open(path, "rb") as image_file:
+                content_type = image_file.readline().decode("ascii").strip()
+                body = image_file.read()
+        except IOError:
+            return None
+        try:
+            _touch(path)
+        except OSError:
+            pass
+        return content_type, body
+
+    def fetch(self, url):
+        """
+        Returns the content type and content of the image with the given URL, from the cache or
+        from its origin. Raises ProxyError if it cannot be fetched or is not an image.
+        """
+        cached = self._read(url)
+        if cached is not None:
+            return cached
+        with self._lock:
+            lock = self._fetching.setdefault(url, threading.Lock())
+        try:
+            with lock:
+                cached = self._read(url)
+                if cached is None:
+                    cached = self._fetch_from_origin(url)
+                    self._store(url, *cached)
+        except ProxyError as error:
+            log.warning("%s", error)
+            raise
+        finally:
+            with self._lock:
+                self._fetching.pop(url, None)
+        return cached
+
+    def _fetch_from_origin(self, url):
+        from urllib.error import URLError
+        from urllib.request import urlopen
+        if not url.startswith(PROXIED_SCHEMES):
+            raise ProxyError("Not an HTTP URL: {}".format(url))
+        try:
+            with urlopen(url, timeout=self.timeout) as response:
+                content_type = response.headers.get_content_type()
+                body = response.read(IMAGE_PROXY_MAX_IMAGE_SIZE + 1)
+        except (URLError, IOError, ValueError) as error:
+            raise ProxyError("Could not fetch {}: {}".format(url, error))
+        if not content_type.startswith("image/"):
+            raise ProxyError("Not an image: {} ({})".format(url, content_type))
+        if len(body) > IMAGE_PROXY_MAX_IMAGE_SIZE:
+            raise ProxyError("Image larger than {} bytes: {}".format(IMAGE_PROXY_MAX_IMAGE_SIZE, url))
+        return content_type, body
+
+    def _store(self, url, content_type, body):
+        """Stores an image atomically, then evicts the least recently served images if needed."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(url)
+        temporary_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.current_thread().ident)
+        with open(temporary_path, "wb") as image_file:
+            image_file.write(content_type.encode("ascii") + b"\n" + body)
+        os.replace(temporary_path, path)
+        _touch(path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def size(self):
+        """Returns the total size of the cached images, in bytes."""
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+
+_UNCONFIGURED = object()
+_cache = _UNCONFIGURED
+
+
+def _cache_from_settings():
+    """Returns the cache configured by the CHAT_XBLOCK_IMAGE_PROXY setting, or None if disabled."""
+    from django.conf import settings
+    options = getattr(settings, SETTING_NAME, None) or {}
+    if not options.get("ENABLED"):
+        return None
+    return ImageCache(
+        options.get("CACHE_DIRECTORY") or os.path.join(tempfile.gettempdir(), "chat-xblock-image-proxy"),
+        options.get("MAX_CACHE_SIZE", IMAGE_PROXY_MAX_CACHE_SIZE),
+        options.get("TIMEOUT", IMAGE_PROXY_TIMEOUT),
+    )
+
+
+def get_cache():
+    """Returns the current ImageCache, or None if the proxy is disabled."""
+    global _cache  # pylint: disable=global-statement
+    if _cache is _UNCONFIGURED:
+        _cache = _cache_from_settings()
+    return _cache
+
+
+def set_cache(cache):
+    """Sets the ImageCache, overriding the setting; None disables the proxy."""
+    global _cache  # pylint: disable=global-statement
+    _cache = cache
+
+
+def is_proxied(url):
+    """Returns true if the image with the given URL is served through the proxy."""
+    return bool(url) and url.startswith(PROXIED_SCHEMES) and get_cache() is not None
@@ -30,8 +30,21 @@ function ChatTemplates(init_data) {
     var imageTemplate = function(step) {
         var attributes = {
             'src': step.image_url,
-            'alt': step.image_alt || ''
+            'alt': step.image_alt || '',
+            // The image overlay shows the original image.
+            'attributes': {'data-image-url': step.image_url}
         };
+        // The resized derivatives of the image, and its dimensions, reserving its space before it loads.
+        var image = init_data['images'][step.image_url];
+        if (image) {
+            attributes['src'] = image.src;
+            if (image.srcset) {
+                attributes['srcset'] = image.srcset;
+                attributes['sizes'] = image.sizes;
+            }
+            attributes['width'] = image.width;
+            attributes['height'] = image.height;
+        }
         return (
             h('img', attributes)
         );
@@ -246,7 +259,7 @@ function ChatTemplates(init_data) {
         }
         var attributes = {};
         if (ctx.show_buttons_entering || ctx.show_buttons_leaving) {
-            var transition_duration = init_data["buttons_entering_transition_duration"];
+            var transition_duration = ctx.buttons_transition_duration;
             attributes.style = {
                 transition: 'max-height '+ transition_duration + 'ms linear'
             };
@@ -274,6 +287,13 @@ function ChatTemplates(init_data) {
         if (init_data['enable_restart_button'] && ctx.show_buttons_entering) {
             children.push(h('button.restart-button', gettext('Restart')));
         }
+        if (ctx.show_express_toggle) {
+            children.push(h(
+                'button.express-button',
+                {attributes: {'aria-pressed': String(ctx.express_mode)}},
+                gettext('Express mode')
+            ));
+        }
         return h('div.actions', children);
     };
 
@@ -310,17 +330,597 @@ function ChatTemplates(init_data) {
     return mainTemplate;
 }
 
+/**
+ * ChatTelemetry: records the durations of a chat block's operations and sends them to the
+ * server in batches.
+ *
+ * Durations are measured with performance.mark/measure, so that they also show in the
+ * browser's performance tools, and buffered until options.batch_size values have been
+ * recorded, options.flush_interval ms have passed, or the page is hidden. Only a fraction
+ * (options.sample_rate) of the page views record anything; for the others all methods
+ * do nothing.
+ *
+ * options.url: URL of the telemetry handler.
+ * options.block_id: unique id of the block, used to name the performance marks.
+ */
+function ChatTelemetry(options) {
+    "use strict";
+
+    var sampled = !!options.url && Math.random() < (options.sample_rate || 0);
+    var perf = window.performance;
+    var measures = {};
+    var counts = {};
+    var buffered = 0;
+    var flush_timer = null;
+    var mark_id = 0;
+
+    var now = function() {
+        return perf && perf.now ? perf.now() : new Date().getTime();
+    };
+
+    /**
+     * send: posts the buffered values, with sendBeacon when the page is being hidden.
+     */
+    var send = function(use_beacon) {
+        if (!buffered) {
+            return;
+        }
+        var data = JSON.stringify({measures: measures, counts: counts});
+        measures = {};
+        counts = {};
+        buffered = 0;
+        clearTimeout(flush_timer);
+        flush_timer = null;
+        if (use_beacon && navigator.sendBeacon) {
+            navigator.sendBeacon(options.url, data);
+        } else {
+            $.ajax({type: 'POST', url: options.url, data: data});
+        }
+    };
+
+    var buffer = function() {
+        buffered += 1;
+        if (buffered >= options.batch_size) {
+            send(false);
+        } else if (flush_timer === null) {
+            flush_timer = setTimeout(function() { send(false); }, options.flush_interval);
+        }
+    };
+
+    var record = function(name, duration) {
+        (measures[name] = measures[name] || []).push(Math.round(duration * 10) / 10);
+        buffer();
+    };
+
+    if (sampled) {
+        document.addEventListener('visibilitychange', function() {
+            if (document.visibilityState === 'hidden') {
+                send(true);
+            }
+        });
+    }
+
+    return {
+        /** sampled: returns true if this page view records telemetry. */
+        sampled: function() {
+            return sampled;
+        },
+        /**
+         * start: starts measuring an operation, and returns a function that ends the measure.
+         * Calling the returned function more than once only records the first call.
+         */
+        start: function(name) {
+            if (!sampled) {
+                return function() {};
+            }
+            var start_mark = 'chat-' + options.block_id + '-' + name + '-' + (mark_id++);
+            var start_time = now();
+            if (perf && perf.mark) {
+                perf.mark(start_mark);
+            }
+            var ended = false;
+            return function() {
+                if (ended) {
+                    return;
+                }
+                ended = true;
+                var duration = now() - start_time;
+                if (perf && perf.measure) {
+                    try {
+                        perf.measure('chat:' + name, start_mark);
+                        perf.clearMarks(start_mark);
+                    } catch (e) {
+                        // The mark was cleared by the page, the duration is still recorded.
+                    }
+                }
+                record(name, duration);
+            };
+        },
+        /** since: records the time elapsed since the start of the page view. */
+        since: function(name) {
+            if (sampled && perf && perf.now) {
+                record(name, perf.now());
+            }
+        },
+        /** count: counts an event, like a failed request. */
+        count: function(name) {
+            if (sampled) {
+                counts[name] = (counts[name] || 0) + 1;
+                buffer();
+            }
+        },
+        /** flush: sends the buffered values right away. */
+        flush: function() {
+            send(false);
+        }
+    };
+}
+
+/**
+ * ChatTimeline: schedules the actions, delays and DOM updates of a chat block on animation frames.
+ * Queued actions run in order, separated by the queued delays. DOM updates requested while
+ * actions run are batched, so that the block is rendered at most once per frame.
+ * The timeline can be fast-forwarded (running all pending actions without delays) or cancelled.
+ *
+ * options.render: function that patches the DOM; called once per frame if the timeline was invalidated.
+ * options.isActive: function that returns false once the block has been removed from the page.
+ */
+function ChatTimeline(options) {
+    "use strict";
+
+    var queue = [];
+    var tweens = {};
+    var after_render = [];
+    var wait_until = null;
+    var invalidated = false;
+    var running = false;
+    var frame_id = null;
+
+    var requestFrame = function(callback) {
+        if (window.requestAnimationFrame) {
+            return window.requestAnimationFrame(callback);
+        }
+        return setTimeout(callback, 16);
+    };
+
+    var cancelFrame = function(id) {
+        if (window.cancelAnimationFrame) {
+            window.cancelAnimationFrame(id);
+        } else {
+            clearTimeout(id);
+        }
+    };
+
+    var now = function() {
+        if (window.performance && window.performance.now) {
+            return window.performance.now();
+        }
+        return new Date().getTime();
+    };
+
+    var hasTweens = function() {
+        return Object.keys(tweens).length > 0;
+    };
+
+    var scheduleFrame = function() {
+        if (frame_id === null) {
+            frame_id = requestFrame(onFrame);
+        }
+    };
+
+    var cancel = function() {
+        queue = [];
+        tweens = {};
+        after_render = [];
+        wait_until = null;
+        if (frame_id !== null) {
+            cancelFrame(frame_id);
+            frame_id = null;
+        }
+    };
+
+    var onFrame = function() {
+        frame_id = null;
+        if (options.isActive && !options.isActive()) {
+            cancel();
+            return;
+        }
+        run(false);
+    };
+
+    /**
+     * flush: renders the pending DOM updates and calls the callbacks waiting for them.
+     */
+    var flush = function() {
+        if (!invalidated) {
+            return;
+        }
+        invalidated = false;
+        options.render();
+        var callbacks = after_render;
+        after_render = [];
+        callbacks.forEach(function(callback) {
+            callback();
+        });
+    };
+
+    /**
+     * stepTweens: advances running tweens to the given time.
+     */
+    var stepTweens = function(time) {
+        Object.keys(tweens).forEach(function(name) {
+            var tween = tweens[name];
+            var progress = 1;
+            if (tween.duration > 0) {
+                progress = Math.min((time - tween.start) / tween.duration, 1);
+            }
+            tween.step(progress);
+            if (progress >= 1) {
+                delete tweens[name];
+            }
+        });
+    };
+
+    /**
+     * run: runs queued actions until a delay that has not elapsed yet is reached,
+     * then renders once. If fast_forward is true, delays and tweens are skipped.
+     */
+    var run = function(fast_forward) {
+        if (running) {
+            // Actions queued while running are picked up by the running loop.
+            return;
+        }
+        running = true;
+        try {
+            while (queue.length) {
+                var item = queue[0];
+                if (item.action) {
+                    queue.shift();
+                    item.action();
+                    continue;
+                }
+                if (!fast_forward) {
+                    if (wait_until === null) {
+                        wait_until = now() + item.delay;
+                    }
+                    if (now() < wait_until) {
+                        break;
+                    }
+                }
+                queue.shift();
+                wait_until = null;
+            }
+            flush();
+            stepTweens(fast_forward ? Infinity : now());
+        } finally {
+            running = false;
+        }
+        if (queue.length || invalidated || hasTweens()) {
+            scheduleFrame();
+        }
+    };
+
+    return {
+        /** then: queues an action. */
+        then: function(action) {
+            queue.push({action: action});
+            return this;
+        },
+        /** wait: queues a delay in milliseconds. */
+        wait: function(delay) {
+            if (delay > 0) {
+                queue.push({delay: delay});
+            }
+            return this;
+        },
+        /** run: starts running queued actions right away. */
+        run: function() {
+            run(false);
+            return this;
+        },
+        /** fastForward: runs all queued actions without waiting and finishes running tweens. */
+        fastForward: function() {
+            run(true);
+            return this;
+        },
+        /** cancel: drops all queued actions, delays and tweens. Pending DOM updates are kept. */
+        cancel: function() {
+            cancel();
+            if (invalidated) {
+                scheduleFrame();
+            }
+            return this;
+        },
+        /** invalidate: requests a render on the next flush. */
+        invalidate: function() {
+            invalidated = true;
+            if (!running) {
+                scheduleFrame();
+            }
+        },
+        /** flush: renders pending DOM updates synchronously. */
+        flush: flush,
+        /** afterRender: calls callback once the pending DOM updates have been rendered. */
+        afterRender: function(callback) {
+            after_render.push(callback);
+        },
+        /**
+         * tween: calls step with the progress (0 to 1) of an animation of the given duration
+         * on every frame. Starting a tween replaces a running tween with the same name.
+         */
+        tween: function(name, duration, step) {
+            tweens[name] = {start: now(), duration: duration, step: step};
+            if (!running) {
+                scheduleFrame();
+            }
+        }
+    };
+}
+
+/**
+ * ChatStorage: stores the state of a learner's chat blocks in localStorage.
+ *
+ * States are stored in a compact encoding, and an index keeps the last access time and size
+ * of every stored state. When the stored states would exceed the budget (in bytes), the least
+ * recently used states are evicted. The budget is LOCAL_STORAGE_BUDGET of default_data.py,
+ * passed in the init data. All methods ignore errors thrown by localStorage, which may not be
+ * available or may be forbidden by browser settings.
+ *
+ * To inspect the storage used by a learner from the browser console, run:
+ *
+ *     ChatStorage('<anonymous student id>', <budget>).footprint()
+ */
+function ChatStorage(user_id, budget) {
+    "use strict";
+
+    var FORMAT_VERSION = 1;
+
+    var prefix = 'chat-xblock/' + user_id + '/';
+    var index_key = 'chat-xblock-index/' + user_id;
+    var preferences_key = 'chat-xblock-preferences/' + user_id;
+
+    /**
+     * entrySize: returns the approximate number of bytes used by a localStorage entry.
+     * Browsers store strings as UTF-16.
+     */
+    var entrySize = function(key, value) {
+        return (key.length + value.length) * 2;
+    };
+
+    /**
+     * readIndex: returns the index of stored states as {key: [last access time, size]}.
+     * States stored before the index existed are added as the least recently used ones.
+     */
+    var readIndex = function() {
+        var index = JSON.parse(localStorage.getItem(index_key));
+        if (index) {
+            return index;
+        }
+        index = {};
+        for (var i = 0; i < localStorage.length; i++) {
+            var key = localStorage.key(i);
+            if (key.indexOf(prefix) === 0) {
+                index[key] = [0, entrySize(key, localStorage.getItem(key))];
+            }
+        }
+        return index;
+    };
+
+    var writeIndex = function(index) {
+        localStorage.setItem(index_key, JSON.stringify(index));
+    };
+
+    /**
+     * usedBytes: returns the number of bytes used by the stored states and the index.
+     */
+    var usedBytes = function(index) {
+        var total = entrySize(index_key, JSON.stringify(index));
+        Object.keys(index).forEach(function(key) {
+            total += index[key][1];
+        });
+        return total;
+    };
+
+    /**
+     * leastRecentlyUsed: returns the key of the least recently used state of the index, or null.
+     */
+    var leastRecentlyUsed = function(index) {
+        var keys = Object.keys(index);
+        if (!keys.length) {
+            return null;
+        }
+        return keys.reduce(function(oldest, key) {
+            return index[key][0] < index[oldest][0] ? key : oldest;
+        });
+    };
+
+    var removeState = function(index, key) {
+        localStorage.removeItem(key);
+        delete index[key];
+    };
+
+    /**
+     * evict: removes the least recently used states until the stored states and
+     * an additional entry of extra_bytes fit in the budget.
+     */
+    var evict = function(index, extra_bytes) {
+        var key;
+        while (usedBytes(index) + extra_bytes > budget && (key = leastRecentlyUsed(index)) !== null) {
+            removeState(index, key);
+        }
+    };
+
+    /**
+     * storeState: stores a state. If the origin's quota is full, possibly because of other data,
+     * removes the least recently used other states one at a time until it fits; throws if it
+     * still does not fit once only this state is left.
+     */
+    var storeState = function(index, key, value) {
+        for (;;) {
+            try {
+                localStorage.setItem(key, value);
+                return;
+            } catch (e) {
+                var oldest = leastRecentlyUsed(index);
+                if (oldest === null) {
+                    throw e;
+                }
+                removeState(index, oldest);
+            }
+        }
+    };
+
+    /**
+     * encode: serializes a state as [version, current step, senders, messages], where each
+     * message is [index of sender, step, message].
+     */
+    var encode = function(state) {
+        var senders = [];
+        var messages = state.messages.map(function(message) {
+            var sender = senders.indexOf(message.from);
+            if (sender === -1) {
+                sender = senders.push(message.from) - 1;
+            }
+            return [sender, message.step, message.message];
+        });
+        return JSON.stringify([FORMAT_VERSION, state.current_step, senders, messages]);
+    };
+
+    /**
+     * decode: deserializes a state stored by encode, or the plain JSON used by earlier versions.
+     */
+    var decode = function(value) {
+        var data = JSON.parse(value);
+        if (!$.isArray(data)) {
+            return data;
+        }
+        if (data[0] !== FORMAT_VERSION) {
+            return null;
+        }
+        var senders = data[2];
+        return {
+            current_step: data[1],
+            messages: data[3].map(function(message) {
+                return {from: senders[message[0]], message: message[2], step: message[1]};
+            })
+        };
+    };
+
+    return {
+        /** get: returns the state stored for a block, or null if there is none. */
+        get: function(block_id) {
+            var key = prefix + block_id;
+            try {
+                var value = localStorage.getItem(key);
+                if (value === null) {
+                    return null;
+                }
+                var index = readIndex();
+                index[key] = [new Date().getTime(), entrySize(key, value)];
+                writeIndex(index);
+                return decode(value);
+            } catch (e) {
+                return null;
+            }
+        },
+        /** set: stores the state of a block, evicting other states if needed. */
+        set: function(block_id, state) {
+            var key = prefix + block_id;
+            var value = encode(state);
+            var size = entrySize(key, value);
+            try {
+                var index = readIndex();
+                // The current state is not in the index while others are evicted for it.
+                delete index[key];
+                evict(index, size);
+                storeState(index, key, value);
+                index[key] = [new Date().getTime(), size];
+                writeIndex(index);
+            } catch (e) {
+                // There is nothing we can do about that, so just ignore the error.
+            }
+        },
+        /** remove: removes the state stored for a block. */
+        remove: function(block_id) {
+            var key = prefix + block_id;
+            try {
+                localStorage.removeItem(key);
+                var index = readIndex();
+                delete index[key];
+                writeIndex(index);
+            } catch (e) {
+                // We can safely ignore that error.
+            }
+        },
+        /** getPreference: returns a preference of the learner that applies to all chat blocks. */
+        getPreference: function(name) {
+            try {
+                var preferences = JSON.parse(localStorage.getItem(preferences_key)) || {};
+                return preferences.hasOwnProperty(name) ? preferences[name] : null;
+            } catch (e) {
+                return null;
+            }
+        },
+        /** setPreference: stores a preference of the learner that applies to all chat blocks. */
+        setPreference: function(name, value) {
+            try {
+                var preferences = JSON.parse(localStorage.getItem(preferences_key)) || {};
+                preferences[name] = value;
+                localStorage.setItem(preferences_key, JSON.stringify(preferences));
+            } catch (e) {
+                // The preference only lasts for this page view.
+            }
+        },
+        /** footprint: returns the number of stored states and the bytes they use. */
+        footprint: function() {
+            try {
+                var index = readIndex();
+                return {states: Object.keys(index).length, bytes: usedBytes(index), budget: budget};
+            } catch (e) {
+                return null;
+            }
+        }
+    };
+}
+
 function ChatXBlock(runtime, element, init_data) {
     "use strict";
 
+    // The data shared by all learners is embedded in the markup, and init_data only
+    // holds the data specific to this learner.
+    var $shared_init_data = $(element).find('.chat-shared-init-data');
+    if ($shared_init_data.length) {
+        init_data = $.extend(JSON.parse($shared_init_data.text()), init_data);
+    }
+
+    var telemetry = ChatTelemetry({
+        url: runtime.handlerUrl(element, 'record_telemetry'),
+        block_id: init_data["block_id"],
+        sample_rate: init_data["telemetry"]["sample_rate"],
+        batch_size: init_data["telemetry"]["batch_size"],
+        flush_interval: init_data["telemetry"]["flush_interval"]
+    });
+    var end_first_render = telemetry.start('first_render');
+    var is_interactive = false;
+
     var renderView = ChatTemplates(init_data);
 
     var $element = $(element);
     var element = $element[0];
-    var $root = $element.find('.chat-block');
+    var $root = $element.find('.chat-wrapper');
     var root = $root[0];
 
     var __vdom = virtualDom.h();
+    var rendered_state;
+
+    var timeline = ChatTimeline({
+        render: function() {
+            patchState(rendered_state);
+        },
+        isActive: function() {
+            return $.contains(document.documentElement, root);
+        }
+    });
 
     var bot_sound = new Audio(init_data["bot_sound_url"]);
     var response_sound = new Audio(init_data["response_sound_url"]);
@@ -329,68 +929,48 @@ function ChatXBlock(runtime, element, init_data) {
 
     var last_sound_played;
 
+    var storage = ChatStorage(init_data["anonymous_student_id"], init_data["local_storage_budget"]);
+
     /**
-     * localStorageKey: returns a key under which state for this block instance
-     * is stored in localStorage.
+     * isExpressMode: returns true if the learner chose express mode, or, if they did not
+     * make a choice, if their browser asks for reduced motion.
      */
-    var localStorageKey = function() {
-        var user_id = init_data["anonymous_student_id"];
-        var block_id = init_data["block_id"];
-        return 'chat-xblock/' +  user_id + '/' + block_id;
+    var isExpressMode = function() {
+        var choice = storage.getPreference('express');
+        if (choice !== null) {
+            return choice;
+        }
+        return !!(window.matchMedia && window.matchMedia('(prefers-reduced-motion: reduce)').matches);
+    };
+
+    var express_mode = isExpressMode();
+
+    /**
+     * timings: returns the animation delays and transition durations currently in effect.
+     */
+    var timings = function() {
+        return express_mode ? init_data["express_timings"] : init_data["timings"];
     };
 
     /**
      * getStateFromLocalStorage: returns state saved in local storage, or null if it does not exist.
      */
     var getStateFromLocalStorage = function() {
-        var key = localStorageKey();
-        var state = null;
-        try {
-            state = localStorage.getItem(key);
-        } catch (e) {
-            // Fetching state from local storage will fail if localStorage is not available,
-            // or if browser settings forbid access to localStorage.
-            // Return null in that case.
-            return null;
-        }
-        return JSON.parse(state);
+        return storage.get(init_data["block_id"]);
     };
 
     /**
      * saveStateToLocalStorage: stores state to local storage. Ignores errors.
      */
-    var saveStateToLocalStorage = function(serialized_state) {
-        var key = localStorageKey();
-        try {
-            localStorage.setItem(key, serialized_state);
-        } catch (e) {
-            // Storing state to local storage will fail if localStorage is not available,
-            // or if browser settings forbid access to localStorage.
-            // There is nothing we can do about that, so just ignore the error.
-        }
+    var saveStateToLocalStorage = function(user_state) {
+        storage.set(init_data["block_id"], user_state);
     };
 
     /**
      * clearLocalStorage: removes any state that this block stored to local storage.
      */
     var clearLocalStorage = function() {
-        var key = localStorageKey();
-        try {
-            localStorage.removeItem(key);
-        } catch (e) {
-            // Accessing local storage will fail if localStorage is not available,
-            // or if browser settings forbid access to localStorage.
-            // We can safely ignore that error.
-        }
-    };
-
-    /**
-     * pause: delays execution with a timeout
-     */
-    var pause = function(timeout) {
-        var promise = $.Deferred();
-        setTimeout(promise.resolve, timeout);
-        return promise;
+        storage.remove(init_data["block_id"]);
     };
 
     /**
@@ -399,50 +979,128 @@ function ChatXBlock(runtime, element, init_data) {
      * user data passed from the backend
      */
     var init = function() {
+        var end_init = telemetry.start('init');
         $element.on('click', '.response-button', submitResponse);
         $element.on('click', '.restart-button', restartChat);
+        $element.on('click', '.express-button', toggleExpressMode);
         $element.on('click', '.message-body img', showImageOverlay);
         $element.on('click', '.image-overlay', closeImageOverlay);
-        var init_state = getStateFromLocalStorage() || init_data["user_state"];
-        var state = initializeAndApplyState(init_state);
         // Try to load state from local storage and fall back to init_data.
+        var local_state = getStateFromLocalStorage();
+        var server_state = init_data["user_state"];
+        var state;
+        if (local_state && !isRenderedByServer(local_state)) {
+            discardServerMarkup();
+            state = initializeAndApplyState(local_state);
+        } else {
+            state = initializeAndApplyState(server_state, true);
+        }
         // Some mobile apps expect the chat_complete handler to be invoked
         // every time when loading the block if block is in complete state.
         pingHandlerIfComplete(state);
+        end_init();
+        if (isFinalStep(state.current_step)) {
+            markInteractive();
+        }
         return state;
     };
 
+    /**
+     * markInteractive: records the time until the learner can first respond, or read the whole
+     * transcript of a completed chat.
+     */
+    var markInteractive = function() {
+        if (!is_interactive) {
+            is_interactive = true;
+            telemetry.since('interactive');
+        }
+    };
+
+    /**
+     * isRenderedByServer: returns true if the transcript rendered by the server already
+     * reflects the state saved in local storage. Local storage is ahead of the server
+     * when the last submit_response request did not complete.
+     */
+    var isRenderedByServer = function(local_state) {
+        var server_state = init_data["user_state"];
+        return (
+            local_state.current_step === server_state.current_step &&
+            local_state.messages.length <= server_state.messages.length
+        );
+    };
+
+    /**
+     * discardServerMarkup: replaces the transcript rendered by the server with an empty
+     * element, so that the chat is rendered from scratch.
+     */
+    var discardServerMarkup = function() {
+        var empty_root = document.createElement('div');
+        root.parentNode.replaceChild(empty_root, root);
+        root = empty_root;
+        $root = $(root);
+    };
+
     /**
      * initializeAndApplyState: given initial state object, sets default values and applies the state.
+     * If hydrate is true, the DOM rendered by the server for this state is adopted as is.
      */
-    var initializeAndApplyState = function(state) {
+    var initializeAndApplyState = function(state, hydrate) {
         state.current_step = initialStep(state);
-        state = addBotMessages(state);
         state.scroll_delay = 0;
         state.image_overlay = null;
         state.image_dimensions = {};
         state.subject = init_data["subject"];
-        resetButtonSelection(state)();
+        state.selected_button = {
+            step_id: null,
+            message: null
+        };
+        if (hydrate) {
+            __vdom = render(state, true);
+        }
+        applyState(state);
+        state = addBotMessages(state);
+        if (state.messages.length) {
+            // Learners returning to the chat do not wait for the bot messages of their current step.
+            timeline.fastForward();
+        }
         preloadImages();
         applyState(state);
+        timeline.flush();
         $(root).find('.message.bot').focus();
-        state.scroll_delay = init_data["scroll_delay"];
+        state.scroll_delay = timings()["scroll_delay"];
         return state;
     };
 
     /**
      * preloadImages: preload all images used in this block and store their dimensions.
+     * The images of steps with resized derivatives are loaded by the browser from their srcset
+     * when they are shown, and their original only when the image overlay is opened.
      */
     var preloadImages = function() {
-        loadImage(init_data["user_image_url"]);
+        var loading = [loadImage(init_data["user_image_url"])];
         Object.keys(init_data["bot_image_urls"]).forEach(function(bot_id) {
-            loadImage(init_data["bot_image_urls"][bot_id]);
+            loading.push(loadImage(init_data["bot_image_urls"][bot_id]));
         });
         Object.keys(init_data["steps"]).forEach(function(step_id) {
-            if (init_data["steps"][step_id].image_url) {
-                loadImage(init_data["steps"][step_id].image_url);
+            var image_url = init_data["steps"][step_id].image_url;
+            var image = init_data["images"][image_url];
+            if (image) {
+                state.image_dimensions[image_url] = {width: image.width, height: image.height};
+            } else if (image_url) {
+                loading.push(loadImage(image_url));
             }
         });
+        // Record the time until all images are loaded or failed to load.
+        var end_preload = telemetry.start('image_preload');
+        var pending = loading.length;
+        loading.forEach(function(promise) {
+            promise.always(function() {
+                pending -= 1;
+                if (!pending) {
+                    end_preload();
+                }
+            });
+        });
     };
 
     /**
@@ -518,8 +1176,11 @@ function ChatXBlock(runtime, element, init_data) {
      * showButtons: renders available user responses
      */
     var showButtons = function(state) {
+        markInteractive();
         state.show_buttons = true;
         applyState(state);
+        // Render the buttons before marking them as entering, so that the css transition takes place.
+        timeline.flush();
         state.show_buttons_entering = true;
         applyState(state);
     };
@@ -561,13 +1222,6 @@ function ChatXBlock(runtime, element, init_data) {
         applyState(state);
     };
 
-    /**
-     * waitForButtonsHiding: sets a pause while the css transition for hiding the buttons container takes place
-     */
-    var waitForButtonsHiding = function() {
-        return pause(init_data["buttons_leaving_transition_duration"]);
-    };
-
     /**
      * createUserMessage: removes the buttons container and creates the new user message
      * triggering the fadein css animation
@@ -579,18 +1233,19 @@ function ChatXBlock(runtime, element, init_data) {
             state.show_buttons = false;
             state.show_buttons_leaving = false;
             applyState(state);
-            $(root).find('.message.user').focus();
+            timeline.afterRender(function() {
+                $(root).find('.message.user').focus();
+            });
         };
     };
 
     /**
-     * waitUserMessageAnimation: sets a pause for each animation on a new user message
+     * userMessageAnimationDelay: returns the delay for each animation on a new user message
      * (one for the message fading in and one for the message being displayed normally in the chat history)
      */
-    var waitUserMessageAnimation = function() {
+    var userMessageAnimationDelay = function() {
         var user_message_animations = 2;
-        var delay_split = init_data["user_message_animation_delay"] / user_message_animations;
-        return pause(delay_split);
+        return timings()["user_message_animation_delay"] / user_message_animations;
     };
 
     /**
@@ -607,7 +1262,7 @@ function ChatXBlock(runtime, element, init_data) {
 
     /**
      * isFinalStep: returns true if current step doesn't exist or has no responses.
-       This is the JS equivalent of the _is_final_step method of the XBlock.
+       This is the JS equivalent of ChatEngine.is_final_step in engine.py.
      */
     var isFinalStep = function(step) {
         var steps_dict = init_data["steps"];
@@ -639,17 +1294,20 @@ function ChatXBlock(runtime, element, init_data) {
      * saveState: stores state to localStorage and sends it to the server.
      */
     var saveState = function() {
-        var serialized_state = JSON.stringify({
+        var user_state = {
             messages: state.messages,
             current_step: state.current_step
-        });
+        };
         // Save to localStorage.
-        saveStateToLocalStorage(serialized_state);
+        saveStateToLocalStorage(user_state);
         // Submit state to backend.
+        var end_sync = telemetry.start('sync');
         $.ajax({
             type: 'POST',
             url: runtime.handlerUrl(element, "submit_response"),
-            data: serialized_state
+            data: JSON.stringify(user_state)
+        }).done(end_sync).fail(function() {
+            telemetry.count('sync_failure');
         });
         // If it's the final step ping the chat_complete handler
         pingHandlerIfComplete(state);
@@ -659,6 +1317,8 @@ function ChatXBlock(runtime, element, init_data) {
      * restartChat: reset chat state and start from beginning.
      */
     var restartChat = function() {
+        // Drop the animations still pending for the previous conversation.
+        timeline.cancel();
         clearLocalStorage();
         $.ajax({
             type: 'POST',
@@ -690,30 +1350,43 @@ function ChatXBlock(runtime, element, init_data) {
         // buttons should no longer be interactable at this state, so ignore any additional
         // clicks.
         if (state.show_buttons_leaving) { return; }
-        var promise;
         var $response = $(event.target).closest('.response-button');
         var step_id = JSON.parse($response.attr('data-step_id'));
         var message = JSON.parse($response.attr('data-message'));
         playSound(response_sound);
         playSoundInMutedLoop(bot_sound);
-        promise = $.Deferred();
-        promise.then(selectButton(step_id, message))
+        timeline
+          .then(selectButton(step_id, message))
           .then(hideButtons)
-          .then(waitForButtonsHiding)
+          .wait(timings()["buttons_leaving_transition_duration"])
           .then(resetButtonSelection(state))
           .then(createUserMessage(message))
-          .then(waitUserMessageAnimation)
+          .wait(userMessageAnimationDelay())
           .then(addUserMessageToHistory(step_id))
-          .then(waitUserMessageAnimation)
+          .wait(userMessageAnimationDelay())
           .then(saveState)
-          .then(addNewBotMessages(state));
-        promise.resolve();
+          .then(addNewBotMessages(state))
+          .run();
+    };
+
+    /**
+     * toggleExpressMode: switches express mode on or off and remembers the learner's choice.
+     * Switching it on finishes the animations that are still pending.
+     */
+    var toggleExpressMode = function() {
+        express_mode = !express_mode;
+        storage.setPreference('express', express_mode);
+        state.scroll_delay = timings()["scroll_delay"];
+        if (express_mode) {
+            timeline.fastForward();
+        }
+        applyState(state);
     };
 
     var showImageOverlay = function(event) {
         var img = event.currentTarget;
         state.image_overlay = {
-            image_url: img.src,
+            image_url: img.getAttribute('data-image-url') || img.src,
             image_alt: img.alt
         };
         applyState(state);
@@ -725,31 +1398,49 @@ function ChatXBlock(runtime, element, init_data) {
     };
 
     /**
-     * applyState: patches the DOM and sets a new chat block based on the passed state.
-     * It also animates the transition
+     * applyState: schedules patching the DOM based on the passed state.
+     * Multiple calls within the same frame result in a single render.
      */
     var applyState = function(state) {
+        rendered_state = state;
+        timeline.invalidate();
+    };
+
+    /**
+     * patchState: patches the DOM and sets a new chat block based on the passed state.
+     * It also animates the transition
+     */
+    var patchState = function(state) {
+        var end_patch = telemetry.start('apply_state');
         var new_vdom = render(state);
         var patches = virtualDom.diff(__vdom, new_vdom);
         root = virtualDom.patch(root, patches);
         $root = $(root);
         animate(state);
         __vdom = new_vdom;
+        end_patch();
+        end_first_render();
     };
 
     /**
      * animate: scrolls to the last message displayed and plays the bot sound
-     * if there are response buttons and the bot sound wasn't the last played
+     * if there are response buttons and the bot sound wasn't the last played.
+     * Layout is read only once, right after the DOM has been patched.
      */
     var animate = function(state) {
-        var $container = $root.find('.main-area');
-        var scroll_top = $container.prop('scrollHeight');
-        if (!state.scroll_delay) {
-            $container.scrollTop(scroll_top);
-        } else if (state.bot_spinner || (state.show_buttons && !state.show_buttons_leaving) || state.new_user_message) {
-            $container.animate(
-                {scrollTop: scroll_top},
-                {duration: state.scroll_delay, queue: false});
+        var container = $root.find('.main-area')[0];
+        if (container) {
+            var scroll_from = container.scrollTop;
+            var scroll_to = container.scrollHeight;
+            if (!state.scroll_delay) {
+                container.scrollTop = scroll_to;
+            } else if (state.bot_spinner || (state.show_buttons && !state.show_buttons_leaving) || state.new_user_message) {
+                timeline.tween('scroll', state.scroll_delay, function(progress) {
+                    // Same "swing" easing as jQuery.animate.
+                    var eased = 0.5 - Math.cos(progress * Math.PI) / 2;
+                    container.scrollTop = scroll_from + (scroll_to - scroll_from) * eased;
+                });
+            }
         }
         if (last_sound_played != bot_sound && $root.find('.bot.fadein-message').length) {
             playSound(bot_sound);
@@ -773,7 +1464,8 @@ function ChatXBlock(runtime, element, init_data) {
     /**
      * stepMessages: returns a message object for each step.messages item in the list.
      * If the item contains more than one element, it tries to randomly select messages still
-     * not displayed by the bot in the history
+     * not displayed by the bot in the history.
+     * Keep in sync with ChatEngine.step_messages in engine.py.
      */
     var stepMessages = function(step, displayed_messages) {
         var result = [];
@@ -799,13 +1491,14 @@ function ChatXBlock(runtime, element, init_data) {
      * initialStep: if no messages have been exchanged yet returns the first step.
      * It also verifies that the current step is a valid step. If the current step
      * is not in the list of steps anymore (maybe it was deleted or changed), the UI
-     * should just display the chat history
+     * should just display the chat history.
+     * Keep in sync with ChatEngine.initial_step in engine.py.
      */
     var initialStep = function(state) {
         var result;
-        var first_step = init_data["first_step"];
-        if (!state.messages.length && first_step) {
-            result = first_step.id;
+        var first_step_id = init_data["first_step_id"];
+        if (!state.messages.length && first_step_id) {
+            result = first_step_id;
         } else if (state.current_step in init_data["steps"]) {
             result = state.current_step;
         };
@@ -831,20 +1524,14 @@ function ChatXBlock(runtime, element, init_data) {
     };
 
     /**
-     * waitBotMessageAnimation: sets a pause for each animation on a new bot message
-     * (one for the spinner and one for the message being displayed normally in the chat history).
-     * If a message is passed an extra delay is added to the pause based on the message length
+     * botMessageAnimationDelay: returns the delay for the spinner shown before a new bot message.
+     * An extra delay is added based on the message length
      */
-    var waitBotMessageAnimation = function(message) {
-        var typing_delay_per_character = 0;
+    var botMessageAnimationDelay = function(message) {
         var bot_message_animations = 2;
-        var delay_split = init_data["bot_message_animation_delay"] / bot_message_animations;
-        if (message) {
-            typing_delay_per_character = message.length * init_data["typing_delay_per_character"];
-        }
-        return function() {
-            return pause(delay_split + typing_delay_per_character);
-        };
+        var delay_split = timings()["bot_message_animation_delay"] / bot_message_animations;
+        var typing_delay_per_character = message.length * timings()["typing_delay_per_character"];
+        return delay_split + typing_delay_per_character;
     };
 
     /**
@@ -855,6 +1542,9 @@ function ChatXBlock(runtime, element, init_data) {
             state.bot_spinner = null;
             state.new_bot_message = createMessageFromSender(message, bot_id, step.id);
             applyState(state);
+            // Render the new message right away instead of batching it with adding the message
+            // to the history, so that its fade in animation starts and the bot sound is played.
+            timeline.flush();
         };
     };
 
@@ -881,7 +1571,6 @@ function ChatXBlock(runtime, element, init_data) {
      * chat history pausing execution between renderings
      */
     var addBotMessages = function(oldState) {
-        var promise;
         var step = init_data["steps"][oldState.current_step];
         var step_messages = stepMessages(step, oldState.messages);
         // If the bot was the last sending messages
@@ -892,19 +1581,17 @@ function ChatXBlock(runtime, element, init_data) {
             return oldState;
         }
         if (step_messages.length) {
-            var promise = $.Deferred();
-            step_messages.reduce(function(acc_promise, step_message, index, array) {
+            step_messages.forEach(function(step_message, index) {
                 var message = step_message.message;
                 var bot_id = step_message.bot_id;
                 var is_last_message_in_step = index === (step_messages.length - 1);
-                return acc_promise
+                timeline
                     .then(showSpinner(oldState, bot_id))
-                    .then(waitBotMessageAnimation(message))
+                    .wait(botMessageAnimationDelay(message))
                     .then(createBotMessage(oldState, bot_id, message, step))
-                    .then(waitBotMessageAnimation)
                     .then(addBotMessageToHistory(oldState, is_last_message_in_step));
-            }, promise);
-            promise.resolve();
+            });
+            timeline.run();
         } else {
             showButtons(oldState);
         }
@@ -912,9 +1599,11 @@ function ChatXBlock(runtime, element, init_data) {
     };
 
     /**
-     * render: renders the current state of the app
+     * render: renders the current state of the app. If server_markup is true, it renders
+     * only the elements included in the markup rendered by the server.
      */
-    var render = function(state) {
+    var render = function(state, server_markup) {
+        var is_complete = isFinalStep(state.current_step) && !state.bot_spinner && !state.new_bot_message;
         var context = {
             messages: state.messages,
             current_step: state.current_step,
@@ -927,7 +1616,12 @@ function ChatXBlock(runtime, element, init_data) {
             selected_button: state.selected_button,
             image_overlay: state.image_overlay,
             image_dimensions: state.image_dimensions,
-            subject: state.subject
+            subject: state.subject,
+            buttons_transition_duration: timings()["buttons_entering_transition_duration"],
+            express_mode: express_mode,
+            show_express_toggle: (
+                !server_markup && !is_complete && init_data["timing_profile"] !== 'express'
+            )
         };
         return renderView(context);
     };
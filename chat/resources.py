@@ -0,0 +1,80 @@
+"""
+Resources of the Chat XBlock read when rendering the student view: the template and the
+JavaScript translations.
+
+Resources are read and templates are compiled the first time they are used, and kept in
+memory for the lifetime of the process, so that rendering does no filesystem or template
+compilation work. When editing them during development, call clear() (for example from the
+Django shell of a long-running server) for the changes to be picked up.
+"""
+
+import threading
+
+_cache = {}
+# Reentrant, as loading a template reads its text.
+_lock = threading.RLock()
+
+
+def _importlib_resources():
+    """Returns importlib.resources, or its importlib_resources backport before Python 3.9."""
+    import importlib.resources
+    if hasattr(importlib.resources, "files"):
+        return importlib.resources
+    import importlib_resources
+    return importlib_resources
+
+
+def resource(path):
+    """Returns a resource of the package, like public/bot.wav, as an importlib.resources Traversable."""
+    return _importlib_resources().files(__package__).joinpath(path)
+
+
+def as_file(path):
+    """Returns a context manager providing the path of a resource of the package on the filesystem."""
+    return _importlib_resources().as_file(resource(path))
+
+
+def cached(key, load):
+    """Returns the resource cached with the given key, calling load() to load it the first time."""
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    with _lock:
+        if key not in _cache:
+            _cache[key] = load()
+        return _cache[key]
+
+
+def read(path):
+    """Reads a resource of the package, like public/bot.wav, and returns its bytes."""
+    return resource(path).read_bytes()
+
+
+def text(path):
+    """Returns the text of a resource of the package, read once per process."""
+    return cached(("text", path), lambda: read(path).decode("utf8"))
+
+
+def template(path):
+    """Returns a Django template of the package, like templates/chat.html, compiled once per process."""
+    return cached(("template", path), lambda: _compile_template(text(path)))
+
+
+def _compile_template(source):
+    """Compiles a template, with the template tag libraries of the installed Django apps."""
+    from django.template import Engine, Template
+    from django.template.backends.django import get_installed_libraries
+    return Template(source, engine=Engine(libraries=get_installed_libraries()))
+
+
+def render(path, context):
+    """Renders a template of the package with the given context."""
+    from django.template import Context
+    return template(path).render(Context(context))
+
+
+def clear():
+    """Forgets all resources, so that they are read again from the package when next used."""
+    with _lock:
+        _cache.clear()
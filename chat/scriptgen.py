@@ -0,0 +1,162 @@
+"""
+Generator of synthetic chat scripts and learner transcripts, for load and scale testing.
+
+The shape of the generated scripts is controlled by the number of steps, the depth
+(number of layers of steps the learner goes through), the fan-out of responses,
+the density of responses that loop back to earlier steps, the number of messages and
+message variants per step, the number of bot personas, and the frequency of images
+and [NAME] placeholders. The same seed always generates the same script.
+
+From the command line, use the generate_chat_script management command:
+
+    python manage.py generate_chat_script --steps 1000 --depth 20 --bots 5 --seed 42 > steps.yaml
+    python manage.py generate_chat_script --steps 100 --transcript 50 --transcript-output transcript.json
+"""
+
+import random
+
+import yaml
+
+from .default_data import DEFAULT_BOT_ID, MAX_USER_RESPONSES, NAME_PLACEHOLDER, USER_ID
+
+WORDS = (
+    "about", "answer", "bot", "chat", "course", "example", "great", "help", "idea", "learn",
+    "lesson", "maybe", "more", "next", "question", "really", "right", "step", "think", "topic",
+)
+
+
+def _sentence(rng, num_words, name_density=0.0):
+    """Returns a random sentence, which includes the name placeholder with probability name_density."""
+    words = [rng.choice(WORDS) for _ in range(num_words)]
+    if rng.random() < name_density:
+        words.insert(rng.randint(0, len(words)), NAME_PLACEHOLDER)
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def _bot_id(index):
+    """Returns the id of the bot persona with the given index, as used in scripts."""
+    return "bot-{}".format(index)
+
+
+def _layers(num_steps, depth):
+    """Splits the step indexes into depth consecutive layers of (almost) equal size."""
+    depth = max(1, min(depth, num_steps))
+    size, remainder = divmod(num_steps, depth)
+    layers = []
+    start = 0
+    for layer in range(depth):
+        end = start + size + (1 if layer < remainder else 0)
+        layers.append(list(range(start, end)))
+        start = end
+    return layers
+
+
+def generate_steps(
+        num_steps=100, depth=10, fan_out=3, loop_density=0.1, messages=2, variants=1, bots=1,
+        image_frequency=0.0, name_density=0.1, seed=None,
+):
+    """
+    Returns a list of steps, in the format of the steps field once decoded from YAML.
+
+    Steps are arranged in depth layers. Responses lead to steps of the next layer, or with
+    probability loop_density back to a step of the same or an earlier layer. Steps of the
+    last layer have no responses, which completes the chat.
+    """
+    if not 1 <= fan_out <= MAX_USER_RESPONSES:
+        raise ValueError("fan_out has to be between 1 and {}".format(MAX_USER_RESPONSES))
+    rng = random.Random(seed)
+    layers = _layers(num_steps, depth)
+    steps = []
+    for layer_index, layer in enumerate(layers):
+        for index in layer:
+            content = {"messages": []}
+            for _ in range(messages):
+                message_variants = []
+                for _ in range(variants):
+                    text = _sentence(rng, rng.randint(3, 12), name_density)
+                    if bots > 1:
+                        message_variants.append({_bot_id(rng.randrange(bots)): text})
+                    else:
+                        message_variants.append(text)
+                content["messages"].append(message_variants if variants > 1 else message_variants[0])
+            if rng.random() < image_frequency:
+                content["image-url"] = "http://example.com/images/step{}.png".format(index)
+                content["image-alt"] = _sentence(rng, 4)
+            if layer_index + 1 < len(layers):
+                content["responses"] = []
+                for response_index in range(rng.randint(1, fan_out)):
+                    if rng.random() < loop_density:
+                        target = rng.randint(0, layer[-1])
+                    else:
+                        target = rng.choice(layers[layer_index + 1])
+                    text = "{}. {}".format(response_index + 1, _sentence(rng, rng.randint(1, 5)))
+                    content["responses"].append({text: "step{}".format(target)})
+            steps.append({"step{}".format(index): content})
+    return steps
+
+
+def generate_steps_yaml(**kwargs):
+    """Returns the YAML of a script generated by generate_steps, as expected by the steps field."""
+    return yaml.safe_dump(generate_steps(**kwargs), default_flow_style=False)
+
+
+def generate_bot_image_urls(bots):
+    """Returns the YAML mapping of bot personas to image URLs, as expected by the bot_image_url field."""
+    if bots <= 1:
+        return ""
+    return yaml.safe_dump(dict(
+        (_bot_id(index), "/static/{}.png".format(_bot_id(index)))
+        for index in range(bots)
+    ), default_flow_style=False)
+
+
+def _bot_messages(rng, step_id, content, name):
+    """Returns the bot messages of a step, picking one variant of each message at random."""
+    messages = content["messages"]
+    if not isinstance(messages, list):
+        messages = [messages]
+    result = []
+    for message in messages:
+        if isinstance(message, list):
+            message = rng.choice(message)
+        if isinstance(message, dict):
+            items = [("custom/{}".format(bot_id), text) for bot_id, text in message.items()]
+        else:
+            items = [(DEFAULT_BOT_ID, message)]
+        for bot_id, text in items:
+            result.append({"from": bot_id, "message": text.replace(NAME_PLACEHOLDER, name), "step": step_id})
+    return result
+
+
+def generate_session(steps, max_messages=100, seed=None, name="Learner"):
+    """
+    Returns the successive user states of a learner walking through the steps.
+
+    Each state is a dictionary with 'messages' and 'current_step', in the format sent by
+    the front end to the submit_response handler after each response of the learner.
+    The walk ends at a final step, or once the transcript has max_messages messages.
+    """
+    rng = random.Random(seed)
+    contents = dict((str(list(step.keys())[0]), list(step.values())[0]) for step in steps)
+    step_id = str(list(steps[0].keys())[0]) if steps else None
+    messages = []
+    states = []
+    while step_id in contents:
+        content = contents[step_id]
+        messages = messages + _bot_messages(rng, step_id, content, name)
+        responses = content.get("responses") or []
+        if not responses or len(messages) >= max_messages:
+            break
+        response = rng.choice(responses)
+        text, next_step = list(response.items())[0]
+        messages = messages + [{"from": USER_ID, "message": str(text), "step": step_id}]
+        step_id = str(next_step)
+        states.append({"messages": messages, "current_step": step_id})
+    return states
+
+
+def generate_transcript(steps, max_messages=100, seed=None, name="Learner"):
+    """Returns the last user state of a session generated by generate_session."""
+    states = generate_session(steps, max_messages, seed, name)
+    return states[-1] if states else {"messages": [], "current_step": None}
@@ -0,0 +1,22 @@
+"""
+Reporting of the client-side timings sent by chat.js.
+
+The record_telemetry handler forwards each timing sent by the front end to the metrics sink
+(see metrics.py) as a timing like client.sync, and each counter like client.sync_failure. The
+percentiles are computed by the metrics backend (like statsd) from the timings of all the
+processes serving the blocks, rather than by each process from the timings it received.
+"""
+
+from . import metrics
+
+
+def record(measures, counts):
+    """
+    Reports a batch of timings ({name: [ms, ...]}) and counters ({name: count}) sent by the
+    front end to the metrics sink.
+    """
+    for name, values in measures.items():
+        for value in values:
+            metrics.timing("client.{}".format(name), value)
+    for name, count in counts.items():
+        metrics.increment("client.{}".format(name), count)
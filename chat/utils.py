@@ -1,5 +1,7 @@
 """Chat XBlock - Utils"""
+import threading
 from builtins import object
+from collections import OrderedDict
 
 
 def _(text):
@@ -35,3 +37,43 @@ class I18NService(object):
     def i18n_service(self):
         """ Obtains translation service """
         return self.runtime.service(self, "i18n") or DummyTranslationService()
+
+
+class LRUCache(object):
+    """
+    Thread-safe mapping that keeps at most maxsize items, evicting the least recently used ones.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the value of key, and marks it as the most recently used."""
+        with self._lock:
+            if key not in self._items:
+                return default
+            value = self._items.pop(key)
+            self._items[key] = value
+            return value
+
+    def set(self, key, value):
+        """Stores the value of key, evicting the least recently used items if full."""
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def keys(self):
+        """Returns the keys, from the least to the most recently used."""
+        with self._lock:
+            return list(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
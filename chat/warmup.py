@@ -0,0 +1,99 @@
+"""
+Compilation of the scripts of the chat blocks of a course in advance.
+
+When a course is published, the scripts of its chat blocks are compiled in a background thread
+and stored in the cache of compiled scripts shared by all processes (see compiled.py), so that
+the first learners don't wait for them to be parsed, and the workers of the LMS don't all parse
+them at once. The resized derivatives of the images of their steps are generated at the same
+time (see images.py). This requires the modulestore of Open edX, and the chat app in the INSTALLED_APPS
+of Studio, for the course_published signal to be received. After a deploy, or when the shared
+cache was flushed, the warm_chat_scripts management command compiles the scripts of a list of
+courses.
+
+The scripts of the busiest courses can also be preloaded by the master process of the LMS
+before it forks its workers, for example from the when_ready hook of gunicorn (with
+preload_app), so that all workers share one copy of them in memory (see mapped.py):
+
+    def when_ready(server):
+        import gc
+        from chat import warmup
+        warmup.preload_courses(["course-v1:Org+Course+Run"], "/var/tmp/chat-scripts.bin")
+        gc.freeze()
+"""
+
+import logging
+import threading
+
+from . import compiled
+
+log = logging.getLogger(__name__)
+
+
+def course_blocks(course_key):
+    """Returns the published chat blocks of the course with the given key, from the modulestore of Open edX."""
+    from opaque_keys.edx.keys import CourseKey
+    from xmodule.modulestore import ModuleStoreEnum
+    from xmodule.modulestore.django import modulestore
+    if not isinstance(course_key, CourseKey):
+        course_key = CourseKey.from_string(course_key)
+    store = modulestore()
+    with store.branch_setting(ModuleStoreEnum.Branch.published_only, course_key):
+        return store.get_items(course_key, qualifiers={"category": "chat"})
+
+
+def warm_course(course_key):
+    """
+    Compiles the scripts of the chat blocks of a course that are not cached yet, and generates the
+    derivatives of their images. Returns a report with the number of blocks of the course, of
+    scripts compiled, of images with derivatives, and of blocks that failed.
+    """
+    report = {"course": str(course_key), "blocks": 0, "compiled": 0, "images": 0, "failed": 0}
+    for block in course_blocks(course_key):
+        report["blocks"] += 1
+        try:
+            report["compiled"] += block.warm_compiled_script()
+            report["images"] += block.warm_images()
+        except Exception:  # pylint: disable=broad-except
+            report["failed"] += 1
+            log.exception("Could not warm the chat block %s", block.scope_ids.usage_id)
+    return report
+
+
+def preload_courses(course_keys, path):
+    """
+    Compiles the scripts of the chat blocks of the given courses, writes them to a file at path
+    and preloads them from it (see compiled.preload). Returns the number of scripts.
+    """
+    compiled.clear_preloaded()
+    scripts = {}
+    for course_key in course_keys:
+        for block in course_blocks(course_key):
+            # pylint: disable=protected-access
+            source = block._steps_source
+            try:
+                scripts[source] = compiled.get_or_compile(source, block._compile_steps)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Could not compile the script of the chat block %s", block.scope_ids.usage_id)
+    return compiled.preload(path, scripts)
+
+
+def _warm_published_course(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """Receiver of the course_published signal, compiling the scripts in the background."""
+    def warm():
+        try:
+            log.info("Compiled the chat scripts of a published course: %s", warm_course(course_key))
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Could not compile the chat scripts of %s", course_key)
+    thread = threading.Thread(target=warm, name="chat-warmup")
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def connect_signals():
+    """Compiles the scripts of courses when they are published, if running in Open edX."""
+    try:
+        from xmodule.modulestore.django import SignalHandler
+    except ImportError:
+        return
+    SignalHandler.course_published.connect(_warm_published_course, dispatch_uid="chat_xblock_warmup")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Load test the Chat XBlock in the xblock-sdk workbench.
+
+Simulates concurrent learners going through generated chat scripts, and reports the
+throughput, the latency percentiles of each handler and the growth of the user state.
+See tests/loadtest/harness.py.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import workbench
+
+LOAD_TEST_DATABASE = "var/load_test.db"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--learners", type=int, default=10, help="number of concurrent learners")
+    parser.add_argument("--sessions", type=int, default=5, help="number of chats each learner goes through")
+    parser.add_argument("--scripts", type=int, default=1, help="number of different scripts")
+    parser.add_argument("--max-responses", type=int, default=None, help="maximum number of responses per chat")
+    parser.add_argument("--steps", type=int, default=100, help="number of steps of each script")
+    parser.add_argument("--depth", type=int, default=10, help="number of layers of steps of each script")
+    parser.add_argument("--fan-out", type=int, default=3, help="maximum number of responses per step")
+    parser.add_argument("--loop-density", type=float, default=0.1, help="probability of a response looping back")
+    parser.add_argument("--bots", type=int, default=1, help="number of bot personas")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random generators")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # Find the location of the XBlock SDK and use its settings, like run_tests.py.
+    sys.path.append(os.path.dirname(os.path.dirname(workbench.__file__)))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "workbench.settings")
+    # Use a fresh database by default, so that the scenarios and states of previous runs don't
+    # affect the results. Set WORKBENCH_DATABASES to load test against another database.
+    if "WORKBENCH_DATABASES" not in os.environ:
+        os.environ["WORKBENCH_DATABASES"] = json.dumps({
+            "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": LOAD_TEST_DATABASE},
+        })
+        if os.path.exists(LOAD_TEST_DATABASE):
+            os.remove(LOAD_TEST_DATABASE)
+    logging.disable(logging.INFO)
+    try:
+        os.mkdir('var')
+    except OSError:
+        # The var dir may already exist.
+        pass
+
+    import django
+    django.setup()
+
+    from tests.loadtest.harness import run
+
+    report = run(
+        learners=args.learners,
+        sessions=args.sessions,
+        scripts=args.scripts,
+        max_responses=args.max_responses,
+        seed=args.seed,
+        num_steps=args.steps,
+        depth=args.depth,
+        fan_out=args.fan_out,
+        loop_density=args.loop_density,
+        bots=args.bots,
+    )
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("{requests} requests in {elapsed_seconds} s: {requests_per_second} requests/s, {errors} errors".format(
+            **report))
+        print("{:<16}{:>10}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+            "handler", "requests", "errors", "p50", "p90", "p99", "max"))
+        for handler, stats in report["handlers"].items():
+            print("{:<16}{requests:>10}{errors:>8}{p50:>10}{p90:>10}{p99:>10}{max:>10}".format(handler, **stats))
+        print("user state size: {} bytes per response".format(report["state_bytes_per_response"]))
+        for size in report["state_size"]:
+            print("  after {responses:>3} responses: {mean_bytes:>8} bytes (max {max_bytes})".format(**size))
+    sys.exit(1 if report["errors"] else 0)
@@ -28,10 +28,15 @@ setup(
     packages=[
         'chat',
     ],
+    python_requires='>=3.8',
     install_requires=[
         'XBlock',
         'xblock-utils',
+        'importlib_resources>=1.3; python_version < "3.9"',
     ],
+    extras_require={
+        'images': ['Pillow'],
+    },
     entry_points={
         'xblock.v1': [
             'chat = chat:ChatXBlock',
@@ -0,0 +1,53 @@
+"""Synthetic chat scripts and transcripts for the benchmarks."""
+
+import yaml
+
+from chat.default_data import DEFAULT_BOT_ID, USER_ID
+
+
+def make_steps(num_steps, num_bots=1):
+    """
+    Returns the YAML of a script with num_steps steps.
+
+    Each step has two messages, one of them with two variants, and two responses:
+    one leading to the next step and one leading back to the first step. Messages
+    are spread across num_bots bot personas.
+    """
+    steps = []
+    for index in range(num_steps):
+        bot = "bot-{}".format(index % num_bots)
+        next_step = "step{}".format(index + 1) if index + 1 < num_steps else "COMPLETE"
+        steps.append({
+            "step{}".format(index): {
+                "messages": [
+                    {bot: "This is message {} for [NAME].".format(index)},
+                    ["First variant of message {}.".format(index), "Second variant of message {}.".format(index)],
+                ],
+                "responses": [
+                    {"Continue to step {}".format(index + 1): next_step},
+                    {"Start over": "step0"},
+                ],
+            },
+        })
+    return yaml.safe_dump(steps)
+
+
+def make_bot_image_urls(num_bots):
+    """Returns the YAML mapping of bot personas to image URLs."""
+    return yaml.safe_dump(dict(
+        ("bot-{}".format(index), "/static/bot-{}.png".format(index))
+        for index in range(num_bots)
+    ))
+
+
+def make_messages(num_messages, num_steps, num_bots=1):
+    """Returns a transcript of num_messages messages alternating between the bots and the learner."""
+    messages = []
+    for index in range(num_messages):
+        step = "step{}".format((index // 2) % num_steps)
+        if index % 2:
+            messages.append({"from": USER_ID, "message": "Continue", "step": step})
+        else:
+            bot = "custom/bot-{}".format(index % num_bots) if num_bots > 1 else DEFAULT_BOT_ID
+            messages.append({"from": bot, "message": "Message {}".format(index), "step": step})
+    return messages
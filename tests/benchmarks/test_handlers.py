@@ -0,0 +1,89 @@
+"""Benchmarks of the student view and handlers of the Chat XBlock at scale."""
+
+import json
+
+import webob
+from ddt import data, ddt
+from xblock.validation import Validation
+
+from ..unit.utils import FieldData
+from .scripts import make_bot_image_urls, make_messages, make_steps
+from .utils import DEFAULT_ROUNDS, BenchmarkTestCase
+
+
+@ddt
+class TestHandlerBenchmarks(BenchmarkTestCase):
+
+    def make_scaled_block(self, num_steps, num_messages=0, num_bots=1):
+        """Returns a block with a synthetic script and transcript of the given size."""
+        return self.make_block(
+            steps=make_steps(num_steps, num_bots),
+            bot_image_url=make_bot_image_urls(num_bots) if num_bots > 1 else "",
+            messages=make_messages(num_messages, num_steps, num_bots),
+            current_step="step0" if num_messages else None,
+        )
+
+    @staticmethod
+    def rounds(num_steps):
+        """Large scripts take seconds to parse, so they are measured fewer times."""
+        return 3 if num_steps >= 10000 else DEFAULT_ROUNDS
+
+    @data(10, 100, 1000, 10000)
+    def test_student_view_steps(self, num_steps):
+        block = self.make_scaled_block(num_steps)
+        self.benchmark(
+            "student_view/warm/steps={}".format(num_steps), block.student_view, self.rounds(num_steps)
+        )
+        self.benchmark(
+            "student_view/cold/steps={}".format(num_steps), block.student_view, self.rounds(num_steps), cold=True
+        )
+
+    @data(0, 50, 500, 5000)
+    def test_student_view_messages(self, num_messages):
+        block = self.make_scaled_block(100, num_messages)
+        self.benchmark("student_view/messages={}".format(num_messages), block.student_view)
+
+    @data(1, 10, 50)
+    def test_student_view_bots(self, num_bots):
+        block = self.make_scaled_block(100, 100, num_bots)
+        self.benchmark("student_view/bots={}".format(num_bots), block.student_view)
+
+    @data(10, 100, 1000, 10000)
+    def test_submit_response_steps(self, num_steps):
+        block = self.make_scaled_block(num_steps)
+        body = json.dumps({"messages": make_messages(2, num_steps), "current_step": "step1"})
+
+        def submit_response():
+            request = webob.Request.blank("/", method="POST", body=body.encode("utf-8"))
+            block.handle("submit_response", request)
+
+        self.benchmark(
+            "submit_response/warm/steps={}".format(num_steps), submit_response, self.rounds(num_steps)
+        )
+        self.benchmark(
+            "submit_response/cold/steps={}".format(num_steps), submit_response, self.rounds(num_steps), cold=True
+        )
+
+    @data(0, 50, 500, 5000)
+    def test_submit_response_messages(self, num_messages):
+        block = self.make_scaled_block(100)
+        body = json.dumps({"messages": make_messages(num_messages, 100), "current_step": "step1"})
+
+        def submit_response():
+            block.messages = []
+            request = webob.Request.blank("/", method="POST", body=body.encode("utf-8"))
+            block.handle("submit_response", request)
+
+        self.benchmark("submit_response/messages={}".format(num_messages), submit_response)
+
+    @data(10, 100, 1000, 10000)
+    def test_validate_field_data_steps(self, num_steps):
+        block = self.make_scaled_block(num_steps)
+        field_data = FieldData(make_steps(num_steps))
+
+        def validate_field_data():
+            block.validate_field_data(Validation(block.scope_ids.usage_id), field_data)
+
+        self.benchmark(
+            "validate_field_data/steps={}".format(num_steps), validate_field_data, self.rounds(num_steps)
+        )
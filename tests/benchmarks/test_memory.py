@@ -0,0 +1,116 @@
+"""
+Benchmarks of the memory used by the workers of a forking server, with and without the scripts
+preloaded by the master process (see chat/mapped.py).
+
+The master process forks workers that each serve all the scripts once, and report the memory
+added by doing so, in MB: their resident memory (RSS, which also counts the pages shared with
+other processes) and their private memory, which is what each additional worker costs.
+"""
+
+import gc
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import yaml
+
+from chat import compiled
+from chat.chat import ChatXBlock
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import BenchmarkTestCase
+
+SMAPS_ROLLUP_PATH = "/proc/self/smaps_rollup"
+NUM_WORKERS = 4
+NUM_SCRIPTS = 10
+
+
+def compile_script(source):
+    return compiled.CompiledScript([
+        ChatXBlock._normalize_step(step) for step in yaml.safe_load(source)  # pylint: disable=protected-access
+    ])
+
+
+def memory_usage():
+    """Returns the resident and private memory of the current process, in kB."""
+    values = {}
+    with open(SMAPS_ROLLUP_PATH) as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values["Rss"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def serve(sources):
+    """Renders the steps of all scripts, like a worker serving them."""
+    for source in sources:
+        compiled.get_or_compile(source, compile_script).as_list("Ada")
+
+
+@unittest.skipUnless(os.path.exists(SMAPS_ROLLUP_PATH) and hasattr(os, "fork"), "Requires Linux.")
+class TestMemoryBenchmarks(BenchmarkTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestMemoryBenchmarks, cls).setUpClass()
+        cls.sources = [
+            generate_steps_yaml(num_steps=500, variants=2, bots=3, image_frequency=0.2, seed=seed)
+            for seed in range(NUM_SCRIPTS)
+        ]
+
+    def setUp(self):
+        super(TestMemoryBenchmarks, self).setUp()
+        compiled.set_shared_cache(None)
+        self.addCleanup(compiled.set_shared_cache, "default")
+        self.addCleanup(compiled.clear_preloaded)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "scripts.bin")
+
+    def run_workers(self):
+        """Forks the workers, and returns the average memory they added serving the scripts, in MB."""
+        gc.collect()
+        gc.freeze()
+        pipes = []
+        try:
+            for _ in range(NUM_WORKERS):
+                read_fd, write_fd = os.pipe()
+                if os.fork() == 0:
+                    # The worker must never return to the test runner.
+                    try:
+                        os.close(read_fd)
+                        before = memory_usage()
+                        serve(self.sources)
+                        gc.collect()
+                        after = memory_usage()
+                        report = dict((key, after[key] - before[key]) for key in after)
+                        os.write(write_fd, json.dumps(report).encode())
+                    finally:
+                        os._exit(0)  # pylint: disable=protected-access
+                os.close(write_fd)
+                pipes.append(read_fd)
+            reports = []
+            for read_fd in pipes:
+                with os.fdopen(read_fd, "rb") as pipe:
+                    reports.append(json.loads(pipe.read().decode()))
+                os.wait()
+        finally:
+            gc.unfreeze()
+        return dict((key, sum(report[key] for report in reports) / len(reports) / 1024.0) for key in reports[0])
+
+    def test_worker_memory(self):
+        compiled.clear_cache()
+        without = self.run_workers()
+        compiled.clear_cache()
+        compiled.preload(self.path, dict((source, compile_script(source)) for source in self.sources))
+        preloaded = self.run_workers()
+        for key in ("rss", "private"):
+            self.record("worker_memory/compiled/{}_mb".format(key), without[key])
+            self.record("worker_memory/preloaded/{}_mb".format(key), preloaded[key])
+        self.assertLess(preloaded["private"] * 2, without["private"])
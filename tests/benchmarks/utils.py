@@ -0,0 +1,149 @@
+"""
+Helpers for the Chat XBlock benchmarks.
+
+Timings are divided by the time of a fixed calibration workload, so that the
+scores stored in baseline.json can be compared across machines. The workload
+is timed between the rounds of each benchmark, so that changes in the speed of
+the machine during a run affect both alike. A benchmark fails when its score
+exceeds the baseline by more than its tolerance.
+
+Each benchmark is measured either warm, after a first call filled the caches of
+the process, or cold, with the caches of compiled scripts and shared init data
+cleared before each round, as after the script of a block was edited. Scores
+compare the best time of the rounds to the best time of the workload. New
+baselines are the median score of BASELINE_RUNS measurements, so that they do
+not depend on a lucky run.
+
+Benchmarks only run when the CHAT_BENCHMARKS environment variable is set:
+
+    CHAT_BENCHMARKS=1 pytest tests/benchmarks      # compare with the baseline
+    CHAT_BENCHMARKS=save pytest tests/benchmarks   # store a new baseline
+"""
+
+import json
+import os
+import time
+import unittest
+
+import yaml
+from django.core.cache import caches
+
+from chat import chat, compiled
+
+from ..unit.utils import ChatBlockTestCase
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_ROUNDS = 10
+# Times the calibration workload is timed before each round.
+CALIBRATION_ROUNDS = 3
+BASELINE_RUNS = 3
+
+CALIBRATION_DOCUMENT = yaml.safe_dump([
+    {"step{}".format(index): {"messages": ["Message {}".format(index)], "responses": [{"Next": index + 1}]}}
+    for index in range(100)
+])
+
+
+def _time(func):
+    """Returns the time in seconds of calling func."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _calibrate():
+    """A fixed workload similar to the work done by the block."""
+    json.dumps(yaml.safe_load(CALIBRATION_DOCUMENT))
+
+
+def _score(func, rounds, setup=None):
+    """
+    Returns the best time of func over the given number of rounds, calling setup (if any) before each,
+    divided by the best time of the calibration workload, timed between the rounds.
+    """
+    times = []
+    calibration_times = []
+    for _ in range(rounds):
+        calibration_times.extend(_time(_calibrate) for _ in range(CALIBRATION_ROUNDS))
+        if setup is not None:
+            setup()
+        times.append(_time(func))
+    return min(times) / min(calibration_times)
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+def clear_caches():
+    """Forgets the compiled scripts, and the shared steps and init data, in the process and in the shared cache."""
+    compiled.clear_cache()
+    caches["default"].clear()
+    chat._shared_init_data_cache.clear()  # pylint: disable=protected-access
+    chat._shared_steps_cache.clear()  # pylint: disable=protected-access
+
+
+@unittest.skipUnless(os.environ.get("CHAT_BENCHMARKS"), "Set CHAT_BENCHMARKS to run the benchmarks.")
+class BenchmarkTestCase(ChatBlockTestCase):
+    """Base class for benchmarks of the Chat XBlock entry points."""
+
+    baseline = None
+    results = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(BenchmarkTestCase, cls).setUpClass()
+        cls.results = {}
+        try:
+            with open(BASELINE_PATH) as baseline_file:
+                cls.baseline = json.load(baseline_file)
+        except IOError:
+            cls.baseline = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.environ.get("CHAT_BENCHMARKS") == "save":
+            try:
+                with open(BASELINE_PATH) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except IOError:
+                baseline = {}
+            for name, score in cls.results.items():
+                entry = baseline.setdefault(name, {})
+                entry["score"] = float("{:.3g}".format(score))
+            with open(BASELINE_PATH, "w") as baseline_file:
+                json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+                baseline_file.write("\n")
+        super(BenchmarkTestCase, cls).tearDownClass()
+
+    def benchmark(self, name, func, rounds=DEFAULT_ROUNDS, cold=False):
+        """
+        Measures func, warm or cold, and checks its score against the baseline.
+
+        Returns the score, i.e. the best time divided by the calibration time.
+        """
+        if not cold:
+            func()
+        setup = clear_caches if cold else None
+        runs = BASELINE_RUNS if os.environ.get("CHAT_BENCHMARKS") == "save" else 1
+        return self.record(name, _median([_score(func, rounds, setup) for _ in range(runs)]))
+
+    def record(self, name, score):
+        """
+        Checks a score against the baseline, for benchmarks measuring something else than time,
+        like memory. Returns the score.
+        """
+        self.results[name] = score
+        entry = self.baseline.get(name)
+        if entry and os.environ.get("CHAT_BENCHMARKS") != "save":
+            limit = entry["score"] * (1 + entry.get("tolerance", DEFAULT_TOLERANCE))
+            self.assertLessEqual(
+                score, limit,
+                "{} regressed: score {:.2f} exceeds {:.2f} (baseline {:.2f})".format(
+                    name, score, limit, entry["score"],
+                )
+            )
+        return score
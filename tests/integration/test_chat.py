@@ -1,7 +1,5 @@
-import os
 import re
 
-import pkg_resources
 import yaml
 from bok_choy.promise import EmptyPromise
 from ddt import data, ddt
@@ -11,6 +9,8 @@ from xblock.reference.user_service import XBlockUser
 from xblockutils.resources import ResourceLoader
 from xblockutils.studio_editable_test import StudioEditableBaseTest
 
+from chat import resources
+
 loader = ResourceLoader(__name__)
 
 yaml_good = """
@@ -322,8 +322,7 @@ class TestChat(StudioEditableBaseTest):
     def test_serve_audio_handler(self):
         self.load_scenario("xml/chat_defaults.xml")
         block = self.load_root_xblock()
-        filepath = pkg_resources.resource_filename('chat', 'public/response.wav')
-        filesize = os.stat(filepath).st_size
+        filesize = resources.resource('public/response.wav').stat().st_size
         sound_url = block.runtime.handler_url(block, 'serve_audio', 'response.wav')
         client = Client()
 
@@ -0,0 +1,257 @@
+"""
+Load-test harness for the Chat XBlock, simulating concurrent learners against the workbench.
+
+The harness serves the workbench in a multi-threaded WSGI server, adds a workbench scenario
+for each generated script (see chat/scriptgen.py), and runs one thread per learner. Each
+learner goes through the scripts like the front end does, with ChatEngine picking the
+responses and bot message variants:
+
+* the student view is loaded, and get_user_state called,
+* the bot sound is requested with serve_audio for each step,
+* the state is sent to submit_response after each response,
+* chat_complete is called once a final step is reached,
+* reset is called before starting the next session.
+
+Run it with load_test.py in the root folder of the repository.
+"""
+
+import json
+import random
+import threading
+import time
+from builtins import object
+from xml.sax.saxutils import quoteattr
+
+import requests
+from django.core.management import call_command
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from mock import patch
+from workbench.runtime import WorkbenchRuntime
+from workbench.scenarios import add_xml_scenario, get_scenarios, remove_scenario
+
+from chat.chat import ChatXBlock
+from chat.engine import ChatEngine
+from chat.scriptgen import generate_bot_image_urls, generate_steps
+
+HANDLERS = ("student_view", "get_user_state", "serve_audio", "submit_response", "chat_complete", "reset")
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values, percent):
+    """Returns the percentile of a sorted list of values, using the nearest-rank method."""
+    if not sorted_values:
+        return None
+    rank = int(-(-percent * len(sorted_values) // 100))  # ceil without floats
+    return sorted_values[max(rank, 1) - 1]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that doesn't log every request to the console."""
+
+    def log_message(self, *args):
+        pass
+
+
+class WorkbenchServer(object):
+    """
+    Context manager serving the workbench, with a scenario for each script, on a free local port.
+
+    The learner profile images of the LMS are not available in the workbench, so a static
+    image is used instead, like in the tests. SQLite in-memory databases, used by the Django
+    tests, lock whole tables while writing, so requests are served one at a time with them.
+    """
+
+    def __init__(self, scripts, bot_image_url=""):
+        self.scripts = scripts
+        self.bot_image_url = bot_image_url
+        self.scenarios = []
+        self.steps = {}
+        self.server = None
+        self.patcher = patch.object(ChatXBlock, "_user_image_url", lambda block: "/static/user.png")
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def __enter__(self):
+        call_command("migrate", run_syncdb=True, verbosity=0)
+        get_scenarios()
+        for index, steps in enumerate(self.scripts):
+            name = "chat-load-test-{}".format(index)
+            xml = "<chat steps={} bot_image_url={}/>".format(
+                quoteattr(json.dumps(steps)), quoteattr(self.bot_image_url),
+            )
+            add_xml_scenario(name, name, xml)
+            self.scenarios.append(name)
+            self.steps[name] = self._normalized_steps(name)
+        self.patcher.start()
+        self.server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        self.server.set_app(self._application())
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.patcher.stop()
+        for name in self.scenarios:
+            remove_scenario(name)
+
+    @staticmethod
+    def _application():
+        """Returns the WSGI application of the workbench, serialized for in-memory databases."""
+        application = get_wsgi_application()
+        if connection.vendor != "sqlite" or not connection.is_in_memory_db():
+            return application
+        lock = threading.Lock()
+
+        def serialized_application(environ, start_response):
+            with lock:
+                return application(environ, start_response)
+        return serialized_application
+
+    @staticmethod
+    def _normalized_steps(scenario):
+        """Returns the steps of a scenario, as normalized by the block."""
+        block = WorkbenchRuntime().get_block(get_scenarios()[scenario].usage_id)
+        return block._steps_as_list  # pylint: disable=protected-access
+
+    def usage_id(self, scenario):
+        return get_scenarios()[scenario].usage_id
+
+
+class LoadTestResults(object):
+    """Latencies, errors and user state sizes recorded by all learners."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = dict((handler, []) for handler in HANDLERS)
+        self.errors = dict((handler, 0) for handler in HANDLERS)
+        self.state_sizes = {}
+        self.elapsed = None
+
+    def record(self, handler, seconds, ok):
+        with self._lock:
+            self.latencies[handler].append(seconds * 1000)
+            if not ok:
+                self.errors[handler] += 1
+
+    def record_state_size(self, responses, size):
+        """Records the size in bytes of the state submitted after the given number of responses."""
+        with self._lock:
+            self.state_sizes.setdefault(responses, []).append(size)
+
+    def report(self):
+        """Returns a dictionary with the throughput, latency percentiles and state size growth."""
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        handlers = {}
+        for handler in HANDLERS:
+            latencies = sorted(self.latencies[handler])
+            if latencies:
+                handlers[handler] = dict(
+                    [("requests", len(latencies)), ("errors", self.errors[handler])] +
+                    [("p{}".format(percent), round(percentile(latencies, percent), 1)) for percent in PERCENTILES] +
+                    [("max", round(latencies[-1], 1))]
+                )
+        growth = [
+            {"responses": responses, "mean_bytes": int(sum(sizes) / len(sizes)), "max_bytes": max(sizes)}
+            for responses, sizes in sorted(self.state_sizes.items())
+        ]
+        bytes_per_response = None
+        if len(growth) > 1:
+            first, last = growth[0], growth[-1]
+            bytes_per_response = int(
+                (last["mean_bytes"] - first["mean_bytes"]) / (last["responses"] - first["responses"])
+            )
+        return {
+            "elapsed_seconds": round(self.elapsed, 2),
+            "requests": total,
+            "requests_per_second": round(total / self.elapsed, 1) if self.elapsed else None,
+            "errors": sum(self.errors.values()),
+            "handlers": handlers,
+            "state_size": growth,
+            "state_bytes_per_response": bytes_per_response,
+        }
+
+
+class Learner(object):
+    """A simulated learner, going through chat sessions with its own cookies and random generator."""
+
+    def __init__(self, server, student_id, results, seed=None, max_responses=None):
+        self.server = server
+        self.student_id = student_id
+        self.results = results
+        self.rng = random.Random(seed)
+        self.max_responses = max_responses
+        self.session = requests.Session()
+
+    def _request(self, handler, method, url, **kwargs):
+        headers = {"X-CSRFToken": self.session.cookies.get("csrftoken", "")}
+        start = time.time()
+        try:
+            response = self.session.request(method, url, params={"student": self.student_id}, headers=headers, **kwargs)
+            ok = response.ok
+        except requests.RequestException:
+            response, ok = None, False
+        self.results.record(handler, time.time() - start, ok)
+        return response
+
+    def _handler(self, handler, usage_id, method="GET", suffix="", data=None):
+        url = "{}/handler/{}/{}/{}".format(self.server.url, usage_id, handler, suffix)
+        body = json.dumps(data) if data is not None else None
+        return self._request(handler, method, url, data=body)
+
+    def run_session(self, scenario):
+        """Goes through a chat from the beginning, then resets it."""
+        usage_id = self.server.usage_id(scenario)
+        engine = ChatEngine(self.server.steps[scenario], rng=self.rng)
+        self._request("student_view", "GET", "{}/scenario/{}/".format(self.server.url, scenario))
+        self._handler("get_user_state", usage_id)
+        self._handler("serve_audio", usage_id, suffix="bot.wav")
+        state = None
+        for responses, state in enumerate(engine.simulate(max_responses=self.max_responses), 1):
+            data = json.dumps(state)
+            self._handler("submit_response", usage_id, "POST", data=state)
+            self.results.record_state_size(responses, len(data.encode("utf-8")))
+            self._handler("serve_audio", usage_id, suffix="bot.wav")
+        if state is not None and engine.is_final_step(state["current_step"]):
+            self._handler("chat_complete", usage_id)
+        self._handler("reset", usage_id, "POST", data={})
+
+    def run(self, scenarios, sessions):
+        for _ in range(sessions):
+            self.run_session(self.rng.choice(scenarios))
+
+
+def run(learners=10, sessions=5, scripts=1, max_responses=None, seed=None, **shape):
+    """
+    Runs a load test and returns its report (see LoadTestResults.report).
+
+    Each of the learners goes through sessions chats, on one of the scripts generated
+    with the given shape (see chat.scriptgen.generate_steps).
+    """
+    rng = random.Random(seed)
+    steps = [generate_steps(seed=rng.random(), **shape) for _ in range(scripts)]
+    results = LoadTestResults()
+    with WorkbenchServer(steps, generate_bot_image_urls(shape.get("bots", 1))) as server:
+        # The workbench creates the records of the fields shared by all learners on first access,
+        # and concurrent first accesses would create duplicates, so go through each script once.
+        warm_up = Learner(server, "load-test-warm-up", LoadTestResults(), seed, max_responses=1)
+        for scenario in server.scenarios:
+            warm_up.run_session(scenario)
+        threads = []
+        for index in range(learners):
+            learner = Learner(server, "load-test-{}".format(index), results, rng.random(), max_responses)
+            threads.append(threading.Thread(target=learner.run, args=(server.scenarios, sessions)))
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results.elapsed = time.time() - start
+    return results.report()
@@ -0,0 +1,32 @@
+from ddt import data, ddt, unpack
+from django.test import TransactionTestCase
+
+from .harness import HANDLERS, percentile, run
+
+
+@ddt
+class TestLoadTestHarness(TransactionTestCase):
+
+    @data(
+        ([], 50, None),
+        ([5], 99, 5),
+        ([1, 2, 3, 4], 50, 2),
+        (list(range(1, 101)), 90, 90),
+        (list(range(1, 101)), 99, 99),
+        (list(range(1, 11)), 99, 10),
+    )
+    @unpack
+    def test_percentile(self, values, percent, expected):
+        self.assertEqual(percentile(values, percent), expected)
+
+    def test_run(self):
+        report = run(learners=2, sessions=2, scripts=2, seed=1, num_steps=10, depth=3, loop_density=0)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(set(report["handlers"]), set(HANDLERS))
+        self.assertEqual(report["handlers"]["student_view"]["requests"], 4)
+        self.assertEqual(report["handlers"]["reset"]["requests"], 4)
+        self.assertEqual(report["handlers"]["chat_complete"]["requests"], 4)
+        self.assertEqual(report["handlers"]["submit_response"]["requests"], 8)
+        self.assertEqual([size["responses"] for size in report["state_size"]], [1, 2])
+        self.assertGreater(report["state_bytes_per_response"], 0)
+        self.assertGreater(report["requests_per_second"], 0)
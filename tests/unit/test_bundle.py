@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import webob
+from django.utils import translation
+
+from chat import bundle, images
+from chat.default_data import NAME_PLACEHOLDER
+
+from .utils import ChatBlockTestCase
+
+yaml_steps = """
+- step1:
+    image-url: /static/diagram.png
+    messages:
+        - Hi [NAME]
+        - helper: Look at this
+    responses:
+        - Next: step2
+- step2:
+    image-url: https://example.com/elsewhere.png
+    messages: Bye
+"""
+
+
+class TestOfflineBundle(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestOfflineBundle, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "diagram.png"), "wb") as image_file:
+            image_file.write(b"diagram")
+        with open(os.path.join(directory, "helper.png"), "wb") as image_file:
+            image_file.write(b"helper")
+        images.set_backend(images.DirectoryBackend(directory))
+        self.addCleanup(images.set_backend, images._UNCONFIGURED)  # pylint: disable=protected-access
+
+    def make_block(self, **fields):
+        fields.setdefault("steps", yaml_steps)
+        fields.setdefault("bot_image_url", "helper: /static/helper.png")
+        return super(TestOfflineBundle, self).make_block(**fields)
+
+    @staticmethod
+    def get(block, etag=None):
+        request = webob.Request.blank("/")
+        if etag:
+            request.if_none_match = etag
+        return block.handle("offline_bundle", request)
+
+    def test_bundle(self):
+        response = self.get(self.make_block())
+        self.assertEqual(response.content_type, "application/zip")
+        with zipfile.ZipFile(io.BytesIO(response.body)) as zip_file:
+            manifest = json.loads(zip_file.read("chat.json").decode("utf-8"))
+            self.assertEqual(manifest["format"], bundle.FORMAT_VERSION)
+            self.assertEqual(manifest["first_step_id"], "step1")
+            # The bundle is the same for all learners.
+            self.assertEqual(manifest["steps"]["step1"]["messages"][0][0]["message"], "Hi " + NAME_PLACEHOLDER)
+            self.assertEqual(manifest["bot_image_urls"]["custom/helper"], "/static/helper.png")
+            # Images that can't be read by the server are loaded by apps from their URL.
+            self.assertEqual(sorted(manifest["images"]), sorted(
+                list(manifest["bot_image_urls"].values()) + ["/static/diagram.png"]
+            ))
+            self.assertEqual(zip_file.read(manifest["images"]["/static/diagram.png"]), b"diagram")
+            self.assertEqual(zip_file.read(manifest["images"]["/static/helper.png"]), b"helper")
+            self.assertTrue(zip_file.read(manifest["bot_sound"]).startswith(b"RIFF"))
+            self.assertTrue(zip_file.read(manifest["response_sound"]).startswith(b"RIFF"))
+            self.assertEqual(manifest["translations"], "translations/en-us.js")
+            self.assertIn(manifest["translations"], zip_file.namelist())
+
+    def test_etag(self):
+        block = self.make_block()
+        response = self.get(block)
+        etag = response.etag
+        self.assertTrue(etag)
+        # The bundle is deterministic.
+        bundle.clear_cache()
+        self.assertEqual(self.get(self.make_block()).body, response.body)
+        not_modified = self.get(block, etag)
+        self.assertEqual((not_modified.status_int, not_modified.body), (304, b""))
+        # Editing the block changes its bundle.
+        block.subject = "New subject"
+        self.assertNotEqual(self.get(block, etag).etag, etag)
+
+    def test_language(self):
+        block = self.make_block()
+        with translation.override("fr-ca"):
+            response = self.get(block)
+        with zipfile.ZipFile(io.BytesIO(response.body)) as zip_file:
+            self.assertIn("translations/fr-ca.js", zip_file.namelist())
+        self.assertNotEqual(self.get(block).etag, response.etag)
@@ -0,0 +1,248 @@
+import gc
+import threading
+import time
+
+import yaml
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from mock import patch
+from xblock.reference.user_service import XBlockUser
+
+from chat import compiled, metrics, profiling
+from chat.chat import ChatXBlock
+from chat.default_data import BACKGROUND_COMPILE_RETRY_DELAY, NAME_PLACEHOLDER
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import ChatBlockTestCase
+
+
+class TestCompiledSteps(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestCompiledSteps, self).setUp()
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+
+    def set_full_name(self, full_name):
+        user = XBlockUser(full_name=full_name)
+        self._patch("workbench.runtime.WorkBenchUserService.get_current_user", lambda service: user)
+
+    def test_same_steps_as_normalized_yaml(self):
+        self.set_full_name("Ada Lovelace")
+        steps = generate_steps_yaml(num_steps=50, variants=3, bots=3, image_frequency=0.5, name_density=0.5, seed=1)
+        block = self.make_block(steps=steps)
+        expected = [
+            block._normalize_step(step)  # pylint: disable=protected-access
+            for step in yaml.safe_load(steps.replace(NAME_PLACEHOLDER, "Ada"))
+        ]
+        self.assertEqual(block._steps_as_list, expected)  # pylint: disable=protected-access
+
+    def test_names_are_not_parsed_as_yaml(self):
+        self.set_full_name("O'Hara: the first")
+        block = self.make_block(
+            steps='- step1:\n    messages: "Hi [NAME]"\n    responses:\n      - "Hi, I am [NAME]": step1\n'
+        )
+        step = block._steps_as_list[0]  # pylint: disable=protected-access
+        self.assertEqual(step["messages"], [[{"message": "Hi O'Hara:", "bot_id": "bot"}]])
+        self.assertEqual(step["responses"], [{"message": "Hi, I am O'Hara:", "step": "step1"}])
+
+    def test_steps_are_compiled_once(self):
+        steps = generate_steps_yaml(num_steps=20, seed=2)
+        self.make_block(steps=steps).student_view()
+        self.make_block(steps=steps).student_view()
+        # The bot_image_url field is still parsed on each view.
+        self.assertEqual(self.sink.counters["yaml_parse"], 3)
+        self.make_block(steps=generate_steps_yaml(num_steps=20, seed=3)).student_view()
+        self.assertEqual(self.sink.counters["yaml_parse"], 5)
+
+    def test_precompiled_steps_are_not_parsed(self):
+        steps = generate_steps_yaml(num_steps=20, variants=2, seed=5)
+        expected = self.make_block(steps=steps)._steps_as_list  # pylint: disable=protected-access
+        script = compiled.serialize(steps, [
+            ChatXBlock._normalize_step(step) for step in yaml.safe_load(steps)  # pylint: disable=protected-access
+        ])
+        compiled.clear_cache()
+        self.sink.reset()
+        block = self.make_block(steps=steps, compiled_script=script)
+        self.assertEqual(block._steps_as_list, expected)  # pylint: disable=protected-access
+        self.assertNotIn("yaml_parse", self.sink.counters)
+        # Compiled scripts are ignored once the steps are changed.
+        block = self.make_block(steps=steps + "- extra:\n    messages: Hi\n", compiled_script=script)
+        self.assertEqual(len(block._steps_as_list), 21)  # pylint: disable=protected-access
+        self.assertEqual(self.sink.counters["yaml_parse"], 1)
+
+    @patch("chat.compiled._cache.maxsize", 2)
+    def test_cache_is_bounded(self):
+        scripts = [generate_steps_yaml(num_steps=5, seed=seed) for seed in range(3)]
+        for steps in scripts:
+            self.make_block(steps=steps)._compiled_steps  # pylint: disable=expression-not-assigned,protected-access
+        self.assertEqual(compiled._cache.keys(), scripts[1:])  # pylint: disable=protected-access
+
+    def test_compiled_steps_use_slots(self):
+        script = self.make_block()._compiled_steps  # pylint: disable=protected-access
+        step = script.steps[0]
+        for instance in (script, step, step.messages[0][0], step.responses[0]):
+            self.assertFalse(hasattr(instance, "__dict__"))
+
+    def test_allocations(self):
+        block = self.make_block(steps=generate_steps_yaml(num_steps=100, variants=2, seed=4))
+        with profiling.allocation_profile("student_view") as cold:
+            block.student_view()
+        with profiling.allocation_profile("student_view") as warm:
+            block.student_view()
+        self.assertLess(warm.peak_bytes * 2, cold.peak_bytes)
+        self.assertTrue(warm.top_sites)
+        self.assertIn("Allocations of student_view: peak", warm.format())
+
+    def test_profiled_entry_points(self):
+        profiling.set_enabled(True)
+        self.addCleanup(profiling.set_enabled, False)
+        with self.assertLogs("chat.profiling") as logs:
+            self.make_block().student_view()
+        self.assertTrue(logs.output[0].startswith("INFO:chat.profiling:Allocations of student_view: peak"))
+        self.assertGreater(self.sink.gauges["allocations.student_view.peak_bytes"], 0)
+
+
+class TestSharedCache(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestSharedCache, self).setUp()
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+        self.steps = generate_steps_yaml(num_steps=20, variants=2, name_density=0.5, seed=6)
+        self.block = self.make_block(steps=self.steps)
+        self.expected = self.block._steps_as_list  # pylint: disable=protected-access
+        # Other processes only share the Django cache.
+        compiled.clear_cache()
+        self.sink.reset()
+
+    def test_scripts_are_compiled_once_by_all_processes(self):
+        self.assertEqual(self.block._steps_as_list, self.expected)  # pylint: disable=protected-access
+        self.assertNotIn("yaml_parse", self.sink.counters)
+        self.assertEqual(self.sink.counters["compiled_scripts.shared_cache_hit"], 1)
+        key = compiled.SHARED_CACHE_KEY_PREFIX + compiled.content_hash(self.steps)
+        self.assertIsNotNone(caches["default"].get(key))
+
+    def test_invalid_entries_are_compiled_again(self):
+        caches["default"].set(compiled.SHARED_CACHE_KEY_PREFIX + compiled.content_hash(self.steps), b"invalid")
+        self.assertEqual(self.block._steps_as_list, self.expected)  # pylint: disable=protected-access
+        self.assertEqual(self.sink.counters["yaml_parse"], 1)
+        self.assertEqual(self.sink.counters["compiled_scripts.shared_cache_miss"], 1)
+
+    def test_cache_errors_are_ignored(self):
+        with patch.object(LocMemCache, "get", side_effect=IOError), \
+                patch.object(LocMemCache, "set", side_effect=IOError), \
+                self.assertLogs("chat.compiled", "WARNING") as logs:
+            self.assertEqual(self.block._steps_as_list, self.expected)  # pylint: disable=protected-access
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(self.sink.counters["yaml_parse"], 1)
+
+    def test_warm_ignores_cache_errors(self):
+        with patch.object(LocMemCache, "get", side_effect=IOError), self.assertLogs("chat.compiled", "WARNING"):
+            self.assertTrue(self.block.warm_compiled_script())
+        self.assertEqual(self.sink.counters["yaml_parse"], 1)
+
+    def test_disabled(self):
+        compiled.set_shared_cache(None)
+        self.addCleanup(compiled.set_shared_cache, "default")
+        self.assertIsNone(compiled.get_shared_cache())
+        self.assertEqual(self.block._steps_as_list, self.expected)  # pylint: disable=protected-access
+        self.assertEqual(self.sink.counters["yaml_parse"], 1)
+
+
+class TestBackgroundCompilation(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestBackgroundCompilation, self).setUp()
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+        self.addCleanup(compiled.wait_for_background_compilations)
+        self.block = self.make_block(steps=self.version(1))
+        self.assertIn("Version 1", self.block.student_view().content)
+        self.block.steps = self.version(2)
+
+    @staticmethod
+    def version(number):
+        return "- step1:\n    messages: Version {}\n    responses: []\n".format(number)
+
+    def patch_compilation(self, compile_source):
+        """Patches the compilation of the scripts of blocks."""
+        original = ChatXBlock._compile_source  # pylint: disable=protected-access
+        self._patch(
+            "chat.chat.ChatXBlock._compile_source",
+            classmethod(lambda cls, steps, compiled_script: compile_source(original, steps, compiled_script)),
+        )
+
+    def test_previous_version_is_served_while_compiling(self):
+        release = threading.Event()
+
+        def compile_source(original, steps, compiled_script):
+            release.wait(5)
+            return original(steps, compiled_script)
+
+        self.patch_compilation(compile_source)
+        for _ in range(3):
+            self.assertIn("Version 1", self.block.student_view().content)
+        release.set()
+        compiled.wait_for_background_compilations()
+        self.assertIn("Version 2", self.block.student_view().content)
+        self.assertEqual(self.sink.counters["compiled_scripts.background_compile"], 1)
+
+    def test_latest_scripts_are_not_kept_alive(self):
+        # Only the cache of the process keeps compiled scripts alive, so that its size bounds their memory.
+        key = str(self.block.scope_ids.usage_id)
+        self.assertIsNotNone(compiled.lookup(self.version(2), key)[0])
+        compiled._cache.clear()  # pylint: disable=protected-access
+        gc.collect()
+        self.assertEqual(compiled.lookup(self.version(2), key), (None, False))
+        self.assertIn("Version 2", self.block.student_view().content)
+
+    @patch("chat.compiled.time.time", return_value=1000)
+    def test_failed_compilations_are_retried_later(self, now):
+        def compile_source(original, steps, compiled_script):
+            raise ValueError("Invalid script")
+
+        self.patch_compilation(compile_source)
+        with self.assertLogs("chat.compiled", "ERROR"):
+            self.assertIn("Version 1", self.block.student_view().content)
+            compiled.wait_for_background_compilations()
+        self.assertIn("Version 1", self.block.student_view().content)
+        self.assertEqual(self.sink.counters["compiled_scripts.background_compile"], 1)
+        now.return_value += BACKGROUND_COMPILE_RETRY_DELAY
+        with self.assertLogs("chat.compiled", "ERROR"):
+            self.assertIn("Version 1", self.block.student_view().content)
+            compiled.wait_for_background_compilations()
+        self.assertEqual(self.sink.counters["compiled_scripts.background_compile"], 2)
+
+    @patch("chat.compiled.BACKGROUND_COMPILE_MAX_PENDING", 0)
+    def test_compiled_in_the_request_when_too_many_are_pending(self):
+        self.assertIn("Version 2", self.block.student_view().content)
+        self.assertNotIn("compiled_scripts.background_compile", self.sink.counters)
+
+    def test_new_blocks_are_compiled_in_the_request(self):
+        self.assertIn("Version 3", self.make_block(steps=self.version(3)).student_view().content)
+        self.assertNotIn("compiled_scripts.background_compile", self.sink.counters)
+
+    def test_concurrent_compilations_are_deduplicated(self):
+        calls = []
+
+        def compile_script(source):
+            calls.append(source)
+            time.sleep(0.1)
+            return compiled.CompiledScript([])
+
+        scripts = []
+        threads = [
+            threading.Thread(target=lambda: scripts.append(compiled.get_or_compile("- source", compile_script)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, ["- source"])
+        self.assertEqual(len(scripts), 8)
+        self.assertTrue(all(script is scripts[0] for script in scripts))
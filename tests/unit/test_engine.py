@@ -0,0 +1,124 @@
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import unittest
+
+from ddt import data, ddt
+
+from chat.default_data import DEFAULT_BOT_ID, USER_ID
+from chat.engine import ChatEngine, FirstCandidate
+from chat.scriptgen import generate_bot_image_urls, generate_steps_yaml
+
+from .utils import ChatBlockTestCase
+
+CHAT_JS = os.path.join(os.path.dirname(__file__), "..", "..", "chat", "public", "js", "src", "chat.js")
+
+# Functions of ChatXBlock in chat.js implementing the rules mirrored by the engine.
+JS_FUNCTIONS = ("isFinalStep", "filterNotDisplayed", "stepMessages", "initialStep")
+
+
+class SequenceRandom(object):
+    """Random number generator returning the given numbers in order, like the stubbed Math.random."""
+
+    def __init__(self, numbers):
+        self.numbers = iter(numbers)
+
+    def random(self):
+        return next(self.numbers)
+
+
+def js_function(source, name):
+    """Returns the source of a function defined as a variable of ChatXBlock in chat.js."""
+    match = re.search(r"^    var {} = function.*?^    }};$".format(name), source, re.MULTILINE | re.DOTALL)
+    return match.group(0)
+
+
+@ddt
+class TestChatEngine(ChatBlockTestCase):
+
+    def make_engine(self, rng=None, **shape):
+        block = self.make_block(
+            steps=generate_steps_yaml(**shape),
+            bot_image_url=generate_bot_image_urls(shape.get("bots", 1)),
+        )
+        # The initialization data as seen by chat.js.
+        init_data = self.fragment_init_data(block.student_view())
+        steps = block._steps_as_list  # pylint: disable=protected-access
+        return init_data, ChatEngine(steps, init_data["bot_image_urls"], rng)
+
+    def test_simulation_is_reproducible(self):
+        _, engine = self.make_engine(num_steps=50, depth=10, variants=3, bots=3, seed=1)
+        sessions = [list(ChatEngine(list(engine.steps.values()), rng=random.Random(7)).simulate()) for _ in range(2)]
+        self.assertEqual(sessions[0], sessions[1])
+        self.assertTrue(sessions[0])
+
+    def test_simulation(self):
+        _, engine = self.make_engine(num_steps=20, depth=5, loop_density=0, seed=2)
+        states = list(engine.simulate(choose=lambda state, responses: responses[0]))
+        self.assertEqual(len(states), 4)
+        final = engine.start(states[-1])
+        self.assertTrue(engine.is_final_step(final["current_step"]))
+        self.assertEqual(final["messages"][:len(states[-1]["messages"])], states[-1]["messages"])
+        self.assertEqual(final["messages"][-1]["from"], DEFAULT_BOT_ID)
+        self.assertEqual(len(list(engine.simulate(max_responses=2))), 2)
+
+    def test_variants_not_displayed_are_picked_first(self):
+        steps = [{
+            "id": "step1",
+            "messages": [[{"message": "Hi", "bot_id": DEFAULT_BOT_ID}, {"message": "Hello", "bot_id": DEFAULT_BOT_ID}]],
+            "responses": [{"message": "Again", "step": "step1"}],
+        }]
+        engine = ChatEngine(steps, rng=FirstCandidate())
+        state = engine.start()
+        self.assertEqual([message["message"] for message in state["messages"]], ["Hi"])
+        state = engine.start(engine.respond(state, engine.responses(state)[0]))
+        self.assertEqual([message["message"] for message in state["messages"]], ["Hi", "Again", "Hello"])
+        state = engine.start(engine.respond(state, engine.responses(state)[0]))
+        self.assertEqual(state["messages"][-1]["message"], "Hi")
+        self.assertEqual(state["messages"][-2], {"from": USER_ID, "message": "Again", "step": "step1"})
+
+    def test_paths(self):
+        _, engine = self.make_engine(num_steps=7, depth=3, fan_out=2, loop_density=0, seed=3)
+        paths = list(engine.paths(max_responses=10))
+        self.assertTrue(all(engine.is_final_step(state["current_step"]) for _, state in paths))
+        self.assertEqual(len(set(path for path, _ in paths)), len(paths))
+        self.assertTrue(all(len(path) <= 1 for path, _ in engine.paths(max_responses=1)))
+
+    @unittest.skipUnless(shutil.which("node"), "Node.js is required for comparing with chat.js")
+    @data(1, 2, 3, 4)
+    def test_matches_chat_js(self, seed):
+        """Runs the functions of chat.js and the engine on the same inputs and random numbers."""
+        init_data, _ = self.make_engine(num_steps=30, depth=6, messages=3, variants=3, bots=3, seed=seed)
+        rng = random.Random(seed)
+        numbers = [rng.random() for _ in range(1000)]
+        engine = ChatEngine(list(init_data["steps"].values()), init_data["bot_image_urls"], SequenceRandom(numbers))
+        states = [{"messages": [], "current_step": None}, {"messages": [], "current_step": "step3"}]
+        states += list(engine.simulate(max_responses=20))
+        states.append({"messages": states[-1]["messages"], "current_step": "removed"})
+
+        with open(CHAT_JS) as chat_js:
+            source = chat_js.read()
+        script = "\n".join(
+            ["var init_data = {};".format(json.dumps(init_data))] +
+            [js_function(source, name) for name in JS_FUNCTIONS] +
+            [
+                "var numbers = {}, index = 0;".format(json.dumps(numbers)),
+                "Math.random = function() { return numbers[index++]; };",
+                "var states = {};".format(json.dumps(states)),
+                "process.stdout.write(JSON.stringify(states.map(function(state) {",
+                "    var step = initialStep(state);",
+                "    return [step || null, isFinalStep(step), stepMessages(init_data.steps[step], state.messages)];",
+                "})));",
+            ]
+        )
+        expected = json.loads(subprocess.check_output(["node"], input=script.encode("utf-8")).decode("utf-8"))
+
+        engine.rng = SequenceRandom(numbers)
+        actual = []
+        for state in states:
+            step = engine.initial_step(state)
+            actual.append([step, engine.is_final_step(step), engine.step_messages(step, state["messages"])])
+        self.assertEqual(actual, expected)
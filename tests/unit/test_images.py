@@ -0,0 +1,175 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import webob
+from django.http import Http404
+from django.test import override_settings
+
+from chat import images, warmup
+
+from .utils import ChatBlockTestCase
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+yaml_steps = """
+- step1:
+    image-url: /static/photo.jpg
+    image-alt: A photo
+    messages: Look
+    responses:
+        - Next: step2
+- step2:
+    image-url: /static/icon.png
+    messages: And this
+    responses:
+        - Next: step3
+- step3:
+    image-url: /static/missing.png
+    messages: Bye
+"""
+
+
+def image_data(size, mode="RGB", image_format="JPEG"):
+    output = io.BytesIO()
+    Image.new(mode, size, "red").save(output, image_format)
+    return output.getvalue()
+
+
+@unittest.skipUnless(Image, "Requires Pillow.")
+class TestImages(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestImages, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.static_directory = os.path.join(directory, "static")
+        self.cache_directory = os.path.join(directory, "cache")
+        os.mkdir(self.static_directory)
+        self.write("photo.jpg", image_data((1200, 900)))
+        self.write("icon.png", image_data((64, 32), "RGBA", "PNG"))
+        images.set_backend(images.DirectoryBackend(self.static_directory), self.cache_directory)
+        self.addCleanup(images.set_backend, images._UNCONFIGURED)  # pylint: disable=protected-access
+
+    def write(self, name, data):
+        with open(os.path.join(self.static_directory, name), "wb") as image_file:
+            image_file.write(data)
+
+    def test_process(self):
+        info = images.process(image_data((1200, 900)))
+        self.assertEqual((info["width"], info["height"]), (1200, 900))
+        self.assertEqual(info["widths"], [240, 480, 960])
+        self.assertEqual(info["extension"], "jpg")
+        with Image.open(images.derivative_path("{}/480.jpg".format(info["hash"]))) as derivative:
+            self.assertEqual((derivative.format, derivative.size), ("JPEG", (480, 360)))
+        # Images with transparency are kept as PNG.
+        info = images.process(image_data((600, 300), "RGBA", "PNG"))
+        self.assertEqual((info["widths"], info["extension"]), ([240, 480], "png"))
+        with Image.open(images.derivative_path("{}/240.png".format(info["hash"]))) as derivative:
+            self.assertEqual((derivative.mode, derivative.size), ("RGBA", (240, 120)))
+        self.assertIsNone(images.process(b"not an image"))
+
+    def test_process_once(self):
+        data = image_data((500, 500))
+        info = images.process(data)
+        self._patch("PIL.Image.open", None)
+        self.assertEqual(images.process(data), info)
+
+    def test_directory_backend(self):
+        backend = images.DirectoryBackend(self.static_directory)
+        self.assertTrue(backend.get(None, "/static/photo.jpg"))
+        self.assertIsNone(backend.get(None, "/static/other.jpg"))
+        self.assertIsNone(backend.get(None, "/static/../cache/x"))
+        self.assertIsNone(backend.get(None, "https://example.com/photo.jpg"))
+
+    def test_derivative_path(self):
+        self.assertIsNone(images.derivative_path("../../etc/passwd"))
+        self.assertIsNone(images.derivative_path("{}/480.gif".format("0" * 64)))
+        self.assertEqual(
+            images.derivative_path("{}/480.jpg".format("0" * 64)),
+            os.path.join(self.cache_directory, "0" * 64, "480.jpg"),
+        )
+
+    def test_student_view(self):
+        block = self.make_block(
+            steps=yaml_steps, messages=[{"from": "bot", "message": "Look", "step": "step1"}], current_step="step1",
+        )
+        # The derivatives are generated in the background after the first view.
+        fragment = block.student_view()
+        self.assertEqual(self.fragment_init_data(fragment)["images"], {})
+        self.assertNotIn("srcset", fragment.content)
+        images.wait_for_background_work()
+        fragment = block.student_view()
+        init_data = self.fragment_init_data(fragment)
+        self.assertEqual(sorted(init_data["images"]), ["/static/icon.png", "/static/photo.jpg"])
+        photo = init_data["images"]["/static/photo.jpg"]
+        self.assertEqual((photo["width"], photo["height"]), (1200, 900))
+        self.assertRegex(photo["src"], r"/serve_image/[0-9a-f]{64}/480\.jpg$")
+        self.assertRegex(photo["srcset"], r"^\S+/240\.jpg 240w, \S+/480\.jpg 480w, \S+/960\.jpg 960w$")
+        # Images smaller than all widths keep their original, but their dimensions are known.
+        self.assertEqual(init_data["images"]["/static/icon.png"], {
+            "src": "/static/icon.png", "srcset": "", "sizes": images.IMAGE_SIZES, "width": 64, "height": 32,
+        })
+        self.assertIn(
+            '<img src="{src}" srcset="{srcset}" sizes="{sizes}" width="1200" height="900" alt="A photo" '
+            'data-image-url="/static/photo.jpg">'.format(**photo),
+            fragment.content,
+        )
+        self.assertIn(
+            '<link rel="preload" href="{src}" as="image" imagesrcset="{srcset}" imagesizes="{sizes}">'.format(**photo),
+            fragment.content,
+        )
+
+    def test_serve_image(self):
+        info = images.prepare(None, "/static/photo.jpg")
+        block = self.make_block(steps=yaml_steps)
+        response = block.handle("serve_image", webob.Request.blank("/"), "{}/240.jpg".format(info["hash"]))
+        self.assertEqual(response.content_type, "image/jpeg")
+        self.assertEqual(response.cache_control.max_age, 31536000)
+        with Image.open(io.BytesIO(response.body)) as derivative:
+            self.assertEqual(derivative.size, (240, 180))
+        for suffix in ("{}/120.jpg".format(info["hash"]), "../photo.jpg"):
+            with self.assertRaises(Http404):
+                block.handle("serve_image", webob.Request.blank("/"), suffix)
+
+    def test_serve_image_before_configured(self):
+        name = "{}/240.jpg".format("0" * 64)
+        os.makedirs(os.path.join(self.cache_directory, "0" * 64))
+        with open(os.path.join(self.cache_directory, name), "wb") as derivative:
+            derivative.write(b"derivative")
+        # The state of a process that has not rendered any view yet.
+        self._patch("chat.images._backend", images._UNCONFIGURED)  # pylint: disable=protected-access
+        self._patch("chat.images._cache_directory", None)
+        setting = {"BACKEND": "directory", "DIRECTORY": self.static_directory, "CACHE_DIRECTORY": self.cache_directory}
+        with override_settings(CHAT_XBLOCK_IMAGES=setting):
+            response = self.make_block(steps=yaml_steps).handle("serve_image", webob.Request.blank("/"), name)
+        self.assertEqual(response.body, b"derivative")
+
+    def test_warm_course(self):
+        self._patch("chat.warmup.course_blocks", {"course-v1:Org+Course+1": [self.make_block(steps=yaml_steps)]}.get)
+        self.assertEqual(warmup.warm_course("course-v1:Org+Course+1")["images"], 2)
+        self.assertEqual(len(os.listdir(self.cache_directory)), 2)
+        # The student view doesn't wait for the images once they are prepared.
+        self.assertEqual(len(self.fragment_init_data(self.make_block(steps=yaml_steps).student_view())["images"]), 2)
+
+    def test_warm_course_without_learner(self):
+        # Blocks are warmed from the modulestore, where there is no current learner.
+        block = self.make_block(steps=yaml_steps)
+        service = block.runtime.service
+        block.runtime.service = lambda block, name: None if name == "user" else service(block, name)
+        self._patch("chat.warmup.course_blocks", {"course-v1:Org+Course+1": [block]}.get)
+        report = warmup.warm_course("course-v1:Org+Course+1")
+        self.assertEqual((report["images"], report["failed"]), (2, 0))
+
+    def test_disabled(self):
+        images.set_backend(None)
+        block = self.make_block(steps=yaml_steps)
+        block.student_view()
+        images.wait_for_background_work()
+        self.assertEqual(self.fragment_init_data(block.student_view())["images"], {})
+        self.assertEqual(block.warm_images(), 0)
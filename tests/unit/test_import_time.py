@@ -0,0 +1,46 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+# Modules imported by every process loading XBlocks, before the chat package.
+FRAMEWORK_MODULES = ("webob", "xblock.core", "xblockutils.studio_editable", "web_fragments.fragment")
+# Modules only imported by the chat package when first used.
+LAZY_MODULES = ("pkg_resources", "django.http", "django.contrib.auth.models", "past.builtins")
+# Time (in ms) that importing the chat package may add to the import of the framework modules.
+IMPORT_TIME_BUDGET = 75
+IMPORT_TIME_ROUNDS = 3
+
+
+def run_python(*args):
+    """Runs a new Python interpreter with the given arguments, and returns its output and error output."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="workbench.settings")
+    process = subprocess.Popen(
+        [sys.executable] + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+    )
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise AssertionError(stderr.decode("utf-8"))
+    return stdout.decode("utf-8"), stderr.decode("utf-8")
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_import_time(self):
+        """Measures the import of the chat package with python -X importtime, in a new interpreter."""
+        code = "import {}; import chat".format(", ".join(FRAMEWORK_MODULES))
+        times = []
+        for _ in range(IMPORT_TIME_ROUNDS):
+            _, report = run_python("-X", "importtime", "-c", code)
+            # Only the modules imported after the framework are reported, with their cumulative time in us.
+            times.append(int(re.search(r"^import time:\s+\d+ \|\s+(\d+) \| chat$", report, re.MULTILINE).group(1)))
+        self.assertLess(min(times) / 1000.0, IMPORT_TIME_BUDGET)
+
+    def test_heavy_dependencies_are_lazy(self):
+        imported, _ = run_python("-c", "\n".join([
+            "import sys",
+            "import chat",
+            "print(' '.join(name for name in {!r} if name in sys.modules))".format(LAZY_MODULES),
+        ]))
+        self.assertEqual(imported.split(), [])
@@ -0,0 +1,79 @@
+from mock import patch
+from xblock.reference.user_service import XBlockUser
+
+from chat import compiled
+from chat.chat import LEARNER_INIT_DATA_KEYS, _with_learner_name
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import ChatBlockTestCase
+
+
+class TestSharedInitData(ChatBlockTestCase):
+
+    def set_full_name(self, full_name):
+        user = XBlockUser(full_name=full_name)
+        self._patch("workbench.runtime.WorkBenchUserService.get_current_user", lambda service: user)
+
+    def test_learner_data_passed_to_initialize_js(self):
+        fragment = self.make_block().student_view()
+        self.assertEqual(set(fragment.json_init_args), set(LEARNER_INIT_DATA_KEYS))
+
+    def test_same_data_as_init_data(self):
+        self.set_full_name("Ada Lovelace")
+        block = self.make_block(steps=generate_steps_yaml(num_steps=30, name_density=0.5, seed=1))
+        self.assertEqual(
+            self.fragment_init_data(block.student_view()),
+            block._js_init_data(),  # pylint: disable=protected-access
+        )
+
+    def test_shared_data_is_encoded_once(self):
+        block = self.make_block(steps=generate_steps_yaml(num_steps=30, name_density=1, seed=2))
+        with patch("chat.chat._escape_json_for_html", side_effect=lambda encoded: encoded) as escape:
+            for full_name in ("Ada Lovelace", "Grace Hopper"):
+                self.set_full_name(full_name)
+                init_data = self.fragment_init_data(block.student_view())
+                first_step = init_data["steps"][init_data["first_step_id"]]
+                self.assertIn(full_name.split(" ")[0], first_step["messages"][0][0]["message"])
+        # The shared data is escaped once, and then only the names.
+        self.assertEqual(escape.call_count, 3)
+
+    def test_steps_are_shared_by_learners(self):
+        block = self.make_block(steps=generate_steps_yaml(num_steps=200, name_density=1, seed=4))
+        self.set_full_name("Ada Lovelace")
+        block.student_view()
+        with patch("chat.compiled.CompiledScript.as_list") as as_list, \
+                patch("chat.chat._with_learner_name", wraps=_with_learner_name) as with_learner_name:
+            self.set_full_name("Grace Hopper")
+            init_data = self.fragment_init_data(block.student_view())
+        self.assertIn("Grace", init_data["steps"][init_data["first_step_id"]]["messages"][0][0]["message"])
+        # The steps are not listed again, and the name is only substituted in the steps read by the view.
+        as_list.assert_not_called()
+        steps = [
+            args[0] for args, _ in with_learner_name.call_args_list if isinstance(args[0], dict) and "id" in args[0]
+        ]
+        self.assertLess(len(steps), 10)
+
+    def test_content_changes_are_encoded(self):
+        block = self.make_block(subject="First subject")
+        self.assertEqual(self.fragment_init_data(block.student_view())["subject"], "First subject")
+        block.subject = "Second subject"
+        self.assertEqual(self.fragment_init_data(block.student_view())["subject"], "Second subject")
+        block.steps = generate_steps_yaml(num_steps=3, seed=3)
+        # The previous steps are served while the new ones are compiled.
+        self.assertEqual(len(self.fragment_init_data(block.student_view())["steps"]), 6)
+        compiled.wait_for_background_compilations()
+        self.assertEqual(
+            sorted(self.fragment_init_data(block.student_view())["steps"]),
+            ["step0", "step1", "step2"],
+        )
+
+    def test_names_are_escaped(self):
+        self.set_full_name('</script><script>alert("&")</script> Doe')
+        block = self.make_block(steps='- step1:\n    messages: "Hi [NAME]"\n')
+        fragment = block.student_view()
+        self.assertEqual(fragment.content.count("</script>"), 1)
+        init_data = self.fragment_init_data(fragment)
+        self.assertEqual(
+            init_data["steps"]["step1"]["messages"][0][0]["message"],
+            'Hi </script><script>alert("&")</script>',
+        )
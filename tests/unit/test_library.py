@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from mock import patch
+from xblock.validation import Validation
+
+from chat import compiled, library, metrics
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import ChatBlockTestCase, FieldData
+
+
+class TestScriptLibrary(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestScriptLibrary, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        library.set_backend(library.DirectoryBackend(self.directory))
+        self.addCleanup(library.set_backend, library._UNCONFIGURED)  # pylint: disable=protected-access
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+
+    def add_script(self, name, source):
+        with open(os.path.join(self.directory, "{}.yaml".format(name)), "w") as script:
+            script.write(source)
+
+    def validate(self, block, script_name):
+        validation = Validation(block.scope_ids.usage_id)
+        block.validate_field_data(validation, FieldData(block.steps, script_name))
+        return [message.text for message in validation.messages]
+
+    def test_referenced_script_replaces_steps(self):
+        self.add_script("onboarding", generate_steps_yaml(num_steps=4, seed=1))
+        block = self.make_block(steps=generate_steps_yaml(num_steps=2, seed=2), script_name="onboarding")
+        init_data = self.fragment_init_data(block.student_view())
+        self.assertEqual(sorted(init_data["steps"]), ["step0", "step1", "step2", "step3"])
+
+    def test_script_is_read_and_compiled_once(self):
+        self.add_script("onboarding", generate_steps_yaml(num_steps=20, seed=3))
+        get_script = library.DirectoryBackend.get
+        with patch.object(library.DirectoryBackend, "get", autospec=True, side_effect=get_script) as get:
+            for _ in range(3):
+                self.make_block(script_name="onboarding").student_view()
+        self.assertEqual(get.call_count, 1)
+        # The bot_image_url field is still parsed on each view.
+        self.assertEqual(self.sink.counters["yaml_parse"], 4)
+
+    def test_new_versions_are_used_after_ttl(self):
+        self.add_script("onboarding", generate_steps_yaml(num_steps=2, seed=4))
+        block = self.make_block(script_name="onboarding")
+        with patch("chat.library.time.time", return_value=1000):
+            block.student_view()
+        self.add_script("onboarding", generate_steps_yaml(num_steps=3, seed=4))
+        with patch("chat.library.time.time", return_value=1000 + library.SCRIPT_LIBRARY_TTL - 1):
+            self.assertEqual(len(self.fragment_init_data(block.student_view())["steps"]), 2)
+        with patch("chat.library.time.time", return_value=1000 + library.SCRIPT_LIBRARY_TTL):
+            # The previous version is served while the new one is compiled.
+            self.assertEqual(len(self.fragment_init_data(block.student_view())["steps"]), 2)
+            compiled.wait_for_background_compilations()
+            self.assertEqual(len(self.fragment_init_data(block.student_view())["steps"]), 3)
+
+    def test_missing_script(self):
+        with self.assertLogs("chat.library", "WARNING"):
+            init_data = self.fragment_init_data(self.make_block(script_name="missing").student_view())
+        self.assertEqual(init_data["steps"], {})
+
+    def test_validation(self):
+        block = self.make_block()
+        self.add_script("valid", generate_steps_yaml(num_steps=5, seed=5))
+        self.add_script("invalid", "- step1: {}\n")
+        self.assertEqual(self.validate(block, "valid"), [])
+        self.assertEqual(len(self.validate(block, "invalid")), 1)
+        self.assertEqual(
+            self.validate(block, "missing"), ["The script library of the course has no script named missing"]
+        )
+        self.assertEqual(len(self.validate(block, "../valid")), 1)
+
+    def test_validation_reads_the_latest_version(self):
+        self.add_script("onboarding", generate_steps_yaml(num_steps=2, seed=6))
+        block = self.make_block(script_name="onboarding")
+        block.student_view()
+        self.add_script("onboarding", "- step1: {}\n")
+        self.assertEqual(len(self.validate(block, "onboarding")), 1)
+        self.add_script("onboarding", generate_steps_yaml(num_steps=5, seed=6))
+        self.assertEqual(self.validate(block, "onboarding"), [])
+        block.student_view()
+        compiled.wait_for_background_compilations()
+        self.assertEqual(len(self.fragment_init_data(block.student_view())["steps"]), 5)
+
+    def test_backend_from_settings(self):
+        library.set_backend(library._UNCONFIGURED)  # pylint: disable=protected-access
+        with override_settings(CHAT_XBLOCK_SCRIPT_LIBRARY={"BACKEND": "directory", "DIRECTORY": self.directory}):
+            self.assertEqual(library.get_backend().directory, self.directory)
+        library.set_backend(library._UNCONFIGURED)  # pylint: disable=protected-access
+        self.assertIsInstance(library.get_backend(), library.AssetsBackend)
+        self.assertIsNone(library.get_script("course-v1:edX+Demo+2024", "onboarding"))
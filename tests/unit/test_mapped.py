@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+
+import yaml
+
+from chat import compiled, mapped, metrics, warmup
+from chat.chat import ChatXBlock
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import ChatBlockTestCase
+
+
+def compile_script(source):
+    return compiled.CompiledScript([
+        ChatXBlock._normalize_step(step) for step in yaml.safe_load(source)  # pylint: disable=protected-access
+    ])
+
+
+class TestMappedScripts(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestMappedScripts, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "scripts.bin")
+        self.addCleanup(compiled.clear_preloaded)
+        self.sources = [
+            generate_steps_yaml(
+                num_steps=30, variants=3, bots=3, image_frequency=0.5, name_density=0.5, seed=seed,
+            )
+            for seed in range(3)
+        ] + [u'- "étape":\n    messages: "Bonjour [NAME] ☃"\n    notice: [correct, "Bravo [NAME]"]\n']
+
+    def test_same_steps_as_compiled_scripts(self):
+        scripts = dict((source, compile_script(source)) for source in self.sources)
+        mapped.write(self.path, scripts.items())
+        scripts_file = mapped.MappedScripts(self.path)
+        self.assertEqual(len(scripts_file), 4)
+        for source, script in scripts.items():
+            self.assertEqual(scripts_file.get(source).as_list("Ada"), script.as_list("Ada"))
+        self.assertIsNone(scripts_file.get("- other: {}"))
+
+    def test_strings_are_stored_once(self):
+        source = self.sources[0]
+        mapped.write(self.path, [(source, compile_script(source))])
+        size = os.path.getsize(self.path)
+        mapped.write(self.path, [(source, compile_script(source)), (source + "\n", compile_script(source))])
+        # The second script only adds its step records.
+        self.assertLess(os.path.getsize(self.path), size * 1.5)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as scripts_file:
+            scripts_file.write(b"\0" * 64)
+        with self.assertRaisesRegex(ValueError, "is not a file of compiled chat scripts"):
+            mapped.MappedScripts(self.path)
+
+    def test_preloaded_scripts_are_not_compiled(self):
+        sink = metrics.MemorySink()
+        metrics.set_sink(sink)
+        self.addCleanup(metrics.set_sink, None)
+        blocks = [self.make_block(steps=source) for source in self.sources]
+        expected = [block.student_view().content for block in blocks]
+        self._patch("chat.warmup.course_blocks", {"course-v1:Org+Course+1": blocks}.get)
+        self.assertEqual(warmup.preload_courses(["course-v1:Org+Course+1"], self.path), 4)
+        compiled.clear_cache()
+        compiled.set_shared_cache(None)
+        self.addCleanup(compiled.set_shared_cache, "default")
+        sink.reset()
+        for block, content in zip(blocks, expected):
+            self.assertIsInstance(block._compiled_steps, mapped.MappedScript)  # pylint: disable=protected-access
+            self.assertEqual(block.student_view().content, content)
+        # Only the bot_image_url field is parsed.
+        self.assertEqual(sink.counters["yaml_parse"], 4)
+        self.assertEqual(len(compiled._cache), 0)  # pylint: disable=protected-access
+        # Preloading again replaces the preloaded scripts.
+        self.assertEqual(warmup.preload_courses(["course-v1:Org+Course+1"], self.path), 4)
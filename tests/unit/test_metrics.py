@@ -0,0 +1,88 @@
+import json
+import logging
+import socket
+
+import webob
+from django.test import override_settings
+from mock import patch
+
+from chat import metrics
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import ChatBlockTestCase
+
+
+class TestMetrics(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+
+    def submit_response(self, block, state):
+        request = webob.Request.blank("/", method="POST", body=json.dumps(state).encode("utf-8"))
+        return block.handle("submit_response", request)
+
+    def test_student_view(self):
+        block = self.make_block(steps=generate_steps_yaml(num_steps=20, seed=1))
+        block.student_view()
+        # The steps are not listed with the learner's name.
+        self.assertEqual(set(self.sink.timings), {"student_view", "js_init_data"})
+        self.assertEqual(self.sink.counters, {"yaml_parse": 2, "compiled_scripts.shared_cache_miss": 1})
+        self.assertGreater(self.sink.gauges["init_data_bytes"], 1000)
+
+    def test_handlers(self):
+        block = self.make_block()
+        state = {"messages": [{"from": "user", "message": "Hi", "step": "step1"}], "current_step": "step2"}
+        self.submit_response(block, state)
+        block.handle("serve_audio", webob.Request.blank("/"), "bot.wav")
+        self.assertEqual(len(self.sink.timings["submit_response"]), 1)
+        self.assertEqual(len(self.sink.timings["serve_audio"]), 1)
+        self.assertEqual(self.sink.gauges["submitted_state_bytes"], len(json.dumps(state)))
+
+    def test_disabled(self):
+        metrics.set_sink(None)
+        with patch("chat.metrics.default_timer") as timer:
+            self.make_block().student_view()
+        self.assertFalse(timer.called)
+        self.assertFalse(self.sink.timings or self.sink.counters or self.sink.gauges)
+
+    def test_exceptions_are_timed(self):
+        @metrics.timed("failing")
+        def failing():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            failing()
+        self.assertEqual(len(self.sink.timings["failing"]), 1)
+
+    @override_settings(CHAT_XBLOCK_METRICS={"SINK": "logging"})
+    def test_sink_from_settings(self):
+        metrics.set_sink(metrics._UNCONFIGURED)  # pylint: disable=protected-access
+        self.assertIsInstance(metrics.get_sink(), metrics.LoggingSink)
+        with self.assertLogs("chat.metrics", logging.INFO) as logs:
+            metrics.increment("yaml_parse")
+            metrics.gauge("init_data_bytes", 10)
+        self.assertEqual(logs.output, [
+            "INFO:chat.metrics:counter yaml_parse: +1",
+            "INFO:chat.metrics:gauge init_data_bytes: 10",
+        ])
+
+    def test_statsd_sink(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(listener.close)
+        listener.bind(("127.0.0.1", 0))
+        listener.settimeout(5)
+        metrics.set_sink(metrics.StatsdSink(port=listener.getsockname()[1], prefix="chat"))
+        metrics.increment("yaml_parse", 2)
+        metrics.gauge("init_data_bytes", 10)
+        metrics.timed("student_view")(lambda: None)()
+        packets = [listener.recv(1024).decode("utf-8") for _ in range(3)]
+        self.assertEqual(packets[:2], ["chat.yaml_parse:2|c", "chat.init_data_bytes:10|g"])
+        self.assertRegex(packets[2], r"^chat\.student_view:\d+\.\d{3}\|ms$")
+
+    def test_statsd_sink_ignores_errors(self):
+        sink = metrics.StatsdSink(port=8125)
+        sink.socket.close()
+        sink.increment("yaml_parse")
@@ -0,0 +1,206 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+import yaml
+from ddt import data, ddt
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from chat import compiled, olx
+from chat.chat import ChatXBlock
+from chat.management.commands import precompile_chat_olx, validate_chat_olx
+from chat.scriptgen import generate_steps_yaml
+
+INVALID_STEPS = "- step1: {}\n"
+LEGACY_STEPS = """- step1:
+    messages: Hi [NAME]
+    responses:
+      - Bye: step2
+- step2:
+    messages: Bye
+"""
+
+
+class OlxTestCase(TestCase):
+    """Base class for tests of the commands processing OLX course exports in a temporary directory."""
+
+    command = None
+
+    def setUp(self):
+        super(OlxTestCase, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def add_file(self, path, content):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as output:
+            output.write(content)
+
+    def add_export(self):
+        """Adds a course export with chat blocks defined in all the ways OLX allows."""
+        self.add_file("course.xml", '<course url_name="run" org="edX" course="Demo"/>')
+        self.add_file("vertical/unit.xml", "".join([
+            "<vertical>",
+            '<chat url_name="pointer"/>',
+            '<chat url_name="defaults"/>',
+            '<chat url_name="inline" steps={}/>'.format(quoteattr(INVALID_STEPS)),
+            "</vertical>",
+        ]))
+        self.add_file("chat/pointer.xml", "<chat steps={}/>".format(quoteattr(generate_steps_yaml(seed=1))))
+        self.add_file("chat/shared.xml", '<chat script_name="onboarding"/>')
+        self.add_file("chat/missing.xml", '<chat script_name="missing"/>')
+        self.add_file("static/onboarding.yaml", generate_steps_yaml(seed=2))
+        self.add_file("static/feed.xml", "<rss><chat/></rss>")
+
+    def run_command(self, **options):
+        """Runs the command, and returns its reports, its summary and the error it raised."""
+        out = StringIO()
+        error = None
+        try:
+            # The commands are not in the installed apps of the workbench.
+            call_command(self.command.Command(), self.root, stdout=out, **options)
+        except CommandError as raised:
+            error = raised
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        return lines[:-1], lines[-1]["summary"], error
+
+
+@ddt
+class TestValidateOlx(OlxTestCase):
+
+    command = validate_chat_olx
+
+    @data(1, 2)
+    def test_report(self, jobs):
+        self.add_export()
+        reports, summary, error = self.run_command(jobs=jobs)
+        self.assertEqual(
+            [(report["path"], report["url_name"], len(report["errors"])) for report in reports],
+            [
+                ("chat/missing.xml", "missing", 1),
+                ("chat/pointer.xml", "pointer", 0),
+                ("chat/shared.xml", "shared", 0),
+                ("vertical/unit.xml", "defaults", 0),
+                ("vertical/unit.xml", "inline", 1),
+            ],
+        )
+        self.assertEqual(reports[0]["errors"], ["The script library of the course has no script named missing"])
+        self.assertEqual(summary, {"files": 5, "blocks": 5, "invalid": 2})
+        self.assertEqual(str(error), "2 of 5 chat blocks are invalid")
+
+    def test_valid_export(self):
+        self.add_file("chat/pointer.xml", "<chat/>")
+        reports, summary, error = self.run_command(jobs=1)
+        self.assertEqual(reports, [{"path": "chat/pointer.xml", "url_name": "pointer", "errors": []}])
+        self.assertEqual(summary, {"files": 1, "blocks": 1, "invalid": 0})
+        self.assertIsNone(error)
+
+    def test_invalid_xml(self):
+        self.add_file("vertical/unit.xml", "<vertical><chat></vertical>")
+        reports, _, error = self.run_command(jobs=1)
+        self.assertTrue(reports[0]["errors"][0].startswith("Invalid XML: mismatched tag"))
+        self.assertIsNotNone(error)
+
+    def test_same_rules_as_studio(self):
+        image_step = "- step5:\n    messages: Hi\n    image-url: not a URL\n"
+        steps = generate_steps_yaml(num_steps=5, seed=3) + INVALID_STEPS + image_step
+        self.add_file("chat/block.xml", "<chat steps={}/>".format(quoteattr(steps)))
+        errors = []
+        olx.ChatXBlock._validate_steps(steps, errors.append)  # pylint: disable=protected-access
+        reports, _, _ = self.run_command(jobs=1)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(reports[0]["errors"], errors)
+
+    def test_not_a_directory(self):
+        with self.assertRaises(CommandError):
+            call_command(self.command.Command(), os.path.join(self.root, "missing"), stdout=StringIO())
+
+
+@ddt
+class TestPrecompileOlx(OlxTestCase):
+
+    command = precompile_chat_olx
+
+    def read_block(self, path):
+        """Returns the steps and compiled_script attributes of the chat block in a file of the export."""
+        with open(os.path.join(self.root, path)) as xml_file:
+            element = ElementTree.fromstring(xml_file.read())
+        return element.get("steps"), element.get("compiled_script")
+
+    def read_files(self):
+        files = {}
+        for path in olx.xml_files(self.root):
+            with open(os.path.join(self.root, path)) as xml_file:
+                files[path] = xml_file.read()
+        return files
+
+    @data(1, 2)
+    def test_precompile(self, jobs):
+        self.add_export()
+        self.add_file("chat/legacy.xml", "<chat steps={}><!-- Legacy --></chat>".format(quoteattr(LEGACY_STEPS)))
+        reports, summary, error = self.run_command(jobs=jobs)
+        self.assertEqual(
+            [
+                (report["url_name"], report["changed"], report["migrated"], len(report["errors"]))
+                for report in reports
+            ],
+            [
+                ("legacy", True, True, 0),
+                ("missing", False, False, 0),
+                ("pointer", True, False, 0),
+                ("shared", False, False, 0),
+                ("defaults", False, False, 0),
+                ("inline", False, False, 1),
+            ],
+        )
+        self.assertEqual(summary, {"files": 6, "blocks": 6, "changed": 2, "migrated": 1, "invalid": 1})
+        self.assertEqual(str(error), "1 of 6 chat blocks are invalid")
+
+        steps, script = self.read_block("chat/legacy.xml")
+        self.assertEqual(
+            [list(step.values())[0]["messages"] for step in yaml.safe_load(steps)], [["Hi [NAME]"], ["Bye"]]
+        )
+        expected = [
+            ChatXBlock._normalize_step(step)  # pylint: disable=protected-access
+            for step in yaml.safe_load(LEGACY_STEPS)
+        ]
+        self.assertEqual(compiled.deserialize(steps, script).as_list("[NAME]"), expected)
+        with open(os.path.join(self.root, "chat/legacy.xml")) as xml_file:
+            self.assertTrue(xml_file.read().endswith("><!-- Legacy --></chat>"))
+
+    def test_idempotent(self):
+        self.add_export()
+        self.add_file("chat/legacy.xml", "<chat steps={}/>".format(quoteattr(LEGACY_STEPS)))
+        self.run_command(jobs=1)
+        files = self.read_files()
+        _, summary, _ = self.run_command(jobs=1)
+        self.assertEqual(summary["changed"], 0)
+        self.assertEqual(self.read_files(), files)
+
+    def test_changed_steps_are_compiled_again(self):
+        steps = generate_steps_yaml(num_steps=3, seed=1)
+        self.add_file("chat/block.xml", "<chat steps={}/>".format(quoteattr(steps)))
+        self.run_command(jobs=1)
+        _, script = self.read_block("chat/block.xml")
+        steps = generate_steps_yaml(num_steps=4, seed=1)
+        self.add_file(
+            "chat/block.xml", "<chat steps={} compiled_script={}/>".format(quoteattr(steps), quoteattr(script))
+        )
+        self.assertIsNone(compiled.deserialize(steps, script))
+        _, summary, _ = self.run_command(jobs=1)
+        self.assertEqual(summary["changed"], 1)
+        self.assertEqual(len(compiled.deserialize(*self.read_block("chat/block.xml")).steps), 4)
+
+    def test_dry_run(self):
+        self.add_file("chat/legacy.xml", "<chat steps={}/>".format(quoteattr(LEGACY_STEPS)))
+        files = self.read_files()
+        reports, _, _ = self.run_command(jobs=1, dry_run=True)
+        self.assertTrue(reports[0]["migrated"])
+        self.assertEqual(self.read_files(), files)
@@ -0,0 +1,127 @@
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import webob
+from django.http import Http404
+
+from chat import proxy
+
+from .utils import ChatBlockTestCase
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + b"\0" * 100
+
+
+class Origin(HTTPServer):
+    """A local stand-in for a site hosting images, counting the requests for each path."""
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), OriginHandler)
+        self.files = {"/image.png": ("image/png", IMAGE), "/page.html": ("text/html", b"<html></html>")}
+        self.requests = {}
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.server_port, path)
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.requests[self.path] = self.server.requests.get(self.path, 0) + 1
+        if self.path not in self.server.files:
+            self.send_error(404)
+            return
+        content_type, body = self.server.files[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestImageProxy(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestImageProxy, self).setUp()
+        self.origin = Origin()
+        thread = threading.Thread(target=self.origin.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.origin.server_close)
+        self.addCleanup(self.origin.shutdown)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        proxy.set_cache(proxy.ImageCache(self.directory, timeout=5))
+        self.addCleanup(proxy.set_cache, proxy._UNCONFIGURED)  # pylint: disable=protected-access
+        self.steps = """
+- step1:
+    image-url: {image}
+    messages: Look
+    responses:
+        - Next: step2
+- step2:
+    image-url: {page}
+    messages: Bye
+- step3:
+    image-url: /static/local.png
+    messages: Local
+""".format(image=self.origin.url("/image.png"), page=self.origin.url("/page.html"))
+
+    def get(self, block, suffix):
+        return block.handle("proxy_image", webob.Request.blank("/"), suffix)
+
+    def test_image_urls_are_rewritten(self):
+        block = self.make_block(steps=self.steps)
+        steps = self.fragment_init_data(block.student_view())["steps"]
+        self.assertRegex(
+            steps["step1"]["image_url"],
+            r"/proxy_image/{}$".format(proxy.url_digest(self.origin.url("/image.png"))),
+        )
+        self.assertEqual(steps["step3"]["image_url"], "/static/local.png")
+        self.assertEqual(self.origin.requests, {})
+        proxy.set_cache(None)
+        steps = self.fragment_init_data(block.student_view())["steps"]
+        self.assertEqual(steps["step1"]["image_url"], self.origin.url("/image.png"))
+
+    def test_images_are_fetched_once(self):
+        block = self.make_block(steps=self.steps)
+        suffix = proxy.url_digest(self.origin.url("/image.png"))
+        for _ in range(3):
+            response = self.get(block, suffix)
+            self.assertEqual((response.status_int, response.content_type, response.body), (200, "image/png", IMAGE))
+            self.assertEqual(response.cache_control.max_age, 31536000)
+        self.assertEqual(self.origin.requests, {"/image.png": 1})
+        # Cached images are served while their origin is down.
+        self.origin.files.clear()
+        self.assertEqual(self.get(self.make_block(steps=self.steps), suffix).body, IMAGE)
+
+    def test_only_images_of_the_block(self):
+        block = self.make_block(steps=self.steps)
+        for url in (self.origin.url("/other.png"), "/static/local.png"):
+            with self.assertRaises(Http404):
+                self.get(block, proxy.url_digest(url))
+        with self.assertLogs("chat.proxy", "WARNING"):
+            self.assertEqual(self.get(block, proxy.url_digest(self.origin.url("/page.html"))).status_int, 502)
+        self.assertEqual(self.origin.requests, {"/page.html": 1})
+
+    def test_origin_errors(self):
+        self.origin.files.clear()
+        block = self.make_block(steps=self.steps)
+        with self.assertLogs("chat.proxy", "WARNING"):
+            self.assertEqual(self.get(block, proxy.url_digest(self.origin.url("/image.png"))).status_int, 502)
+        self.assertEqual(proxy.get_cache().size(), 0)
+
+    def test_eviction(self):
+        cache = proxy.ImageCache(self.directory, max_size=(len(IMAGE) + 20) * 2)
+        self.origin.files.update(("/{}.png".format(name), ("image/png", IMAGE)) for name in "abc")
+        for name in "abac":
+            cache.fetch(self.origin.url("/{}.png".format(name)))
+        self.assertLessEqual(cache.size(), cache.max_size)
+        # The least recently served image was evicted.
+        cache.fetch(self.origin.url("/a.png"))
+        cache.fetch(self.origin.url("/b.png"))
+        self.assertEqual(self.origin.requests, {"/a.png": 1, "/b.png": 2, "/c.png": 1})
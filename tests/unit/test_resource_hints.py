@@ -0,0 +1,63 @@
+import re
+
+from mock import patch
+
+from chat.default_data import USER_ID
+
+from .utils import ChatBlockTestCase
+
+DEFAULT_BOT_IMAGE_URL = "/resource/chat/public/bot.jpg"
+
+yaml_steps = """
+- step1:
+    image-url: /static/step1.png
+    messages:
+        - Hi
+        - helper: Hello
+    responses:
+        - Go: step2
+        - Stay: step1
+- step2:
+    image-url: /static/step2.png
+    messages: Bye
+"""
+
+
+class TestResourceHints(ChatBlockTestCase):
+
+    def make_block(self, **fields):
+        fields.setdefault("steps", yaml_steps)
+        fields.setdefault("bot_image_url", "helper: /static/helper.png\nunused: /static/unused.png")
+        return super(TestResourceHints, self).make_block(**fields)
+
+    @staticmethod
+    def hints(fragment):
+        return re.findall(r'<link rel="(\w+)" href="([^"]+)"(?: as="(\w+)")?>', fragment.content)
+
+    def test_first_step(self):
+        hints = self.hints(self.make_block().student_view())
+        self.assertEqual(hints[:3], [
+            ("preload", DEFAULT_BOT_IMAGE_URL, "image"),
+            ("preload", "/static/helper.png", "image"),
+            ("preload", "/static/step1.png", "image"),
+        ])
+        self.assertEqual([hint[0] for hint in hints[3:]], ["prefetch"] * 4)
+        self.assertIn("/static/user.png", [hint[1] for hint in hints[3:]])
+        self.assertEqual(hints[-1], ("prefetch", "/static/step2.png", ""))
+        self.assertIn("/serve_audio/bot.wav", hints[3][1])
+        self.assertIn("/serve_audio/response.wav", hints[4][1])
+
+    def test_current_step_of_returning_learner(self):
+        block = self.make_block(
+            messages=[
+                {"from": "bot", "message": "Hi", "step": "step1"},
+                {"from": USER_ID, "message": "Go", "step": "step1"},
+            ],
+            current_step="step2",
+        )
+        preloaded = [hint[1] for hint in self.hints(block.student_view()) if hint[0] == "preload"]
+        self.assertEqual(preloaded, [DEFAULT_BOT_IMAGE_URL, "/static/step2.png"])
+
+    @patch("chat.chat.MAX_RESOURCE_HINTS", 2)
+    def test_number_of_hints_is_bounded(self):
+        self.assertEqual(len(self.hints(self.make_block().student_view())), 2)
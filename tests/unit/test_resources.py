@@ -0,0 +1,68 @@
+import builtins
+import importlib.resources
+import os
+import sys
+import types
+
+from django.template import Engine, Template
+from django.utils import translation
+from mock import patch
+
+from chat import resources
+
+from .utils import ChatBlockTestCase
+
+
+class TestResources(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestResources, self).setUp()
+        resources.clear()
+        self.addCleanup(resources.clear)
+
+    def test_no_filesystem_or_template_work_after_warm_up(self):
+        block = self.make_block()
+        expected = block.student_view().content
+        failing = AssertionError("The student view read a file or compiled a template after warm-up.")
+        with patch("importlib.resources.files", side_effect=failing), \
+                patch.object(builtins, "open", side_effect=failing), \
+                patch.object(os, "stat", side_effect=failing), \
+                patch.object(Engine, "__init__", side_effect=failing), \
+                patch.object(Template, "compile_nodelist", side_effect=failing):
+            self.assertEqual(block.student_view().content, expected)
+            self.assertIn("<p>Other</p>", self.make_block(subject="Other").student_view().content)
+
+    def test_backport_before_python_3_9(self):
+        # importlib.resources has no files and as_file functions before Python 3.9.
+        backport = types.SimpleNamespace(files=importlib.resources.files, as_file=importlib.resources.as_file)
+        old = types.SimpleNamespace()
+        with patch.object(importlib, "resources", old), \
+                patch.dict(sys.modules, {"importlib.resources": old, "importlib_resources": backport}):
+            self.assertEqual(resources.read("public/bot.wav")[:4], b"RIFF")
+            with resources.as_file("public/bot.wav") as path:
+                self.assertTrue(os.path.isfile(path))
+
+    def test_clear(self):
+        self.make_block(subject="Subject").student_view()
+        with patch("chat.resources.read", return_value=b"<h2>{{ subject }}</h2>") as read:
+            self.assertNotIn("<h2>Subject</h2>", self.make_block(subject="Subject").student_view().content)
+            self.assertFalse(read.called)
+            resources.clear()
+            self.assertIn("<h2>Subject</h2>", self.make_block(subject="Subject").student_view().content)
+
+    def test_translations_are_read_once_per_language(self):
+        block = self.make_block()
+        with patch("chat.resources.read", wraps=resources.read) as read:
+            for language in ("en", "fr-ca", "en", "fr-ca", "es-419"):
+                with translation.override(language):
+                    block.get_translation_content()
+        self.assertEqual(
+            [call[0][0] for call in read.call_args_list],
+            [
+                "public/js/translations/en/textjs.js",
+                # There are no translations for fr_ca, so the English ones are used.
+                "public/js/translations/fr_ca/textjs.js",
+                "public/js/translations/en/textjs.js",
+                "public/js/translations/es_419/textjs.js",
+            ],
+        )
@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import yaml
+from ddt import data, ddt, unpack
+from django.core.management import call_command
+from xblock.validation import Validation
+
+from chat.default_data import MAX_USER_RESPONSES, USER_ID
+from chat.management.commands.generate_chat_script import Command
+from chat.scriptgen import generate_bot_image_urls, generate_session, generate_steps, generate_steps_yaml
+
+from .utils import ChatBlockTestCase, FieldData
+
+
+@ddt
+class TestScriptGenerator(ChatBlockTestCase):
+
+    @data(
+        dict(num_steps=1),
+        dict(num_steps=50, depth=50, fan_out=1),
+        dict(num_steps=200, depth=5, fan_out=MAX_USER_RESPONSES, loop_density=0.5),
+        dict(num_steps=20, messages=3, variants=4, bots=10, image_frequency=1, name_density=1),
+        dict(num_steps=20, messages=0),
+    )
+    def test_generated_steps_are_valid(self, shape):
+        block = self.make_block()
+        validation = Validation(block.scope_ids.usage_id)
+        block.validate_field_data(validation, FieldData(generate_steps_yaml(seed=1, **shape)))
+        self.assertTrue(validation.empty, [message.text for message in validation.messages])
+
+    def test_same_seed_generates_same_script(self):
+        self.assertEqual(generate_steps(seed=7), generate_steps(seed=7))
+        self.assertNotEqual(generate_steps(seed=7), generate_steps(seed=8))
+
+    @data((0,), (MAX_USER_RESPONSES + 1,))
+    @unpack
+    def test_fan_out_is_limited(self, fan_out):
+        with self.assertRaises(ValueError):
+            generate_steps(fan_out=fan_out)
+
+    def test_shape(self):
+        steps = generate_steps(num_steps=30, depth=3, fan_out=2, loop_density=0, bots=3, seed=3)
+        contents = [list(step.values())[0] for step in steps]
+        self.assertEqual(len(steps), 30)
+        self.assertTrue(all(1 <= len(content["responses"]) <= 2 for content in contents[:20]))
+        self.assertTrue(all("responses" not in content for content in contents[20:]))
+        self.assertEqual(len(generate_bot_image_urls(3).splitlines()), 3)
+
+    def test_session_walks_through_steps(self):
+        steps = generate_steps(num_steps=40, depth=8, bots=2, name_density=1, seed=5)
+        states = generate_session(steps, max_messages=1000, seed=5, name="Ada")
+        self.assertEqual(len(states), 7)
+        for previous, state in zip(states, states[1:]):
+            self.assertEqual(state["messages"][:len(previous["messages"])], previous["messages"])
+        final = states[-1]
+        self.assertEqual(final["messages"][-1]["from"], USER_ID)
+        self.assertTrue(all("[NAME]" not in message["message"] for message in final["messages"]))
+        self.assertTrue(any("Ada" in message["message"] for message in final["messages"]))
+
+    def test_command_transcript_walks_through_printed_steps(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "transcript.json")
+        stdout = StringIO()
+        call_command(Command(), "--steps", "20", "--transcript", "30", "--transcript-output", path, stdout=stdout)
+        steps = dict(list(step.items())[0] for step in yaml.safe_load(stdout.getvalue()))
+        with open(path) as transcript_file:
+            transcript = json.load(transcript_file)
+        responses = [message for message in transcript["messages"] if message["from"] == USER_ID]
+        self.assertTrue(responses)
+        for message in responses:
+            self.assertIn(message["message"], [
+                list(response.keys())[0] for response in steps[message["step"]]["responses"]
+            ])
@@ -0,0 +1,74 @@
+import json
+
+import webob
+
+from chat.default_data import NAME_PLACEHOLDER, STUDENT_VIEW_DATA_VERSION, USER_ID
+
+from .utils import ChatBlockTestCase
+
+yaml_steps = """
+- step1:
+    image-url: /static/step1.png
+    messages:
+        - Hi [NAME]
+        - helper: Hello
+    responses:
+        - Go: step2
+- step2:
+    messages: Bye
+"""
+
+
+class TestStudentViewData(ChatBlockTestCase):
+
+    def make_block(self, **fields):
+        fields.setdefault("steps", yaml_steps)
+        fields.setdefault("bot_image_url", "helper: /static/helper.png")
+        return super(TestStudentViewData, self).make_block(**fields)
+
+    def test_data(self):
+        data = self.make_block(timing_profile="express").student_view_data()
+        self.assertEqual(data["version"], STUDENT_VIEW_DATA_VERSION)
+        self.assertEqual([step["id"] for step in data["steps"]], ["step1", "step2"])
+        self.assertEqual(data["steps"][0], {
+            "id": "step1",
+            "image_url": "/static/step1.png",
+            "messages": [
+                [{"message": "Hi " + NAME_PLACEHOLDER, "bot_id": "bot"}],
+                [{"message": "Hello", "bot_id": "custom/helper"}],
+            ],
+            "responses": [{"message": "Go", "step": "step2"}],
+        })
+        self.assertEqual(data["first_step_id"], "step1")
+        self.assertEqual(data["bot_image_urls"]["custom/helper"], "/static/helper.png")
+        self.assertEqual(data["timing_profile"], "express")
+        self.assertIn("bot_message_animation_delay", data["timings"])
+        self.assertIn("/offline_bundle", data["offline_bundle_url"])
+        json.dumps(data)
+
+    def test_script_hash(self):
+        data = self.make_block().student_view_data()
+        self.assertRegex(data["script_hash"], r"^[0-9a-f]{64}$")
+        self.assertEqual(self.make_block(subject="Other").student_view_data()["script_hash"], data["script_hash"])
+        self.assertNotEqual(
+            self.make_block(steps=yaml_steps.replace("Bye", "Goodbye")).student_view_data()["script_hash"],
+            data["script_hash"],
+        )
+
+    def test_user_state(self):
+        block = self.make_block(
+            messages=[
+                {"from": "bot", "message": "Hi", "step": "step1"},
+                {"from": USER_ID, "message": "Go", "step": "step1"},
+            ],
+            current_step="step2",
+        )
+        response = block.handle("student_view_user_state", webob.Request.blank("/"))
+        self.assertEqual(response.content_type, "application/json")
+        data = json.loads(response.body.decode("utf-8"))
+        self.assertEqual(data["version"], STUDENT_VIEW_DATA_VERSION)
+        self.assertEqual(data["user_image_url"], "/static/user.png")
+        self.assertEqual(data["user_state"]["current_step"], "step2")
+        # The bot messages of the final step are part of the state of completed chats.
+        self.assertEqual(data["user_state"]["messages"][-1]["message"], "Bye")
+        self.assertIn("user_name", data)
@@ -0,0 +1,70 @@
+import json
+
+import webob
+
+from chat import metrics
+from chat.default_data import TELEMETRY_MAX_VALUES
+
+from .utils import ChatBlockTestCase
+
+
+class TestTelemetry(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestTelemetry, self).setUp()
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+
+    def client_timings(self):
+        """Returns the timings reported for the front end, without those of the handler."""
+        return dict((name, values) for name, values in self.sink.timings.items() if name.startswith("client."))
+
+    def record(self, block, body):
+        request = webob.Request.blank("/", method="POST", body=json.dumps(body).encode("utf-8"))
+        return block.handle("record_telemetry", request)
+
+    def test_handler_reports_timings(self):
+        block = self.make_block()
+        self.record(block, {"measures": {"sync": [10, 20, 30], "init": [5]}, "counts": {"sync_failure": 2}})
+        self.record(block, {"measures": {"sync": [40]}, "counts": {"sync_failure": 1}})
+        # Each timing is forwarded, for the metrics backend to compute percentiles across processes.
+        self.assertEqual(self.sink.timings["client.sync"], [10, 20, 30, 40])
+        self.assertEqual(self.sink.timings["client.init"], [5])
+        self.assertEqual(self.sink.counters["client.sync_failure"], 3)
+        self.assertEqual(self.sink.gauges, {})
+
+    def test_handler_ignores_invalid_values(self):
+        block = self.make_block()
+        self.record(block, {
+            "measures": {
+                "unknown": [1],
+                "sync": [1, -1, "2", None, True] + [3] * (TELEMETRY_MAX_VALUES * 2),
+                "init": "1",
+            },
+            "counts": {"unknown": 1, "sync_failure": "1"},
+        })
+        self.record(block, ["not", "a", "batch"])
+        self.assertEqual(self.client_timings(), {"client.sync": [1] + [3] * (TELEMETRY_MAX_VALUES - 1)})
+        self.assertEqual(self.sink.counters, {})
+
+    def test_handler_ignores_non_finite_values_and_booleans(self):
+        block = self.make_block()
+        # The JSON of the requests has Infinity and NaN, which json.loads accepts.
+        self.record(block, {
+            "measures": {"sync": [float("inf"), float("nan"), 5], "init": [float("-inf")]},
+            "counts": {"sync_failure": True},
+        })
+        self.assertEqual(self.client_timings(), {"client.sync": [5]})
+        self.assertEqual(self.sink.counters, {})
+
+    def test_disabled(self):
+        metrics.set_sink(None)
+        block = self.make_block(telemetry_sample_rate=0.5)
+        self.assertEqual(block._js_init_data()["telemetry"]["sample_rate"], 0)  # pylint: disable=protected-access
+        self.record(block, {"measures": {"sync": [10]}})
+        self.assertEqual(self.sink.timings, {})
+
+    def test_sample_rate(self):
+        block = self.make_block(telemetry_sample_rate=0.5)
+        self.assertEqual(block._js_init_data()["telemetry"]["sample_rate"], 0.5)  # pylint: disable=protected-access
@@ -0,0 +1,35 @@
+from ddt import data, ddt, unpack
+
+from .utils import ChatBlockTestCase
+
+
+@ddt
+class TestTimingProfiles(ChatBlockTestCase):
+
+    def test_standard_profile_by_default(self):
+        init_data = self.fragment_init_data(self.make_block().student_view())
+        self.assertEqual(init_data["timing_profile"], "standard")
+        self.assertEqual(init_data["timings"], {
+            "bot_message_animation_delay": 2500,
+            "user_message_animation_delay": 1000,
+            "buttons_entering_transition_duration": 1000,
+            "buttons_leaving_transition_duration": 800,
+            "scroll_delay": 800,
+            "typing_delay_per_character": 25,
+        })
+
+    @data(
+        ("relaxed", 3750),
+        ("brisk", 1250),
+        ("express", 125),
+        ("unknown", 2500),
+    )
+    @unpack
+    def test_profile_scales_delays(self, profile, bot_message_animation_delay):
+        init_data = self.fragment_init_data(self.make_block(timing_profile=profile).student_view())
+        self.assertEqual(init_data["timings"]["bot_message_animation_delay"], bot_message_animation_delay)
+
+    def test_express_timings_always_sent(self):
+        init_data = self.fragment_init_data(self.make_block(timing_profile="relaxed").student_view())
+        self.assertEqual(init_data["express_timings"]["bot_message_animation_delay"], 125)
+        self.assertEqual(init_data["express_timings"]["typing_delay_per_character"], 1.25)
@@ -0,0 +1,59 @@
+from chat.default_data import USER_ID
+
+from .utils import ChatBlockTestCase
+
+yaml_final_step = """
+- step1:
+    messages: What is 1+1?
+    responses:
+        - 2: step2
+- step2:
+    notice-type: correct
+    notice-text: Well done!
+    messages:
+        - ["Correct.", "That is right."]
+        - Bye!
+"""
+
+
+class TestServerRenderedTranscript(ChatBlockTestCase):
+
+    def test_new_learner_gets_empty_transcript(self):
+        block = self.make_block()
+        html = block.student_view().content
+        self.assertIn('data-server-rendered="true"', html)
+        self.assertIn('<div class="messages" aria-live="polite"></div>', html)
+
+    def test_transcript_of_returning_learner(self):
+        block = self.make_block(
+            steps=yaml_final_step,
+            subject="Sums",
+            messages=[
+                {"from": "bot", "message": "What is 1+1?", "step": "step1"},
+                {"from": USER_ID, "message": "<b>2</b>", "step": "step1"},
+            ],
+            current_step="step1",
+        )
+        html = block.student_view().content
+        self.assertIn('<div class="subject"><p>Sums</p></div>', html)
+        self.assertIn('<p>What is 1+1?</p>', html)
+        self.assertIn('<p>&lt;b&gt;2&lt;/b&gt;</p>', html)
+        self.assertIn('<img src="/static/user.png">', html)
+
+    def test_completed_chat_includes_final_step_messages(self):
+        displayed = [
+            {"from": "bot", "message": "Correct.", "step": "step2"},
+            {"from": USER_ID, "message": "2", "step": "step1"},
+        ]
+        block = self.make_block(steps=yaml_final_step, messages=displayed, current_step="step2")
+        fragment = block.student_view()
+        user_state = fragment.json_init_args["user_state"]
+        self.assertEqual(user_state["messages"][:2], displayed)
+        self.assertEqual(user_state["messages"][2:], [
+            {"from": "bot", "message": "That is right.", "step": "step2"},
+            {"from": "bot", "message": "Bye!", "step": "step2"},
+        ])
+        self.assertIn('<div class="notice correct"><p>Well done!</p></div>', fragment.content)
+        self.assertIn('<p>That is right.</p>', fragment.content)
+        # The stored transcript is not modified.
+        self.assertEqual(block.messages, displayed)
@@ -0,0 +1,94 @@
+import json
+import sys
+import types
+from io import StringIO
+
+from django.apps.registry import Apps
+from django.core.management import CommandError, call_command
+from django.dispatch import Signal
+from mock import patch
+
+from chat import compiled, metrics, warmup
+from chat.apps import ChatConfig
+from chat.management.commands.warm_chat_scripts import Command
+from chat.scriptgen import generate_steps_yaml
+
+from .utils import ChatBlockTestCase
+
+
+class TestWarmup(ChatBlockTestCase):
+
+    def setUp(self):
+        super(TestWarmup, self).setUp()
+        self.sink = metrics.MemorySink()
+        metrics.set_sink(self.sink)
+        self.addCleanup(metrics.set_sink, None)
+        self.scripts = [generate_steps_yaml(num_steps=10, seed=seed) for seed in range(2)]
+        self.courses = {
+            "course-v1:Org+Course+1": [self.make_block(steps=steps) for steps in self.scripts + self.scripts[:1]],
+            "course-v1:Org+Course+2": [self.make_block(steps=self.scripts[1])],
+        }
+        self._patch("chat.warmup.course_blocks", self.courses.get)
+
+    def run_command(self, *course_keys):
+        stdout = StringIO()
+        try:
+            call_command(Command(), *course_keys, stdout=stdout)
+        finally:
+            self.lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_warm_course(self):
+        report = warmup.warm_course("course-v1:Org+Course+1")
+        self.assertEqual(
+            report, {"course": "course-v1:Org+Course+1", "blocks": 3, "compiled": 2, "images": 0, "failed": 0}
+        )
+        # The workers of the LMS find the scripts in the shared cache.
+        compiled.clear_cache()
+        self.sink.reset()
+        for block in self.courses["course-v1:Org+Course+1"]:
+            block.student_view()
+        self.assertEqual(self.sink.counters["compiled_scripts.shared_cache_hit"], 2)
+        self.assertNotIn("compiled_scripts.shared_cache_miss", self.sink.counters)
+        self.assertEqual(warmup.warm_course("course-v1:Org+Course+1")["compiled"], 0)
+
+    @patch("chat.warmup.warm_course")
+    def test_published_courses_are_warmed_in_the_background(self, warm_course):
+        warm_published_course = warmup._warm_published_course  # pylint: disable=protected-access
+        thread = warm_published_course(None, course_key="course-v1:Org+Course+2")
+        thread.join()
+        warm_course.assert_called_once_with("course-v1:Org+Course+2")
+
+    def test_signals_are_connected_when_the_app_is_loaded(self):
+        # The signals of the modulestore of Open edX.
+        signal_handler = types.SimpleNamespace(course_published=Signal())
+        modules = {
+            name: types.ModuleType(name) for name in ("xmodule", "xmodule.modulestore", "xmodule.modulestore.django")
+        }
+        modules["xmodule.modulestore.django"].SignalHandler = signal_handler
+        with patch.dict(sys.modules, modules):
+            apps = Apps(installed_apps=["chat"])
+        self.assertIsInstance(apps.get_app_config("chat"), ChatConfig)
+        self.assertTrue(signal_handler.course_published.has_listeners())
+
+    def test_command(self):
+        self.run_command("course-v1:Org+Course+1", "course-v1:Org+Course+2")
+        self.assertEqual(self.lines, [
+            {"course": "course-v1:Org+Course+1", "blocks": 3, "compiled": 2, "images": 0, "failed": 0},
+            {"course": "course-v1:Org+Course+2", "blocks": 1, "compiled": 0, "images": 0, "failed": 0},
+            {"summary": {"courses": 2, "blocks": 4, "compiled": 2, "images": 0, "failed": 0}},
+        ])
+
+    def test_command_failures(self):
+        self.courses["course-v1:Org+Course+2"].append(self.make_block(steps="- step1:\n    responses: []\n"))
+        with self.assertLogs("chat.warmup", "ERROR"), \
+                self.assertRaisesRegex(CommandError, "1 of 2 chat blocks could not be warmed"):
+            self.run_command("course-v1:Org+Course+2")
+        self.assertEqual(
+            self.lines[-1], {"summary": {"courses": 1, "blocks": 2, "compiled": 1, "images": 0, "failed": 1}}
+        )
+
+    def test_command_without_shared_cache(self):
+        compiled.set_shared_cache(None)
+        self.addCleanup(compiled.set_shared_cache, "default")
+        with self.assertRaisesRegex(CommandError, "disabled"):
+            self.run_command("course-v1:Org+Course+1")
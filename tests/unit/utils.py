@@ -0,0 +1,65 @@
+"""Helpers for the Chat XBlock unit tests."""
+
+import json
+import re
+
+from django.core.cache import caches
+from django.test import TestCase
+from mock import patch
+from workbench.runtime import WorkbenchRuntime
+
+from chat import bundle, compiled, images, library
+
+
+class FieldData(object):
+    """Stand-in for the field data passed to validate_field_data."""
+
+    def __init__(self, steps, script_name=""):
+        self.steps = steps
+        self.script_name = script_name
+
+
+class ChatBlockTestCase(TestCase):
+    """
+    Base class for tests that exercise a Chat XBlock in the workbench runtime,
+    without a browser.
+    """
+
+    def setUp(self):
+        super(ChatBlockTestCase, self).setUp()
+        self._patch('chat.chat.ChatXBlock._user_image_url', lambda block: '/static/user.png')
+        compiled.clear_cache()
+        caches["default"].clear()
+        library.clear_cache()
+        images.clear_cache()
+        bundle.clear_cache()
+
+    def _patch(self, target, value, **kwargs):
+        """Patches target with new value for duration of the test."""
+        patcher = patch(target, value, **kwargs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def make_block(**fields):
+        """Returns a new chat block with the given field values."""
+        runtime = WorkbenchRuntime('student_1')
+        usage_id = runtime.parse_xml_string('<chat/>')
+        block = runtime.get_block(usage_id)
+        for name, value in fields.items():
+            setattr(block, name, value)
+        return block
+
+    @staticmethod
+    def fragment_init_data(fragment):
+        """
+        Returns the initialization data of a student view fragment, as seen by chat.js:
+        the shared data embedded in the markup, updated with the data passed to initialize_js.
+        """
+        match = re.search(
+            r'<script type="application/json" class="chat-shared-init-data">(.*?)</script>',
+            fragment.content, re.DOTALL,
+        )
+        init_data = json.loads(match.group(1))
+        init_data.update(fragment.json_init_args)
+        return init_data